@@ -0,0 +1,5 @@
+"""
+    Benchmarks of the comparison hot paths
+
+    Run with `make bench`, or `python -m benchmarks.run --help` for the options.
+"""
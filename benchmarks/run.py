@@ -0,0 +1,170 @@
+"""
+    Run the benchmark scenarios and compare them against a stored baseline
+
+    Each scenario is timed at each size, keeping the best of several runs, and then run once more with
+    tracemalloc to record its peak memory. Results that are slower or use more memory than the baseline
+    by more than the tolerance are reported as regressions, and the exit status is 1.
+
+    Timings depend on the machine, so the baseline should be saved on the machine that checks it :
+
+        python -m benchmarks.run --save benchmarks/baseline.json
+        python -m benchmarks.run --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+
+from collections import OrderedDict
+from timeit import default_timer
+
+from .scenarios import SCENARIOS
+
+DEFAULT_SIZES = '1k,10k,100k'
+_SUFFIXES = {'k': 10 ** 3, 'm': 10 ** 6}
+
+# Differences smaller than this are noise, whatever the tolerance
+MIN_SECONDS = 0.002
+MIN_BYTES = 64 * 1024
+
+
+def parse_size(size):
+    """
+        Parse a number of rows like '10k' or '1m'
+    """
+    size = size.strip().lower()
+    if size[-1:] in _SUFFIXES:
+        return int(float(size[:-1]) * _SUFFIXES[size[-1]])
+    return int(size)
+
+
+def measure(func, repeat=3):
+    """
+        Returns:
+            float - The fewest seconds func took over repeat runs
+    """
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func):
+    """
+        Returns:
+            int - The peak bytes allocated by python while func runs
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(scenarios, sizes, repeat=3, memory=True, out=None):
+    """
+        Run each scenario at each size
+
+        Args:
+            scenarios : list - Scenario names, see scenarios.SCENARIOS
+            sizes : list - Numbers of rows
+
+        Kwargs:
+            repeat : int - The number of timed runs of each scenario
+            memory : bool - Record the peak memory of each scenario
+            out : file - Report each result as it finishes
+
+        Returns:
+            OrderedDict - {'scenario[rows]': {'seconds': float, 'peak_bytes': int}}
+    """
+    results = OrderedDict()
+    for name in scenarios:
+        for rows in sizes:
+            func = SCENARIOS[name](rows)
+            result = OrderedDict([('seconds', measure(func, repeat))])
+            if memory:
+                result['peak_bytes'] = peak_memory(func)
+            key = '{}[{}]'.format(name, rows)
+            results[key] = result
+            if out is not None:
+                out.write('{:<40} {:>12.6f}s {:>14}\n'.format(key, result['seconds'], result.get('peak_bytes', '')))
+                out.flush()
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+        Find the results that regressed from a baseline
+
+        Args:
+            results : dict - See run_benchmarks
+            baseline : dict - Results of an earlier run
+
+        Kwargs:
+            tolerance : float - The fraction a result may exceed the baseline by
+
+        Returns:
+            list of str - A description of each regression
+    """
+    regressions = list()
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric, floor in (('seconds', MIN_SECONDS), ('peak_bytes', MIN_BYTES)):
+            value, base_value = result.get(metric), base.get(metric)
+            if value is None or base_value is None:
+                continue
+            if value - base_value > max(tolerance * base_value, floor):
+                regressions.append('{} {} : {} -> {} (+{:.0%})'.format(
+                    key, metric, base_value, value, float(value - base_value) / base_value if base_value else 1))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the comparison hot paths')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='Comma separated scenarios to run, from : %s' % ', '.join(SCENARIOS))
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma separated numbers of rows, up to 10m')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs of each scenario, the best is kept')
+    parser.add_argument('--no-memory', action='store_true', help='Skip recording peak memory')
+    parser.add_argument('--baseline', help='A JSON file of results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='The allowed regression, as a fraction')
+    parser.add_argument('--save', help='Write the results to a JSON file, to use as a baseline')
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error('Unknown scenarios : %s' % ', '.join(unknown))
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+
+    results = run_benchmarks(scenarios, sizes, repeat=args.repeat, memory=not args.no_memory, out=sys.stdout)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(OrderedDict([
+                ('python', platform.python_version()),
+                ('platform', platform.platform()),
+                ('results', results)]), f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+        for regression in regressions:
+            sys.stdout.write('REGRESSION {}\n'.format(regression))
+        if regressions:
+            return 1
+        sys.stdout.write('No regressions against {}\n'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
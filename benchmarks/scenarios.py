@@ -0,0 +1,97 @@
+"""
+    Benchmark scenarios for the comparison hot paths
+
+    Each scenario is a function of the number of rows that does its setup and returns a callable to time.
+    The callable is run several times, so it must reset any state it relies on.
+"""
+from collections import OrderedDict
+
+from comparator import SourcePair, Comparator, ComparatorSet
+from comparator.comps import COMPS, BASIC_COMP, LEN_COMP, FIRST_COMP
+
+from .sources import SyntheticSource, synthetic_result
+
+SCENARIOS = OrderedDict()
+
+# The latency of each synthetic query in the scenarios that run queries
+LATENCY = 0.001
+
+# The number of Comparators in the ComparatorSet scenarios, which split the rows between them
+SET_SIZE = 10
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def _comp_scenario(name, rows):
+    comp = COMPS[name]
+    left, right = synthetic_result(rows), synthetic_result(rows, side='right')
+    return lambda: comp(left, right)
+
+
+@scenario
+def basic_comp(rows):
+    return _comp_scenario(BASIC_COMP, rows)
+
+
+@scenario
+def len_comp(rows):
+    return _comp_scenario(LEN_COMP, rows)
+
+
+@scenario
+def first_eq_comp(rows):
+    return _comp_scenario(FIRST_COMP, rows)
+
+
+@scenario
+def format_rquery(rows):
+    sp = SourcePair(SyntheticSource(rows), 'SELECT * FROM l', SyntheticSource(rows, side='right'),
+                    'SELECT * FROM r WHERE id IN {{ id }} AND col_3 IN {{ col_3 }}')
+    sp._lresult = synthetic_result(rows)
+    return sp._format_rquery
+
+
+@scenario
+def run_comparisons(rows):
+    c = Comparator(SyntheticSource(rows, latency=LATENCY), 'SELECT * FROM l',
+                   SyntheticSource(rows, latency=LATENCY, side='right'), comps=[LEN_COMP, FIRST_COMP, BASIC_COMP])
+
+    def run():
+        c.clear()
+        return c.run_comparisons()
+
+    return run
+
+
+def _comparator_set(rows):
+    size = max(1, rows // SET_SIZE)
+    sps = [
+        SourcePair(SyntheticSource(size, latency=LATENCY), 'SELECT * FROM l',
+                   SyntheticSource(size, latency=LATENCY, side='right'))
+        for _ in range(SET_SIZE)]
+    return ComparatorSet(sps, comps=[[LEN_COMP, BASIC_COMP]] * SET_SIZE)
+
+
+@scenario
+def comparator_set_iter(rows):
+    cs = _comparator_set(rows)
+
+    def run():
+        cs.clear()
+        return [c.run_comparisons() for c in cs]
+
+    return run
+
+
+@scenario
+def comparator_set_run(rows):
+    cs = _comparator_set(rows)
+
+    def run():
+        cs.clear()
+        return list(cs.run(max_workers=4))
+
+    return run
@@ -0,0 +1,90 @@
+"""
+    In-process sources of synthetic query results
+"""
+import random
+import time
+
+from collections import OrderedDict
+
+from spackl.db import QueryResult
+from spackl.db.result import BaseResult
+
+_results = dict()
+
+
+def synthetic_rows(rows, columns=4, seed=0):
+    """
+        Generate rows of deterministic data
+
+        The first column is a sequential 'id', and the rest alternate between ints, floats, and strings.
+
+        Args:
+            rows : int - The number of rows
+
+        Kwargs:
+            columns : int - The number of columns, including the id
+            seed : int - Rows generated with the same seed are equal
+
+        Returns:
+            list of OrderedDicts
+    """
+    rand = random.Random(seed)
+    kinds = [
+        lambda: rand.randint(0, 1000000),
+        lambda: rand.random() * 1000,
+        lambda: 'v%08d' % rand.randint(0, 10 ** 8)]
+    names = ['id'] + ['col_%d' % i for i in range(1, columns)]
+    return [
+        OrderedDict([('id', i)] + [(name, kinds[(j - 1) % 3]()) for j, name in enumerate(names) if j])
+        for i in range(rows)]
+
+
+def synthetic_result(rows, columns=4, seed=0, side='left'):
+    """
+        Get a QueryResult of synthetic rows, generated once per size and side and then shared
+
+        Kwargs:
+            side : str - Results of each side are equal but separate objects, so comparing them can't
+                         take shortcuts on identical rows
+
+        Returns:
+            QueryResult
+    """
+    key = (rows, columns, seed, side)
+    if key not in _results:
+        data = synthetic_rows(rows, columns=columns, seed=seed)
+        result = QueryResult()
+        result.extend(BaseResult(list(data[0].keys()) if data else list(), data))
+        _results[key] = result
+    return _results[key]
+
+
+class SyntheticSource(object):
+    """
+        A source that returns the same synthetic result for every query after a fixed latency
+
+        Args:
+            rows : int - The number of rows in each result
+
+        Kwargs:
+            columns : int - The number of columns in each result
+            latency : float - The number of seconds each query takes
+            seed : int - Sources with the same seed return equal results
+            side : str - See synthetic_result
+    """
+    def __init__(self, rows, columns=4, latency=0.0, seed=0, side='left'):
+        self.rows = rows
+        self.columns = columns
+        self.latency = latency
+        self.seed = seed
+        self.side = side
+        self.queries = 0
+
+    def __repr__(self):
+        return '<SyntheticSource({s.rows}x{s.columns})>'.format(s=self)
+
+    def query(self, query_string):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return synthetic_result(self.rows, columns=self.columns, seed=self.seed, side=self.side)
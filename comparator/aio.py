@@ -0,0 +1,275 @@
+"""
+    asyncio support for running comparisons without blocking the event loop
+
+    A source may implement an 'aquery' coroutine method, which will be awaited. Sources that only
+    implement 'query' are run in the event loop's default executor.
+
+    This module requires Python 3.6+ and is only imported by the async methods of SourcePair,
+    Comparator, and ComparatorSet.
+"""
+import asyncio
+import logging
+
+from .cache import source_key, source_id
+from .compare import _stream_source_keys, merge_results, TEMP_TABLE_KEYS
+from .exceptions import ComparisonCancelled
+from .profile import result_rows
+
+_log = logging.getLogger(__name__)
+
+
+async def _aquery(source, query):
+    coro = getattr(source, 'aquery', None)
+    if coro is not None:
+        return await coro(query)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, source.query, query)
+
+
+async def _aquery_params(source, query, params):
+    coro = getattr(source, 'aquery', None)
+    if coro is not None:
+        return await coro(query, **params)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, lambda: source.query(query, **params))
+
+
+async def aquery(source, query, limits=None):
+    """
+        Run a query against a source, awaiting its 'aquery' method if it has one
+
+        Args:
+            source : obj - An object that implements a 'query' or 'aquery' method
+            query : str - The query to run
+
+        Kwargs:
+            limits : dict - A mapping of {id(source): asyncio.Semaphore}. A slot of the source's
+                            semaphore is held while the query runs.
+
+        Returns:
+            The query result
+    """
+    limit = limits.get(source_id(source)) if limits else None
+    if limit is None:
+        return await _aquery(source, query)
+    async with limit:
+        return await _aquery(source, query)
+
+
+async def _aplan_fetch(sp, source, query, limits):
+    """
+        Share the result of a query between every SourcePair of a QueryPlan
+
+        Concurrent callers for the same query await the same task. A failed query is retried by the next caller.
+    """
+    plan = sp._plan
+    key = (source_key(source), query)
+    future = plan._afutures.get(key)
+    if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+        future = asyncio.ensure_future(_arun_query(sp, source, query, limits))
+        plan._afutures[key] = future
+        plan.executed += 1
+    return await future
+
+
+async def _asp_query(sp, source, query, limits):
+    if sp._plan is not None:
+        sp._planned.append((source, query))
+        return await _aplan_fetch(sp, source, query, limits)
+    return await _arun_query(sp, source, query, limits)
+
+
+async def _arun_query(sp, source, query, limits):
+    if sp._cache is not None:
+        found, result = sp._cache.get(source, query)
+        if found:
+            return result
+    result = await aquery(source, query, limits)
+    if sp._cache is not None:
+        sp._cache.set(source, query, result)
+    return result
+
+
+async def _afetch(sp, name, awaitable):
+    """
+        Await a query as a stage of the SourcePair's Profiler, recording the number of rows it returns
+
+        The CPU time of the stage is that of the event loop's thread, which may include other tasks.
+    """
+    if sp._profiler is None:
+        return await awaitable
+    with sp._stage(name) as timer:
+        result = await awaitable
+        timer.rows = result_rows(result)
+    return result
+
+
+async def _aget_rresult(sp, limits):
+    """
+        Run the rquery, or each of its batches, and merge the results
+    """
+    with sp._stage('format_rquery'):
+        if sp._key_strategy == TEMP_TABLE_KEYS:
+            # Loading the keys is a blocking call to the right source
+            rqueries = await asyncio.get_event_loop().run_in_executor(None, sp._rqueries)
+        else:
+            rqueries = sp._rqueries()
+    return await _afetch(sp, 'rquery', _arun_rqueries(sp, rqueries, limits))
+
+
+async def _arun_rqueries(sp, rqueries, limits):
+    results = list()
+    for query, params, shared in rqueries:
+        if params or not shared:
+            limit = limits.get(source_id(sp._right)) if limits else None
+            if limit is None:
+                results.append(await _aquery_params(sp._right, query, params or dict()))
+            else:
+                async with limit:
+                    results.append(await _aquery_params(sp._right, query, params or dict()))
+        else:
+            results.append(await _asp_query(sp, sp._right, query, limits))
+    return merge_results(results)
+
+
+async def _aspill(sp, limits):
+    """
+        Write the query results of a SourcePair to disk in an executor, holding a slot of each source's limit
+    """
+    held = _stream_source_keys(sp, limits or dict())
+    for key in held:
+        await limits[key].acquire()
+    try:
+        await asyncio.get_event_loop().run_in_executor(None, sp.get_query_results)
+    finally:
+        for key in reversed(held):
+            limits[key].release()
+
+
+async def aget_query_results(sp, limits=None):
+    """
+        Run each query of a SourcePair against its source, using the SourcePair's cache if it has one
+
+        The left and right queries are awaited together unless the rquery depends on the lquery result.
+
+        Kwargs:
+            limits : dict - Per-source semaphores, see aquery
+    """
+    if sp._spill is not None:
+        await _aspill(sp, limits)
+    elif sp._right is None:
+        sp._lresult = await _afetch(sp, 'lquery', _asp_query(sp, sp._left, sp._lquery, limits))
+    elif sp.templated:
+        sp._lresult = await _afetch(sp, 'lquery', _asp_query(sp, sp._left, sp._lquery, limits))
+        sp._rresult = await _aget_rresult(sp, limits)
+    else:
+        sp._lresult, sp._rresult = await asyncio.gather(
+            _afetch(sp, 'lquery', _asp_query(sp, sp._left, sp._lquery, limits)),
+            _afetch(sp, 'rquery', _asp_query(sp, sp._right, sp._rquery, limits)))
+
+
+async def _arun_stream(comparator):
+    """
+        Run the comparisons of a streaming or checksum Comparator in an executor
+
+        These read from the sources while comparing, so the whole run has to leave the event loop.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, comparator.run_comparisons)
+
+
+async def acompare(comparator):
+    """
+        Async generator that yields the results of each comparison of a Comparator
+
+        The queries are awaited, the comparisons themselves are run in the event loop.
+    """
+    if comparator._deferred:
+        for result in await _arun_stream(comparator):
+            yield result
+        return
+
+    if comparator._sp.empty:
+        await aget_query_results(comparator._sp)
+    for result in comparator.compare():
+        yield result
+
+
+async def arun_comparisons(comparator):
+    """
+        Run all comparisons of a Comparator and return the results
+    """
+    if comparator._deferred:
+        return await _arun_stream(comparator)
+
+    if comparator._sp.empty:
+        await aget_query_results(comparator._sp)
+    return comparator.run_comparisons()
+
+
+async def _arun_stream_limited(comparator, source_semaphores):
+    held = _stream_source_keys(comparator._sp, source_semaphores)
+    for key in held:
+        await source_semaphores[key].acquire()
+    try:
+        await _arun_stream(comparator)
+    finally:
+        for key in reversed(held):
+            source_semaphores[key].release()
+
+
+async def _arun_comparator(comparator, semaphore, source_semaphores):
+    comparator._error = None
+    try:
+        async with semaphore:
+            if comparator._deferred:
+                await _arun_stream_limited(comparator, source_semaphores)
+            elif comparator._sp.empty:
+                await aget_query_results(comparator._sp, source_semaphores)
+        comparator.run_comparisons()
+    except asyncio.CancelledError:
+        comparator._error = ComparisonCancelled('The ComparatorSet run was stopped')
+        raise
+    except Exception as e:
+        _log.exception('Comparator %r failed', comparator)
+        comparator._error = e
+    return comparator
+
+
+async def arun(comparator_set, max_concurrency=None, source_limits=None, max_failures=None):
+    """
+        Async generator that runs every Comparator in a ComparatorSet, yielding each as it finishes
+
+        A Comparator that raised is still yielded, with the exception set as its error.
+
+        Kwargs:
+            max_concurrency : int - The maximum number of Comparators to query at once. Defaults to
+                                    the size of the set.
+            source_limits : dict - A mapping of {source: int} capping the number of queries that may
+                                   run against a particular source at once
+            max_failures : int - Stop the run once this many Comparators have failed. The remaining
+                                 Comparators are cancelled with a ComparisonCancelled error, and not yielded.
+    """
+    comparisons = comparator_set._comparisons
+    if not comparisons:
+        return
+
+    semaphore = asyncio.Semaphore(max_concurrency or len(comparisons))
+    source_semaphores = dict(
+        (source_id(source), asyncio.Semaphore(limit))
+        for source, limit in (source_limits or dict()).items())
+
+    tasks = [asyncio.ensure_future(_arun_comparator(c, semaphore, source_semaphores)) for c in comparisons]
+    failures = 0
+    try:
+        for future in asyncio.as_completed(tasks):
+            comparator = await future
+            yield comparator
+            failures += comparator.failed
+            if max_failures is not None and failures >= max_failures:
+                _log.warning('Stopping the run after %d failed Comparators', failures)
+                return
+    finally:
+        # Don't leave pending tasks behind if the caller stopped early
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,100 @@
+"""
+    Apache Arrow query results
+
+    A SourcePair with result_format='arrow' hands its comps pyarrow Tables. Sources that implement a
+    'query_arrow' method return Arrow data directly, other results are converted once when they are
+    fetched. The built-in comps work on Tables with Arrow's own kernels, and comps.vector converts
+    them to pandas without copying where the column types allow.
+
+    pyarrow is an optional dependency : pip install comparator[arrow]
+"""
+import pandas as pd
+
+from .cache import source_key
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required for Arrow query results : pip install comparator[arrow]')
+    return pyarrow
+
+
+def is_arrow(obj):
+    """
+        Returns True if an object is a pyarrow type, without importing pyarrow
+    """
+    return type(obj).__module__.split('.')[0] == 'pyarrow'
+
+
+def is_table(obj):
+    """
+        Returns True if an object is a pyarrow Table or RecordBatch, without importing pyarrow
+    """
+    return is_arrow(obj) and hasattr(obj, 'schema') and hasattr(obj, 'num_rows')
+
+
+def to_arrow(result):
+    """
+        Convert a query result to a pyarrow Table
+
+        Args:
+            result - A pyarrow Table or RecordBatch, a pandas DataFrame, or an iterable of rows. Rows must
+                     provide items(), like a dict or QueryResultRow.
+
+        Returns:
+            pyarrow.Table
+    """
+    pa = _pyarrow()
+    if isinstance(result, pa.Table):
+        return result
+    if isinstance(result, pa.RecordBatch):
+        return pa.Table.from_batches([result])
+    if isinstance(result, pd.DataFrame):
+        return pa.Table.from_pandas(result, preserve_index=False)
+    return pa.Table.from_pylist([dict(row.items()) for row in result])
+
+
+def concat(tables):
+    """
+        Concatenate the Tables of a batched query into one
+    """
+    return _pyarrow().concat_tables([to_arrow(table) for table in tables])
+
+
+class ArrowSource(object):
+    """
+        Adapts a source so that its query results are pyarrow Tables
+
+        The source's 'query_arrow' method is used if it has one, otherwise the result of its 'query' method
+        is converted. Other attributes, like 'load_keys', are passed through. Streaming is not supported.
+
+        Args:
+            source : obj - The source to adapt
+    """
+    def __init__(self, source):
+        _pyarrow()
+        self.__wrapped__ = source
+
+    def __repr__(self):
+        return '<ArrowSource({!r})>'.format(self.__wrapped__)
+
+    def __getattr__(self, name):
+        # Async and streaming methods would bypass the conversion, so they are hidden
+        if name in ('aquery', 'iter_query') or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.__dict__['__wrapped__'], name)
+
+    @property
+    def cache_key(self):
+        key = getattr(self.__wrapped__, 'cache_key', None)
+        if key is None:
+            return None
+        return 'arrow:' + source_key(self.__wrapped__)
+
+    def query(self, query_string, **params):
+        query_arrow = getattr(self.__wrapped__, 'query_arrow', None)
+        if query_arrow is not None:
+            return to_arrow(query_arrow(query_string, **params))
+        return to_arrow(self.__wrapped__.query(query_string, **params))
@@ -0,0 +1,148 @@
+"""
+    Caching of query results shared between SourcePairs
+
+    Results are keyed by the source and the fully rendered query. A single QueryCache can be passed to
+    a ComparatorSet so every SourcePair that runs the same query against the same source reuses the
+    first result. Cached results are shared, so comparisons should not modify them in place.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+from collections import OrderedDict
+
+_log = logging.getLogger(__name__)
+
+
+def source_key(source):
+    """
+        Get a string identifying a source
+
+        Sources can define a 'cache_key' attribute to identify themselves across processes. Otherwise
+        the identity of the object is used, which is only valid for the current process. Adapters that
+        set '__wrapped__', like arrow.ArrowSource, are identified by the source they wrap.
+    """
+    key = getattr(source, 'cache_key', None)
+    if key is not None:
+        return str(key)
+    wrapped = getattr(source, '__wrapped__', None)
+    if wrapped is not None:
+        return '{}:{}'.format(type(source).__name__, source_key(wrapped))
+    return '{}@{}'.format(type(source).__name__, id(source))
+
+
+def source_id(source):
+    """
+        Get the id of a source, or of the source an adapter wraps, for looking up per-source limits
+    """
+    return id(getattr(source, '__wrapped__', source))
+
+
+class QueryCache(object):
+    """
+        An in-memory LRU cache of query results, with an optional TTL and on-disk persistence
+
+        Kwargs:
+            maxsize : int - The maximum number of results to hold in memory. The least recently used
+                            result is evicted first.
+            ttl : int/float - The number of seconds a result stays valid. If None, results never expire.
+            path : str - A directory to persist results to with pickle. Only results from sources that
+                         define a 'cache_key' are persisted, since other keys are only valid in this process.
+    """
+    def __init__(self, maxsize=128, ttl=None, path=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def __repr__(self):
+        return '<QueryCache(size={}, hits={}, misses={})>'.format(len(self), self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, created):
+        return self._ttl is not None and time.time() - created > self._ttl
+
+    def _file(self, key):
+        digest = hashlib.sha1('\n'.join(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._path, digest + '.pkl')
+
+    def _persistent(self, source):
+        return self._path is not None and getattr(source, 'cache_key', None) is not None
+
+    def _load(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                created, result = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if self._expired(created):
+            return None
+        return created, result
+
+    def _store(self, key, created, result):
+        try:
+            with open(self._file(key), 'wb') as f:
+                pickle.dump((created, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError, pickle.PicklingError) as e:
+            _log.warning('Could not persist query result to %s : %s', self._path, e)
+
+    def _put(self, key, created, result):
+        # Keys are always popped first, so inserting moves them to the most recently used end
+        self._entries[key] = (created, result)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, source, query):
+        """
+            Look up the result of a query against a source
+
+            Returns:
+                tuple - (found, result)
+        """
+        key = (source_key(source), query)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and not self._expired(entry[0]):
+                self._put(key, *entry)
+                self.hits += 1
+                return True, entry[1]
+
+            if self._persistent(source):
+                entry = self._load(key)
+                if entry is not None:
+                    self._put(key, *entry)
+                    self.hits += 1
+                    return True, entry[1]
+
+            self.misses += 1
+            return False, None
+
+    def set(self, source, query, result):
+        """
+            Store the result of a query against a source
+        """
+        key = (source_key(source), query)
+        created = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._put(key, created, result)
+            if self._persistent(source):
+                self._store(key, created, result)
+
+    def clear(self):
+        """
+            Remove every result held in memory. Persisted results are left on disk.
+        """
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,147 @@
+"""
+    Chunked checksum comparisons computed by the source databases
+
+    Instead of pulling both full results, each source computes a row count and an aggregate hash for
+    ranges of an integer key. Only the ranges that differ are split further, so the rows transferred
+    are proportional to the number of differences rather than the size of the table.
+"""
+import logging
+
+_log = logging.getLogger(__name__)
+
+# Postgres hash of a row, the first 32 bits of the md5 of its text representation
+POSTGRES_HASH = "('x' || substr(md5(ROW({columns})::text), 1, 8))::bit(32)::int"
+
+_BOUNDS_QUERY = 'SELECT MIN({key}) AS lo, MAX({key}) AS hi FROM {table}{where}'
+_CHUNK_QUERY = (
+    'SELECT FLOOR(({key} - {lo}) / {width}) AS chunk, COUNT(*) AS cnt, SUM({hash}) AS checksum '
+    'FROM {table} WHERE {key} >= {lo} AND {key} <= {hi}{where} GROUP BY 1')
+
+
+class ChecksumSpec(object):
+    """
+        Describes how to checksum a table in chunks of an integer key
+
+        Args:
+            table : str - The table (or subquery with an alias) to checksum
+            key : str - An integer column to split the table into ranges on
+            columns : list - The columns to include in each row's hash
+
+        Kwargs:
+            where : str - An optional filter to apply to both sources
+            chunks : int - The number of ranges to split each mismatched range into
+            min_rows : int - Mismatched ranges with at most this many rows are reported instead of split
+            hash_expr : str - A SQL expression producing an integer hash of a row, formatted with {columns}.
+                              Both sources must produce the same hash for the same row. Defaults to a
+                              Postgres/Redshift compatible md5 expression.
+    """
+    def __init__(self, table, key, columns, where=None, chunks=10, min_rows=1000, hash_expr=POSTGRES_HASH):
+        if chunks < 2:
+            raise ValueError('chunks must be at least 2')
+        if not isinstance(columns, (list, tuple)):
+            columns = [columns]
+
+        self.table = table
+        self.key = key
+        self.columns = list(columns)
+        self.where = where
+        self.chunks = chunks
+        self.min_rows = min_rows
+        self.hash_expr = hash_expr
+
+    def __repr__(self):
+        return '<ChecksumSpec({cs.table}, {cs.key})>'.format(cs=self)
+
+    def bounds_query(self):
+        where = ' WHERE {}'.format(self.where) if self.where else ''
+        return _BOUNDS_QUERY.format(key=self.key, table=self.table, where=where)
+
+    def chunk_query(self, lo, hi, width):
+        where = ' AND ({})'.format(self.where) if self.where else ''
+        return _CHUNK_QUERY.format(
+            key=self.key, table=self.table, where=where, lo=lo, hi=hi, width=width,
+            hash=self.hash_expr.format(columns=', '.join(self.columns)))
+
+
+class ChecksumResult(object):
+    """
+        The outcome of a checksum comparison
+
+        Truthy if no key ranges differ.
+
+        Args:
+            ranges : list - (lo, hi) key ranges, inclusive, that differ between the sources
+            queries : int - The number of checksum queries run against each source
+    """
+    def __init__(self, ranges, queries):
+        self.ranges = ranges
+        self.queries = queries
+
+    def __repr__(self):
+        return '<ChecksumResult(ranges={cr.ranges}, queries={cr.queries})>'.format(cr=self)
+
+    def __bool__(self):
+        return not self.ranges
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, ChecksumResult):
+            return self.ranges == other.ranges
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _chunks(result):
+    return dict((int(row['chunk']), (row['cnt'], row['checksum'])) for row in result)
+
+
+def checksum_diff(sp, spec):
+    """
+        Find the key ranges that differ between the two sources of a SourcePair
+
+        The combined key range of both sources is split into spec.chunks ranges, and each source
+        returns a count and hash sum per range. Ranges that differ are split again, rsync-style,
+        until they hold at most spec.min_rows rows or a single key.
+
+        Args:
+            sp : SourcePair - The sources to compare. Its queries are not used.
+            spec : ChecksumSpec
+
+        Returns:
+            ChecksumResult
+    """
+    bounds = list(sp._query(sp._left, spec.bounds_query()))
+    rbounds = list(sp._query(sp._right, spec.bounds_query()))
+    queries = 1
+
+    los = [b[0]['lo'] for b in (bounds, rbounds) if b and b[0]['lo'] is not None]
+    his = [b[0]['hi'] for b in (bounds, rbounds) if b and b[0]['hi'] is not None]
+    if not los:
+        return ChecksumResult(list(), queries)
+
+    ranges = list()
+    pending = [(int(min(los)), int(max(his)))]
+    while pending:
+        lo, hi = pending.pop(0)
+        width = max(1, -(-(hi - lo + 1) // spec.chunks))
+        query = spec.chunk_query(lo, hi, width)
+        left, right = _chunks(sp._query(sp._left, query)), _chunks(sp._query(sp._right, query))
+        queries += 1
+
+        for chunk in sorted(set(left) | set(right)):
+            lchunk, rchunk = left.get(chunk), right.get(chunk)
+            if lchunk == rchunk:
+                continue
+            clo = lo + chunk * width
+            chi = min(hi, clo + width - 1)
+            rows = max(lchunk[0] if lchunk else 0, rchunk[0] if rchunk else 0)
+            if rows <= spec.min_rows or clo == chi:
+                ranges.append((clo, chi))
+            else:
+                pending.append((clo, chi))
+
+    _log.info('Checksum comparison found %d mismatched ranges in %d queries', len(ranges), queries)
+    return ChecksumResult(sorted(ranges), queries)
@@ -2,87 +2,87 @@
     Base classes for running comparisons between two data sources
 """
 import copy
-import inspect
 import logging
-import re
 import six
+import threading
 
+from timeit import default_timer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from spackl.db import QueryResult
+
+from .arrow import ArrowSource, concat, is_table
+from .cache import source_id
+from .checksum import checksum_diff
 from .comps import COMPS, DEFAULT_COMP
-from .exceptions import QueryFormatError, InvalidCompSetException
+from .comps.basic import _first
+from .comps.descriptor import CompDescriptor, comp_columns
+from .comps.stream import align_batches, iter_batches
+from .parallel import CompPool, check_executor, THREAD
+from .plan import QueryPlan
+from .profile import NO_STAGE, Stage, result_rows
+from .results import ComparatorResult, ResultStore, PASSED, FAILED, SKIPPED
+from .lazy import ResultHandle
+from .rewrite import count_query, limit_query, project_query, watermark_query, where_query
+from .sample import sample_diff
+from .spill import SpillStore
+from .template import RQueryTemplate, format_result_column, format_values, result_column_values
+from .exceptions import QueryFormatError, InvalidCompSetException, ComparisonCancelled
 
 _log = logging.getLogger(__name__)
 
+INLINE_KEYS = 'inline'
+BATCH_KEYS = 'batch'
+PARAM_KEYS = 'param'
+TEMP_TABLE_KEYS = 'temp_table'
+KEY_STRATEGIES = (INLINE_KEYS, BATCH_KEYS, PARAM_KEYS, TEMP_TABLE_KEYS)
 
-class ComparatorResult(object):
-    """
-        A container object to hold the results of a comparison
-
-        This primarily provides syntactic sugar on what is really just a (name, result) tuple. The "truthiness" of a
-        result can be checked easily, as well as other standard comparison operators if the particular comparison
-        returns a value other than a boolean.
-
-        Args:
-            comparator_name : str - The name of the calling Comparator
-            name : str - The name of the comparison
-            result - The result of the comparison
-    """
-    def __init__(self, comparator_name, name, result):
-        self._cname = comparator_name
-        self._name = str(name)
-        self._result = result
-
-    def __repr__(self):
-        return '<ComparatorResult({cr._name}, {cr._result})>'.format(cr=self)
-
-    def __str__(self):
-        return '{cr._name} : {cr._result}'.format(cr=self)
-
-    def __bool__(self):
-        return bool(self._result)
+ARROW = 'arrow'
+RESULT_FORMATS = (None, ARROW)
 
-    __nonzero__ = __bool__
+MEMORY = 'memory'
+DISK = 'disk'
+STORAGES = (MEMORY, DISK)
 
-    def __getitem__(self, key):
-        if isinstance(key, six.integer_types):
-            key = {0: 'name', 1: 'result'}.get(key, None)
-            if key is None:
-                raise IndexError('list index out of range')
-        if key == 'name':
-            return self._name
-        elif key == 'result':
-            return self._result
-        else:
-            raise KeyError(key)
-
-    def __eq__(self, other):
-        return self._result == other
-
-    def __ne__(self, other):
-        return self._result != other
-
-    def __gt__(self, other):
-        return self._result > other
 
-    def __ge__(self, other):
-        return self._result >= other
+def _stream_source_keys(sp, semaphores):
+    """
+        Get the keys of the per-source semaphores a streaming SourcePair must hold while it runs
 
-    def __lt__(self, other):
-        return self._result < other
+        A streaming pair reads from both sources on a single thread, so one slot per distinct
+        source is held for the whole run. The keys are sorted so that pairs sharing sources always
+        acquire them in the same order, avoiding deadlocks.
+    """
+    sources = [sp._left] if sp._right is None else [sp._left, sp._right]
+    return sorted(set(source_id(s) for s in sources if source_id(s) in semaphores))
 
-    def __le__(self, other):
-        return self._result <= other
 
-    @property
-    def comparator_name(self):
-        return self._cname
-
-    @property
-    def name(self):
-        return self._name
+def merge_results(results):
+    """
+        Merge the results of a batched query into a single result
 
-    @property
-    def result(self):
-        return self._result
+        QueryResults are merged into a new, empty QueryResult, since any of them may be shared through a
+        cache. Arrow Tables are concatenated without copying. Other results are concatenated as lists.
+    """
+    if len(results) == 1:
+        return results[0]
+    if is_table(results[0]):
+        return concat(results)
+    if isinstance(results[0], QueryResult):
+        merged = QueryResult()
+        for result in results:
+            merged.extend(result)
+        return merged
+    return [row for result in results for row in result]
+
+
+def _scalar(result):
+    """
+        Get the value of the first column of the first row of a query result
+    """
+    if is_table(result):
+        return result.column(0)[0].as_py()
+    row = next(row for row in result)
+    return list(row.values())[0] if hasattr(row, 'values') else row[0]
 
 
 class SourcePair(object):
@@ -97,10 +97,69 @@ class SourcePair(object):
             right : obj - The "right" source, an object that implements a 'query' method
             rquery : string - The query to run against the "right" source
                               If not provided, lquery will be used.
+            concurrent : bool - Run the left and right queries at the same time on separate threads.
+                                Ignored if the rquery references the lquery result with {{ column }} slots.
+            cache : cache.QueryCache - A cache of query results, which may be shared with other SourcePairs
+            key_strategy : str - How the lquery result is passed to {{ column }} slots in the rquery
+                                 'inline' - The values are inlined as a single literal tuple
+                                 'batch' - The lquery result is split into batches of key_batch_size rows, and
+                                           the rquery is run once per batch with the results merged
+                                 'param' - Each slot becomes a bound parameter, %(column)s, and the tuple of
+                                           values is passed to the right source's query method as a kwarg
+                                 'temp_table' - The values are passed to the right source's load_keys(table, columns)
+                                                method, and each slot becomes (SELECT column FROM key_table)
+            key_batch_size : int - The number of lquery rows per rquery with the 'batch' strategy
+            key_table : str - The table the right source should load keys into with the 'temp_table' strategy
+            watermark : str - A column in the output of both queries that increases as rows are added, like an
+                              id or a timestamp. Once a watermark value is set, only rows past it are queried.
+            result_format : str - Set to 'arrow' to get each result as a pyarrow Table, from the source's
+                                  'query_arrow' method if it has one. Requires pyarrow.
+            storage : str - Where to hold the query results
+                            'memory' - As returned by the sources
+                            'disk' - In memory-mapped Arrow files, written batch by batch from sources that
+                                     implement 'iter_query', so results can be larger than memory. Comps receive
+                                     pyarrow Tables, and the files are deleted by clear(). Results are not cached.
+            spill_dir : str - The directory to create the files in with 'disk' storage. Defaults to the system's
+                              temporary directory.
+            spill_batch_size : int - The number of rows to request in each batch with 'disk' storage
+            profiler : profile.Profiler - Measure the 'lquery', 'format_rquery', and 'rquery' stages of each run
     """
-    def __init__(self, left, lquery=None, right=None, rquery=None):
+    def __init__(self, left, lquery=None, right=None, rquery=None, concurrent=False, cache=None,
+                 key_strategy=INLINE_KEYS, key_batch_size=1000, key_table='comparator_keys', watermark=None,
+                 result_format=None, storage=MEMORY, spill_dir=None, spill_batch_size=100000, profiler=None):
+        if key_strategy not in KEY_STRATEGIES:
+            raise ValueError('key_strategy must be one of %r' % (KEY_STRATEGIES, ))
+        if result_format not in RESULT_FORMATS:
+            raise ValueError('result_format must be one of %r' % (RESULT_FORMATS, ))
+        if storage not in STORAGES:
+            raise ValueError('storage must be one of %r' % (STORAGES, ))
+        if key_strategy == TEMP_TABLE_KEYS and not hasattr(right, 'load_keys'):
+            raise TypeError('The right source must implement load_keys to use the temp_table key strategy')
+
+        if result_format == ARROW:
+            left = ArrowSource(left)
+            right = ArrowSource(right) if right is not None else None
+
         self._left = left
         self._right = right
+        self._result_format = result_format
+        self._spill = SpillStore(spill_dir) if storage == DISK else None
+        self._spill_batch_size = spill_batch_size
+        self._concurrent = concurrent
+        self._cache = cache
+        self._key_strategy = key_strategy
+        self._key_batch_size = key_batch_size
+        self._key_table = key_table
+        self._limits = None
+        self._plan = None
+        # The (source, query) pairs fetched through the plan, which are dropped from it by clear()
+        self._planned = list()
+        self._watermark = watermark
+        self._since = None
+        self._sample = None
+        self._columns = None
+        self._profiler = profiler
+        self._profile_labels = dict()
 
         self._set_queries(lquery, rquery)
         self._set_empty()
@@ -146,8 +205,162 @@ class SourcePair(object):
             if not isinstance(q, six.string_types):
                 raise TypeError('Queries must be valid strings')
 
-        self._lquery = lquery
-        self._rquery = rquery
+        self._queries = (lquery, rquery)
+        self._rquery = rquery if rquery is None else self._rewrite(rquery)
+        self._rtemplate = RQueryTemplate(self._rquery) if self._rquery is not None else None
+        # The lquery keeps the columns the rquery's {{ column }} slots are filled from
+        self._lquery = self._rewrite(lquery, self._rtemplate.keys if self._rtemplate is not None else ())
+
+    def _rewrite(self, query, keys=()):
+        """
+            Apply the watermark and sample filters, and the column projection, to a query
+        """
+        query = watermark_query(query, self._watermark, self._since)
+        if self._sample is not None:
+            query = where_query(query, self._sample.where())
+        return project_query(query, self._projection(keys))
+
+    def _projection(self, keys=()):
+        """
+            The columns to select from a query, or None to keep every column
+        """
+        if not self._columns:
+            return None
+        columns = list(self._columns)
+        for column in list(keys) + ([self._watermark] if self._watermark is not None else []):
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    @property
+    def columns(self):
+        """
+            The columns the queries are projected to, if any
+        """
+        return self._columns
+
+    def set_columns(self, columns):
+        """
+            Query only some columns, by wrapping both queries in a SELECT of those columns
+
+            The watermark column, and the lquery columns referenced by the rquery, are always kept. The ORDER BY
+            of a wrapped query is not guaranteed to hold, see rewrite.project_query.
+
+            Args:
+                columns : list - The columns to keep. If None or empty, every column is queried.
+        """
+        columns = list(columns) if columns else None
+        if columns != self._columns:
+            self._columns = columns
+            self._set_queries(*self._queries)
+
+    def explain(self):
+        """
+            Describe the queries as they will be run, after the watermark, sample, and projection rewrites
+
+            Returns:
+                str
+        """
+        columns = ', '.join(self._columns) if self._columns else 'every column'
+        lines = ['{!r} : {}'.format(self, columns)]
+        lines.append('  lquery : {}'.format(' '.join(self._lquery.split())))
+        if self._rquery is not None:
+            lines.append('  rquery : {}'.format(' '.join(self._rquery.split())))
+        return '\n'.join(lines)
+
+    def set_profiler(self, profiler, **labels):
+        """
+            Measure the stages of each run
+
+            Args:
+                profiler : profile.Profiler - If None, nothing is measured
+
+            Kwargs:
+                labels - Added to the labels of every stage, like comparator='name'
+        """
+        self._profiler = profiler
+        self._profile_labels = labels
+
+    @property
+    def profile(self):
+        """
+            The stages of the last run, if the SourcePair has a Profiler
+
+            Returns:
+                list - profile.Stage objects
+        """
+        return list(self._profile)
+
+    def _stage(self, name, stages=None, **labels):
+        """
+            Measure a stage with the Profiler, or do nothing if there isn't one
+        """
+        if self._profiler is None:
+            return NO_STAGE
+        return self._profiler.stage(
+            name, self._profile if stages is None else stages, **dict(self._profile_labels, **labels))
+
+    def _fetch(self, name, func, *args):
+        """
+            Call func(*args) as a stage, recording the number of rows it returns
+        """
+        if self._profiler is None:
+            return func(*args)
+        with self._stage(name) as timer:
+            result = func(*args)
+            timer.rows = result_rows(result)
+        return result
+
+    def set_sample(self, spec):
+        """
+            Filter both queries to a deterministic sample of keys
+
+            Args:
+                spec : sample.SampleSpec - The keys and rate to sample. If None, every row is queried.
+        """
+        self._sample = spec
+        self._set_queries(*self._queries)
+
+    @property
+    def watermark(self):
+        return self._watermark
+
+    @property
+    def since(self):
+        """
+            The watermark value the queries are filtered past, if any
+        """
+        return self._since
+
+    def set_since(self, value):
+        """
+            Filter both queries to the rows with a watermark column greater than a value
+
+            Args:
+                value - The last compared watermark. If None, every row is queried.
+        """
+        if self._watermark is None:
+            raise InvalidCompSetException('The SourcePair has no watermark column')
+        self._since = value
+        self._set_queries(*self._queries)
+
+    def max_watermark(self):
+        """
+            Get the highest watermark value in the query results, ignoring nulls
+
+            Returns:
+                The highest value, or None if the results are empty
+        """
+        values = list()
+        for result in self.query_results:
+            if result is None:
+                continue
+            if is_table(result):
+                values.extend(result.column(self._watermark).to_pylist())
+            else:
+                values.extend(row[self._watermark] for row in result)
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
 
     def _set_empty(self):
         """
@@ -155,6 +368,8 @@ class SourcePair(object):
         """
         self._lresult = None
         self._rresult = None
+        self._profile = list()
+        self._pushed = dict()
 
     def _format_rquery(self):
         """
@@ -175,42 +390,303 @@ class SourcePair(object):
                  WHERE uuid IN ('uuid_1', 'uuid_2', 'uuid_3')
                    AND id NOT IN (1, 2, 3)
         """
-        qfmt = re.compile(r'\{\{[\s]?[a-zA-Z0-9\_]+[\s]?\}\}')
-        formatting = qfmt.findall(self._rquery)
-
-        if not formatting:
+        template = self._template
+        if not template.templated:
             return self._rquery
+
+        _log.info('While formatting rquery, found slot for keys : %r', template.keys)
+        return template.render(lambda key: format_result_column(self._lresult, key))
+
+    @property
+    def _template(self):
+        """
+            The compiled rquery, which is kept across clear() and only recompiled if the rquery changes
+        """
+        if self._rtemplate is None or self._rtemplate.source is not self._rquery:
+            self._rtemplate = RQueryTemplate(self._rquery or '')
+        return self._rtemplate
+
+    @property
+    def templated(self):
+        """
+            Returns True if the rquery references the lquery result with {{ column }} slots
+        """
+        if self._rquery is None:
+            return False
+        return self._template.templated
+
+    def _query(self, source, query, params=None, shared=True):
+        """
+            Run a single query against a source, holding a slot of its concurrency limit if one is set
+
+            If the SourcePair is part of a QueryPlan, the result is shared with every other SourcePair
+            running the same query. If it has a cache, a cached result is returned without running the query.
+            Queries with params, or that aren't shared, depend on more than their text and skip both.
+        """
+        if params or not shared:
+            limit = self._limits.get(source_id(source)) if self._limits else None
+            if limit is None:
+                return source.query(query, **(params or dict()))
+            with limit:
+                return source.query(query, **(params or dict()))
+
+        if self._plan is not None:
+            self._planned.append((source, query))
+            return self._plan.fetch(source, query, self._run_query)
+        return self._run_query(source, query)
+
+    def _run_query(self, source, query):
+        if self._cache is not None:
+            found, result = self._cache.get(source, query)
+            if found:
+                return result
+
+        limit = self._limits.get(source_id(source)) if self._limits else None
+        if limit is None:
+            result = source.query(query)
         else:
-            rquery = self._rquery
-            keys = [key.strip('{ }') for key in formatting]
+            with limit:
+                result = source.query(query)
 
-            _log.info('While formatting rquery, found slot for keys : %r', keys)
+        if self._cache is not None:
+            self._cache.set(source, query, result)
+        return result
 
-            for fmt, key in zip(formatting, keys):
-                try:
-                    repl = self._lresult[key]._rquery_format()
-                except KeyError:
-                    raise QueryFormatError('Key not found in lquery result : ' + key)
-                rquery = re.sub(fmt, repl, rquery)
+    def _rqueries(self):
+        """
+            Get the rqueries to run for the current lquery result, based on the key strategy
+
+            Returns:
+                list of tuples - [(query, params, shared), ... ]
+        """
+        template = self._template
+        if not template.templated or self._key_strategy == INLINE_KEYS:
+            return [(self._format_rquery(), None, True)]
+
+        columns = dict((key, result_column_values(self._lresult, key)) for key in template.keys)
+        if self._key_strategy == BATCH_KEYS:
+            size = self._key_batch_size
+            total = len(self._lresult)
+            _log.info('Running rquery in %d batches of up to %d keys', max(1, -(-total // size)), size)
+            return [
+                (template.render(lambda key: format_values(columns[key][i:i + size])), None, True)
+                for i in range(0, max(total, 1), size)]
+
+        values = dict((key, tuple(v for v in col if v is not None)) for key, col in six.iteritems(columns))
+        if self._key_strategy == PARAM_KEYS:
+            return [(template.render(lambda key: '%({})s'.format(key)), values, False)]
+
+        self._right.load_keys(self._key_table, values)
+        return [(template.render(lambda key: '(SELECT {} FROM {})'.format(key, self._key_table)), None, False)]
+
+    def _spill_query(self, name, source, queries):
+        """
+            Write the results of queries against a source to a single memory-mapped file
+
+            Args:
+                name : str - 'left' or 'right'
+                source : obj - The source to query
+                queries : list - [(query, params), ... ]
+
+            Returns:
+                pyarrow.Table
+        """
+        source = getattr(source, '__wrapped__', source)
+
+        def batches():
+            iter_query = getattr(source, 'iter_query', None)
+            for query, params in queries:
+                if params or iter_query is None:
+                    yield source.query(query, **(params or dict()))
+                else:
+                    for batch in iter_query(query, batch_size=self._spill_batch_size):
+                        yield batch
+
+        limit = self._limits.get(source_id(source)) if self._limits else None
+        if limit is None:
+            return self._spill.write(name, batches())
+        with limit:
+            return self._spill.write(name, batches())
+
+    def _get_spilled_query_results(self):
+        """
+            Run each query against its source, writing the results to disk
+        """
+        if self._concurrent and self._right is not None and not self.templated:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                lfuture = executor.submit(
+                    self._fetch, 'lquery', self._spill_query, 'left', self._left, [(self._lquery, None)])
+                rfuture = executor.submit(
+                    self._fetch, 'rquery', self._spill_query, 'right', self._right, [(self._rquery, None)])
+                self._lresult = lfuture.result()
+                self._rresult = rfuture.result()
+            return
+
+        self._lresult = self._fetch('lquery', self._spill_query, 'left', self._left, [(self._lquery, None)])
+        if self._right is not None:
+            with self._stage('format_rquery'):
+                rqueries = [(query, params) for query, params, _ in self._rqueries()]
+            self._rresult = self._fetch('rquery', self._spill_query, 'right', self._right, rqueries)
 
-            return rquery
+    def _get_rresult(self):
+        """
+            Run the rquery, or each of its batches, and merge the results
+        """
+        with self._stage('format_rquery'):
+            rqueries = self._rqueries()
+        return self._fetch('rquery', self._run_rqueries, rqueries)
+
+    def _run_rqueries(self, rqueries):
+        return merge_results([self._query(self._right, q, params, shared) for q, params, shared in rqueries])
+
+    def _get_concurrent_query_results(self):
+        """
+            Runs the left and right queries at the same time, each on its own thread
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lfuture = executor.submit(self._fetch, 'lquery', self._query, self._left, self._lquery)
+            rfuture = executor.submit(self._fetch, 'rquery', self._query, self._right, self._rquery)
+            self._lresult = lfuture.result()
+            self._rresult = rfuture.result()
 
     def get_query_results(self):
         """
             Runs each query against its source
+
+            If the SourcePair is concurrent and the rquery does not depend on the lquery result,
+            both queries are run at the same time. Otherwise the lquery is run first.
         """
-        self._lresult = self._left.query(self._lquery)
+        if self._spill is not None:
+            self._get_spilled_query_results()
+            return
+
+        if self._concurrent and self._right is not None and not self.templated:
+            self._get_concurrent_query_results()
+            return
+
+        self._lresult = self._fetch('lquery', self._query, self._left, self._lquery)
 
         # Skip running rquery if no right source was provided
         if self._right is not None:
-            rquery = self._format_rquery()
-            self._rresult = self._right.query(rquery)
+            self._rresult = self._get_rresult()
+
+    def _iter_query(self, source, query, batch_size):
+        """
+            Get an iterator of row batches from a source
+
+            Sources that implement 'iter_query' (e.g. with a server-side cursor) are streamed, otherwise
+            the full result of 'query' is split into batches.
+        """
+        iter_query = getattr(source, 'iter_query', None)
+        if iter_query is not None:
+            return iter_query(query, batch_size=batch_size)
+        _log.warning('Source %r does not implement iter_query, the full result will be loaded into memory', source)
+        return iter_batches(source.query(query), batch_size)
+
+    def iter_query_results(self, batch_size=10000):
+        """
+            Get iterators of row batches for each query, without storing the results
+
+            Kwargs:
+                batch_size : int - The number of rows to request in each batch
+
+            Returns:
+                tuple - Iterators of row batches (left, right)
+        """
+        if self._right is None:
+            return (self._iter_query(self._left, self._lquery, batch_size), )
+        if self.templated:
+            raise QueryFormatError('A templated rquery requires the full lquery result and cannot be streamed')
+        return (
+            self._iter_query(self._left, self._lquery, batch_size),
+            self._iter_query(self._right, self._rquery, batch_size))
+
+    def _pushdown(self, kind, side, rewrite, value, full_value):
+        """
+            Run a rewritten query against one source, unless the full results have already been fetched
+
+            Args:
+                kind : str - 'count' or 'first', the name of the stage
+                side : int - 0 for the lquery, 1 for the rquery
+                rewrite : callable - Rewrites the query
+                value : callable - Gets the value from the rewritten query's result
+                full_value : callable - Gets the value from the full result
+        """
+        if side and self._right is None:
+            raise IndexError('The SourcePair has no right source')
+        if side and self.templated and self.empty:
+            # The rquery needs the full lquery result to be formatted
+            self.get_query_results()
+        if not self.empty:
+            return full_value(self.query_results[side])
+
+        key = (kind, side)
+        if key not in self._pushed:
+            source, query = (self._right, self._rquery) if side else (self._left, self._lquery)
+            self._pushed[key] = value(self._fetch(kind, self._query, source, rewrite(query)))
+        return self._pushed[key]
+
+    def count(self, side=0):
+        """
+            Count the rows of a query result, with a COUNT(*) query if the result hasn't been fetched
+
+            Kwargs:
+                side : int - 0 for the lquery, 1 for the rquery
+
+            Returns:
+                int
+        """
+        return self._pushdown('count', side, count_query, _scalar, len)
+
+    def first(self, side=0):
+        """
+            Get the first row of a query result, with a LIMIT 1 query if the result hasn't been fetched
+
+            Kwargs:
+                side : int - 0 for the lquery, 1 for the rquery
+        """
+        return self._pushdown('first', side, limit_query, _first, _first)
+
+    def checksum(self, spec):
+        """
+            Compare the two sources with chunked checksums computed by each database
+
+            The lquery and rquery are not used, the queries are generated from the spec instead.
+
+            Args:
+                spec : checksum.ChecksumSpec - The table, key, and columns to checksum
+
+            Returns:
+                checksum.ChecksumResult - Truthy if no key ranges differ
+        """
+        if self._right is None:
+            raise InvalidCompSetException('Checksum comparisons require a right source')
+        return checksum_diff(self, spec)
+
+    def aget_query_results(self):
+        """
+            Coroutine that runs each query against its source without blocking the event loop
+
+            Sources with an 'aquery' coroutine method are awaited, others are run in an executor.
+            Requires Python 3.6+.
+        """
+        from .aio import aget_query_results
+        return aget_query_results(self)
 
     def clear(self):
         """
-            Clear the query results to allow for a refresh
+            Clear the query results to allow for a refresh, deleting any results spilled to disk
+
+            If the SourcePair is part of a QueryPlan, the shared results of its queries are dropped too, so
+            they run again for the next SourcePair that needs them.
         """
         self._set_empty()
+        if self._plan is not None:
+            for source, query in self._planned:
+                self._plan.discard(source, query)
+        self._planned = list()
+        if self._spill is not None:
+            self._spill.clear()
 
 
 class Comparator(object):
@@ -230,12 +706,47 @@ class Comparator(object):
                           sets, performs arbitrary checks, and returns an outcome.
             name : string - A name to give this particular Comparator instance, useful for checking results when
                             instantiating multiple as part of a ComparatorSet.
+            concurrent : bool - Run the left and right queries at the same time. Ignored if sp is provided.
+            stream : bool - Compare the query results batch by batch without holding them in memory. Each comp
+                            must have a 'stream' attribute set to a comps.StreamComp subclass, as the built-in
+                            comps do. The rquery cannot reference the lquery result.
+            batch_size : int - The number of rows to compare at a time when streaming
+            checksum : checksum.ChecksumSpec - Compare chunked checksums computed by each source instead of the
+                                               query results. The comps are ignored.
+            state : state.StateStore - Compare incrementally, only querying the rows past the watermark of the
+                                       last passing run. The SourcePair must have a watermark column, and the
+                                       Comparator must have a name, which its state is stored under.
+            short_circuit : bool - Run the comps in order of their 'cost' attribute, cheapest first, and skip
+                                   any comp with a 'depends' attribute naming a comp that did not pass. Skipped
+                                   comps have a None result and a 'skipped' status. See comps.hints.
+            comp_workers : int - Run up to this many comps at the same time. Results are still yielded in order.
+            comp_executor : str - Run the comps on 'thread's, or in 'process'es for CPU-bound comps. Each worker
+                                  process receives the query results once, and comps must be module level
+                                  functions so they can be sent to the workers. Requires Python 3.7+.
+            sample : sample.SampleSpec - Compare a deterministic sample of keys instead of the full results, with
+                                         a single 'sample_comp' result reporting the mismatch rate and its
+                                         confidence interval. The comps are only used when escalating.
+            escalate : bool - If the sampled comparison fails, run the full queries and the comps
+            profiler : profile.Profiler - Measure each stage of a run. The stages of the queries are recorded
+                                          by the SourcePair, and the stage of each comp is set as the profile
+                                          of its ComparatorResult. Both are listed by Comparator.profile.
+            lazy : bool - Don't fetch the query results until a comp needs them. Comps with a 'needs' hint of
+                          'count' or 'first' are given a lazy.ResultHandle for each side, which runs a COUNT(*)
+                          or LIMIT 1 query instead. See comps.hints.
+            project : bool - If every comp has a 'columns' hint, query only the union of those columns by
+                             setting them on the SourcePair. Ignored for sampled and checksum comparisons,
+                             which read every column. The query is wrapped in a subquery, and databases don't
+                             have to keep a subquery's ORDER BY, so comps that compare rows by position may
+                             see them reordered. See comps.hints and SourcePair.explain.
     """
-    def __init__(self, left=None, lquery=None, right=None, rquery=None, sp=None, comps=None, name=None):
+    def __init__(self, left=None, lquery=None, right=None, rquery=None, sp=None, comps=None, name=None,
+                 concurrent=False, stream=False, batch_size=10000, checksum=None, state=None, short_circuit=False,
+                 comp_workers=None, comp_executor=THREAD, sample=None, escalate=False, profiler=None,
+                 lazy=False, project=False):
         if sp is not None:
             self._sp = sp
         else:
-            self._sp = SourcePair(left, lquery, right, rquery)
+            self._sp = SourcePair(left, lquery, right, rquery, concurrent=concurrent)
 
         # Set the list of comparisons
         if comps is None:
@@ -255,7 +766,57 @@ class Comparator(object):
             _log.warning('No valid comparisons found, falling back to default')
             self._comps.append(COMPS[DEFAULT_COMP])
 
+        self._short_circuit = short_circuit
+        self._comp_workers = comp_workers
+        self._comp_executor = comp_executor
+        if comp_workers:
+            check_executor(comp_executor, self._comps)
+        # Names and hints are resolved once here rather than on every run
+        self._descs = [CompDescriptor(comp) for comp in self._comps]
+        self._stream = stream
+        self._batch_size = batch_size
+        self._checksum = checksum
+        if (stream or checksum is not None) and self._sp._result_format == ARROW:
+            raise InvalidCompSetException('Arrow results cannot be streamed or checksummed')
+
+        self._sample = sample
+        self._escalate = escalate
+        if sample is not None:
+            if stream or checksum is not None:
+                raise InvalidCompSetException('Sampled comparisons cannot be streamed or checksummed')
+            if self._sp._right is None:
+                raise InvalidCompSetException('Sampled comparisons require a right source')
+            self._sp.set_sample(sample)
+        if stream:
+            if self._sp._right is None:
+                raise InvalidCompSetException('Streaming comparisons require a right source')
+            for desc in self._descs:
+                if desc.stream is None:
+                    raise InvalidCompSetException('Comp does not support streaming : %r' % desc.comp)
+
         self._name = name
+        if profiler is not None:
+            self._sp.set_profiler(profiler, comparator=name)
+
+        self._state = state
+        self._watermark_state = None
+        if state is not None:
+            if self._sp.watermark is None:
+                raise InvalidCompSetException('Incremental comparisons require a SourcePair with a watermark column')
+            if name is None:
+                raise InvalidCompSetException('Incremental comparisons require a Comparator name')
+            if stream or checksum is not None:
+                raise InvalidCompSetException('Incremental comparisons cannot be streamed or checksummed')
+            self._watermark_state = state.get(name)
+            self._sp.set_since(self._watermark_state.watermark)
+
+        if project and sample is None and checksum is None:
+            # Also resets the projection of a SourcePair reused from another Comparator
+            self._sp.set_columns(comp_columns(self._descs))
+
+        self._lazy = lazy
+        if lazy and (stream or checksum is not None or sample is not None or state is not None):
+            raise InvalidCompSetException('Lazy comparisons cannot be streamed, checksummed, sampled or incremental')
 
         # Set an empty result
         self._set_empty()
@@ -269,10 +830,97 @@ class Comparator(object):
     def name(self):
         return self._name
 
+    @property
+    def stream(self):
+        return self._stream
+
+    @property
+    def _deferred(self):
+        """
+            True if the queries are run while comparing rather than stored up front
+
+            Sampled Comparators that escalate may run the full queries while comparing, and lazy Comparators
+            only run them if a comp needs the full results.
+        """
+        return (self._stream or self._checksum is not None or self._lazy or
+                (self._sample is not None and self._escalate))
+
+    @property
+    def error(self):
+        """
+            The exception raised while running this Comparator as part of ComparatorSet.run, if any
+        """
+        return self._error
+
     @property
     def results(self):
         return self._results
 
+    @property
+    def failed(self):
+        """
+            Returns True if the Comparator raised or any of its comparisons failed
+        """
+        return self._error is not None or any(result.status == FAILED for result in self._results)
+
+    @property
+    def state(self):
+        """
+            The cumulative state of an incremental Comparator, see state.WatermarkState
+        """
+        return self._watermark_state
+
+    def _record_state(self):
+        """
+            Persist the outcome of an incremental run, and filter the next run past its watermark
+        """
+        passed = all(result.status == PASSED for result in self._results)
+        lresult = self._sp._lresult
+        self._watermark_state.record(
+            passed, watermark=self._sp.max_watermark(), rows=len(lresult) if lresult is not None else 0)
+        self._state.set(self._name, self._watermark_state)
+        self._sp.set_since(self._watermark_state.watermark)
+        _log.info('Recorded incremental state for %r : %r', self, self._watermark_state)
+
+    @property
+    def profile(self):
+        """
+            The stages of the last run, if the Comparator has a Profiler : its queries, then its comps
+
+            Returns:
+                list - profile.Stage objects
+        """
+        return self._sp.profile + self._profile
+
+    def _stage(self, name, **labels):
+        return self._sp._stage(name, self._profile, **labels)
+
+    def _comp_args(self, needs=None):
+        """
+            Get the query results to pass to a comp, as result handles if the comp only needs part of them
+
+            Args:
+                needs : str - The comp's 'needs' hint, see comps.hints
+        """
+        if self._lazy and needs is not None and self._sp.empty:
+            return tuple(ResultHandle(self._sp, side) for side in range(len(self._sp.query_results)))
+        if self._sp.empty:
+            self._sp.get_query_results()
+        return self._sp.query_results
+
+    def _run_comp(self, comp, name, needs=None):
+        """
+            Run a comp against the query results
+
+            Returns:
+                ComparatorResult
+        """
+        with self._stage('comp', comp=name) as timer:
+            start = default_timer()
+            value = comp(*self._comp_args(needs))
+            elapsed = default_timer() - start
+        return ComparatorResult(self._name, name, value, elapsed=elapsed, profile=timer.stage)
+
     @property
     def query_results(self):
         return self._sp.query_results
@@ -285,6 +933,15 @@ class Comparator(object):
     def rresult(self):
         return self._sp._rresult
 
+    def explain(self):
+        """
+            Describe the queries the Comparator will run, see SourcePair.explain
+
+            Returns:
+                str
+        """
+        return self._sp.explain()
+
     def _set_empty(self):
         """
             Reset all results
@@ -292,11 +949,16 @@ class Comparator(object):
         self._sp.clear()
         self._results = list()
         self._complete = False
+        self._error = None
+        self._profile = list()
 
     def get_query_results(self, run=True):
         """
             Get the results of the two queries
 
+            Streaming and checksum Comparators never store their query results, so the queries are not
+            run and the empty results are returned.
+
             Kwargs:
                 run : bool - Whether to run the queries if
                              self._sp.query_results is empty
@@ -304,7 +966,7 @@ class Comparator(object):
             Returns:
                 tuple - The results of the two queries (left, right)
         """
-        if run and self._sp.empty:
+        if run and self._sp.empty and not self._deferred:
             self._sp.get_query_results()
         return self._sp.query_results
 
@@ -326,40 +988,229 @@ class Comparator(object):
                 if result is False:
                     raise Exception('Failed comparison: {}'.format(comp))
         """
-        if self._sp.empty:
+        if self._stream:
+            for result in self._compare_stream():
+                yield result
+            return
+
+        if self._checksum is not None:
+            if not self._complete:
+                with self._stage('comp', comp='checksum_comp') as timer:
+                    start = default_timer()
+                    result = self._sp.checksum(self._checksum)
+                    elapsed = default_timer() - start
+                self._results.append(ComparatorResult(
+                    self._name, 'checksum_comp', result, elapsed=elapsed, profile=timer.stage))
+                self._complete = True
+            for result in self._results:
+                yield result
+            return
+
+        if self._sample is not None:
+            for result in self._compare_sample():
+                yield result
+            return
+
+        if self._sp.empty and not self._lazy:
             self._sp.get_query_results()
 
         if not self._complete:
-            for comp in self._comps:
-                name = comp.__name__
-                # Try to surface a more useful name if lambda is used
-                if name == '<lambda>':
-                    source = inspect.getsource(comp)
-                    name = 'lambda ' + re.split('lambda', source)[1].strip()
+            for result in self._compare_comps():
+                yield result
 
-                result = ComparatorResult(
-                    self._name, name, comp(*self._sp.query_results))
-                self._results.append(result)
+        else:
+            for result in self._results:
+                yield result
 
+    def _compare_comps(self):
+        """
+            Generator that runs each comp against the stored query results
+        """
+        descs = sorted(self._descs, key=lambda desc: desc.cost) if self._short_circuit else self._descs
+        if self._comp_workers and len(descs) > 1:
+            for result in self._compare_parallel(descs):
                 yield result
+            return
 
-            self._complete = True
+        not_passed = set()
+        for desc in descs:
+            if self._short_circuit and any(dep in not_passed for dep in desc.depends):
+                _log.info('Skipping %s, a comparison it depends on did not pass', desc.name)
+                result = ComparatorResult(self._name, desc.name, None, status=SKIPPED)
+            else:
+                result = self._run_comp(desc.comp, desc.name, desc.needs)
+            if result.status != PASSED:
+                not_passed.add(desc.name)
+            self._results.append(result)
 
-        else:
+            yield result
+
+        self._finish()
+
+    def _compare_sample(self):
+        """
+            Generator that compares the sampled query results, escalating to the full comparison if set
+        """
+        if self._complete:
             for result in self._results:
                 yield result
+            return
+
+        if self._sp.empty:
+            self._sp.get_query_results()
+        result = self._run_comp(lambda left, right: sample_diff(left, right, self._sample), 'sample_comp')
+        self._results.append(result)
+        yield result
+
+        if result or not self._escalate:
+            self._finish()
+            return
 
-    def run_comparisons(self):
+        _log.warning('Sampled comparison of %r failed with %r, running the full comparison', self, result.result)
+        self._sp.clear()
+        self._sp.set_sample(None)
+        try:
+            self._sp.get_query_results()
+        finally:
+            self._sp.set_sample(self._sample)
+        for result in self._compare_comps():
+            yield result
+
+    def _finish(self):
+        """
+            Mark the comparisons as complete, recording the run if the Comparator is incremental
+        """
+        self._complete = True
+        if self._state is not None:
+            self._record_state()
+
+    def _compare_parallel(self, descs):
+        """
+            Generator that runs the comps in a pool, yielding the results in the order of the comps
+
+            With short_circuit, a comp that depends on others waits for them before it is submitted.
+        """
+        entries = list()
+        indexes = dict()
+
+        def resolve(i):
+            if not isinstance(entries[i], ComparatorResult):
+                name, future = entries[i]
+                value, elapsed, started, cpu = future.result()
+                stage = None
+                if self._sp._profiler is not None:
+                    stage = Stage('comp', started, elapsed, cpu, labels=dict(self._sp._profile_labels, comp=name))
+                    self._sp._profiler.emit(stage, self._profile)
+                entries[i] = ComparatorResult(self._name, name, value, elapsed=elapsed, profile=stage)
+            return entries[i]
+
+        if self._sp.empty:
+            self._sp.get_query_results()
+        workers = min(self._comp_workers, len(descs))
+        with CompPool(self._comp_executor, workers, self._sp.query_results) as pool:
+            try:
+                for desc in descs:
+                    deps = desc.depends if self._short_circuit else []
+                    if any(resolve(indexes[dep]).status != PASSED for dep in deps if dep in indexes):
+                        _log.info('Skipping %s, a comparison it depends on did not pass', desc.name)
+                        entries.append(ComparatorResult(self._name, desc.name, None, status=SKIPPED))
+                    else:
+                        entries.append((desc.name, pool.submit(desc.comp)))
+                    indexes[desc.name] = len(entries) - 1
+
+                for i in range(len(entries)):
+                    result = resolve(i)
+                    self._results.append(result)
+                    yield result
+            finally:
+                for entry in entries:
+                    if not isinstance(entry, ComparatorResult):
+                        entry[1].cancel()
+
+        self._finish()
+
+    def _compare_stream(self):
+        """
+            Generator that runs every comparison in a single pass over the streamed query results
+
+            Streaming stops early once every comparison has reached its outcome.
+        """
+        if not self._complete:
+            start = default_timer()
+            stream_comps = [desc.stream() for desc in self._descs]
+            with self._stage('stream') as timer:
+                left, right = self._sp.iter_query_results(self._batch_size)
+                rows = 0
+                try:
+                    for lbatch, rbatch in align_batches(left, right, self._batch_size):
+                        rows += len(lbatch)
+                        for sc in stream_comps:
+                            if not sc.done:
+                                sc.update(lbatch, rbatch)
+                        if all(sc.done for sc in stream_comps):
+                            break
+                finally:
+                    for batches in (left, right):
+                        close = getattr(batches, 'close', None)
+                        if close is not None:
+                            close()
+                timer.rows = rows
+
+            # The comparisons share a single pass, so each is given the elapsed time and stage of the whole pass
+            elapsed = default_timer() - start
+            for desc, sc in zip(self._descs, stream_comps):
+                self._results.append(ComparatorResult(
+                    self._name, desc.name, sc.result(), elapsed=elapsed, profile=timer.stage))
+            self._complete = True
+
+        for result in self._results:
+            yield result
+
+    def run_comparisons(self, copy_results=False):
         """
             Run all comparisons and return the results
 
+            The returned ComparatorResults are shared with the Comparator, since they are immutable.
+
+            Kwargs:
+                copy_results : bool - Return deep copies of the results, for callers that modify result values
+
             Returns:
-                list of tuples
+                list of ComparatorResult
         """
         if not self._complete:
             for _ in self.compare():
                 pass
-        return copy.deepcopy(self._results)
+        if copy_results:
+            return copy.deepcopy(self._results)
+        return list(self._results)
+
+    def acompare(self):
+        """
+            Async generator that yields the results of each comparison
+
+            The queries are awaited without blocking the event loop. Requires Python 3.6+.
+
+            Usage example:
+
+            async for result in c.acompare():
+                if not result:
+                    raise Exception('Failed comparison: {}'.format(result.name))
+        """
+        from .aio import acompare
+        return acompare(self)
+
+    def arun_comparisons(self):
+        """
+            Coroutine that runs all comparisons and returns the results
+
+            The queries are awaited without blocking the event loop. Requires Python 3.6+.
+
+            Returns:
+                list of tuples
+        """
+        from .aio import arun_comparisons
+        return arun_comparisons(self)
 
     def clear(self):
         """
@@ -389,17 +1240,35 @@ class ComparatorSet(object):
                            will self-name using the left and right databases. If passed, must be the same length as
                            the list of queries.
             default_comp : callable - The default comparison to use if no comps are passed. Ignored if comps is passed.
+            cache : cache.QueryCache - A cache of query results to share between every source pair
+            dedupe : bool - Plan the queries of every source pair so that identical queries against the same
+                            source are only run once, with the result shared between source pairs
+            state : state.StateStore - Compare incrementally. Only the Comparators whose source pair has a
+                                       watermark column use the state, see Comparator.
+            profiler : profile.Profiler - Measure the stages of every Comparator, see Comparator
     """
-    def __init__(self, source_pairs, comps=None, names=None, default_comp=None):
+    def __init__(self, source_pairs, comps=None, names=None, default_comp=None, cache=None, dedupe=False,
+                 state=None, profiler=None):
         self._set_source_pairs(source_pairs)
+        if cache is not None:
+            for sp in self._source_pairs:
+                sp._cache = cache
+
         self._set_comps(comps, default_comp)
         self._set_names(names)
 
         self._comparisons = [
-            Comparator(sp=sp, comps=c, name=n)
+            Comparator(sp=sp, comps=c, name=n, state=state if sp.watermark is not None else None, profiler=profiler)
             for sp, c, n in zip(self._source_pairs, self._comps, self._names)
         ]
 
+        # Planned after the Comparators, since incremental Comparators rewrite their queries
+        self._plan = None
+        if dedupe:
+            self._plan = QueryPlan(self._source_pairs)
+            for sp in self._source_pairs:
+                sp._plan = self._plan
+
     def __repr__(self):
         return '<ComparatorSet: {cs._comparisons}>'.format(cs=self)
 
@@ -420,6 +1289,48 @@ class ComparatorSet(object):
     def __getitem__(self, key):
         return self._comparisons[key]
 
+    def __len__(self):
+        return len(self._comparisons)
+
+    @property
+    def results(self):
+        """
+            The results of every Comparator in the set that has been run
+
+            Returns:
+                ResultStore
+        """
+        store = ResultStore()
+        for c in self._comparisons:
+            store.extend(c.results)
+        return store
+
+    @property
+    def plan(self):
+        """
+            The QueryPlan shared by the source pairs, if the set was created with dedupe
+        """
+        return self._plan
+
+    def explain(self):
+        """
+            Describe the queries the set will run, and how many round trips deduplication saves
+
+            Returns:
+                str
+        """
+        plan = self._plan or QueryPlan(self._source_pairs)
+        return plan.explain()
+
+    def clear(self):
+        """
+            Clear the results of every Comparator, and any shared query results, to allow a refresh
+        """
+        for c in self._comparisons:
+            c.clear()
+        if self._plan is not None:
+            self._plan.clear()
+
     def _set_source_pairs(self, source_pairs):
         if not isinstance(source_pairs, list):
             source_pairs = [source_pairs]
@@ -469,8 +1380,114 @@ class ComparatorSet(object):
 
         self._names = names
 
+    def _run_comparator(self, comparator, semaphores, stop=None):
+        """
+            Run the queries and comparisons for a single Comparator, honoring any per-source limits
+
+            Any exception is attached to the Comparator rather than raised, so that one failing pair
+            does not end the whole run. If the stop event is set before the comparisons start, the
+            Comparator is abandoned with a ComparisonCancelled error.
+        """
+        sp = comparator._sp
+        sp._limits = semaphores
+        comparator._error = None
+        try:
+            if stop is not None and stop.is_set():
+                raise ComparisonCancelled('The ComparatorSet run was stopped')
+            if comparator.stream:
+                # Streaming Comparators query their sources while the comparisons run
+                held = _stream_source_keys(sp, semaphores)
+                for key in held:
+                    semaphores[key].acquire()
+                try:
+                    comparator.run_comparisons()
+                finally:
+                    for key in reversed(held):
+                        semaphores[key].release()
+            else:
+                comparator.get_query_results()
+                if stop is not None and stop.is_set():
+                    raise ComparisonCancelled('The ComparatorSet run was stopped')
+                comparator.run_comparisons()
+        except ComparisonCancelled as e:
+            comparator._error = e
+        except Exception as e:
+            _log.exception('Comparator %r failed', comparator)
+            comparator._error = e
+        finally:
+            sp._limits = None
+        return comparator
+
+    def run(self, max_workers=None, source_limits=None, max_failures=None):
+        """
+            Run every Comparator in the set across a bounded pool of threads
+
+            Comparators are yielded as soon as their comparisons are complete, which is not
+            necessarily the order of the set. A Comparator that raised is still yielded, with the
+            exception set as its error. Sources are shared between threads, so they must be safe to
+            query concurrently unless limited to a single query at a time.
+
+            Kwargs:
+                max_workers : int - The maximum number of Comparators to run at once. Defaults to
+                                    the size of the set.
+                source_limits : dict - A mapping of {source: int} capping the number of queries
+                                       that may run against a particular source at once
+                max_failures : int - Stop the run once this many Comparators have failed. Queued Comparators
+                                     are cancelled, and running Comparators are abandoned at the next step
+                                     with a ComparisonCancelled error. Neither is yielded.
+
+            Yields:
+                Comparator - Each Comparator, after its comparisons have been run
+        """
+        if not self._comparisons:
+            return
+
+        max_workers = max_workers or len(self._comparisons)
+        semaphores = dict(
+            (source_id(source), threading.BoundedSemaphore(limit))
+            for source, limit in six.iteritems(source_limits or dict()))
+
+        stop = threading.Event()
+        failures = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._run_comparator, c, semaphores, stop) for c in self._comparisons]
+            try:
+                for future in as_completed(futures):
+                    comparator = future.result()
+                    yield comparator
+                    failures += comparator.failed
+                    if max_failures is not None and failures >= max_failures:
+                        _log.warning('Stopping the run after %d failed Comparators', failures)
+                        return
+            finally:
+                # Don't start any queued Comparators if the caller stopped early
+                stop.set()
+                for future in futures:
+                    future.cancel()
+
+    def arun(self, max_concurrency=None, source_limits=None, max_failures=None):
+        """
+            Async generator that runs every Comparator in the set without blocking the event loop
+
+            Comparators are yielded as soon as their comparisons are complete. A Comparator that raised is
+            still yielded, with the exception set as its error. Requires Python 3.6+.
+
+            Kwargs:
+                max_concurrency : int - The maximum number of Comparators to query at once. Defaults to
+                                        the size of the set.
+                source_limits : dict - A mapping of {source: int} capping the number of queries
+                                       that may run against a particular source at once
+                max_failures : int - Stop the run once this many Comparators have failed, cancelling the rest
+
+            Yields:
+                Comparator - Each Comparator, after its comparisons have been run
+        """
+        from .aio import arun
+        return arun(self, max_concurrency=max_concurrency, source_limits=source_limits, max_failures=max_failures)
+
     @classmethod
-    def from_dict(cls, dict_or_dicts, left=None, right=None, default_comp=None):
+    def from_dict(cls, dict_or_dicts, left=None, right=None, default_comp=None, concurrent=False, cache=None,
+                  dedupe=False, state=None, profiler=None):
         """
             Build a ComparatorSet from a dict or list of dicts of source pairs and comparisons
 
@@ -481,6 +1498,7 @@ class ComparatorSet(object):
                 'rquery': str - The query to run against the "right" source
                 'sp' : SourcePair - An instantiated SourcePair object
                 'comps': callable or list of callables - The comparison(s) to run against the result
+                'watermark': str - A watermark column to compare incrementally, see SourcePair
             }
             The 'lquery' value is required, unless a SourcePair is provided.
             The 'comps' value is optional, and the 'name' value is optional but recommended.
@@ -495,6 +1513,11 @@ class ComparatorSet(object):
                 left : obj - The "left" data source, against which the "left" query will run
                 right : obj - The "right" data source, against which the "right" query will run
                 default_comp : callable or list - The fallback comps to use if comps is not set for a set of queries
+                concurrent : bool - Run the left and right queries of each new SourcePair at the same time
+                cache : cache.QueryCache - A cache of query results to share between every source pair
+                dedupe : bool - Run identical queries only once across the set, see ComparatorSet
+                state : state.StateStore - Compare the source pairs with a watermark incrementally
+                profiler : profile.Profiler - Measure the stages of every Comparator
 
             Returns:
                 instantiated ComparatorSet
@@ -517,9 +1540,12 @@ class ComparatorSet(object):
             all_names.append(d.get('name', None))
             sp = d.get('sp', None)
             if sp is None:
-                sp = SourcePair(left, d['lquery'], right, d.get('rquery', None))
+                sp = SourcePair(
+                    left, d['lquery'], right, d.get('rquery', None), concurrent=concurrent,
+                    watermark=d.get('watermark', None))
 
             all_source_pairs.append(sp)
             all_comps.append(d.get('comps', default_comp or DEFAULT_COMP))
 
-        return cls(all_source_pairs, all_comps, all_names)
+        return cls(
+            all_source_pairs, all_comps, all_names, cache=cache, dedupe=dedupe, state=state, profiler=profiler)
@@ -2,7 +2,24 @@ from .basic import (
     BASIC_COMP,
     LEN_COMP,
     FIRST_COMP,
+    VECTOR_COMP,
+    NULL_EQ_COMP,
+    APPROX_COMP,
+    MISMATCH_COMP,
+    DISTINCT_COMP,
+    MEMBERSHIP_COMP,
+    QUANTILE_COMP,
     DEFAULT_COMP,
     COMPS)
+from .descriptor import CompDescriptor, comp_columns, comp_name
+from .keyed import keyed_comp, KeyedDiff
+from .policy import hints, NEEDS_COUNT, NEEDS_FIRST
+from .sketch import distinct_comp, membership_comp, quantile_comp, DistinctCounts, MembershipDiff, QuantileDiff
+from .stream import StreamComp
+from .vector import approx_comp, ColumnMismatches
 
-__all__ = [BASIC_COMP, LEN_COMP, FIRST_COMP, DEFAULT_COMP, COMPS]
+__all__ = [
+    BASIC_COMP, LEN_COMP, FIRST_COMP, VECTOR_COMP, NULL_EQ_COMP, APPROX_COMP, MISMATCH_COMP, DISTINCT_COMP,
+    MEMBERSHIP_COMP, QUANTILE_COMP, DEFAULT_COMP, COMPS, StreamComp, keyed_comp, KeyedDiff, hints, approx_comp,
+    ColumnMismatches, distinct_comp, membership_comp, quantile_comp, DistinctCounts, MembershipDiff, QuantileDiff,
+    CompDescriptor, comp_columns, comp_name, NEEDS_COUNT, NEEDS_FIRST]
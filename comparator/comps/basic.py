@@ -1,9 +1,22 @@
 """
     Comparison callables
 """
+from ..arrow import is_table
+from .policy import NEEDS_COUNT, NEEDS_FIRST
+from .sketch import distinct_comp, membership_comp, quantile_comp
+from .stream import BasicStreamComp, LenStreamComp, FirstStreamComp
+from .vector import vector_eq_comp, null_eq_comp, mismatch_counts_comp, approx_comp
+
 BASIC_COMP = 'basic'
 LEN_COMP = 'len'
 FIRST_COMP = 'first'
+VECTOR_COMP = 'vector'
+NULL_EQ_COMP = 'null_eq'
+APPROX_COMP = 'approx'
+MISMATCH_COMP = 'mismatches'
+DISTINCT_COMP = 'distinct'
+MEMBERSHIP_COMP = 'membership'
+QUANTILE_COMP = 'quantiles'
 DEFAULT_COMP = BASIC_COMP
 
 
@@ -15,12 +28,46 @@ def len_comp(left, right):
     return basic_comp(len(left), len(right))
 
 
+def _first(result):
+    if is_table(result):
+        rows = result.slice(0, 1).to_pylist()
+        return rows[0] if rows else None
+    return result.first()
+
+
 def first_eq_comp(left, right):
-    return basic_comp(left.first(), right.first())
+    return basic_comp(_first(left), _first(right))
+
+
+basic_comp.stream = BasicStreamComp
+len_comp.stream = LenStreamComp
+first_eq_comp.stream = FirstStreamComp
+
+# Counting is cheaper than comparing every row, and rows can't all match if the counts don't
+len_comp.cost = 1
+first_eq_comp.cost = 2
+len_comp.columns = []
+basic_comp.cost = 10
+basic_comp.depends = [LEN_COMP]
+vector_eq_comp.cost = 5
+vector_eq_comp.depends = [LEN_COMP]
+null_eq_comp.cost = 5
+null_eq_comp.depends = [LEN_COMP]
+mismatch_counts_comp.cost = 5
 
+# Lazy Comparators only fetch a count or the first row for these
+len_comp.needs = NEEDS_COUNT
+first_eq_comp.needs = NEEDS_FIRST
 
 COMPS = {
     BASIC_COMP: basic_comp,
     LEN_COMP: len_comp,
     FIRST_COMP: first_eq_comp,
+    VECTOR_COMP: vector_eq_comp,
+    NULL_EQ_COMP: null_eq_comp,
+    APPROX_COMP: approx_comp(),
+    MISMATCH_COMP: mismatch_counts_comp,
+    DISTINCT_COMP: distinct_comp(),
+    MEMBERSHIP_COMP: membership_comp(),
+    QUANTILE_COMP: quantile_comp(),
 }
@@ -0,0 +1,133 @@
+"""
+    Metadata of comparison callables, resolved once per comp
+
+    A Comparator describes each of its comps when it is created, so the name, hints and streaming support
+    of a comp are not looked up again on every run. Names of lambdas are read from their source, which is
+    slow, so they are also cached for as long as the lambda is alive.
+"""
+import functools
+import inspect
+import re
+import threading
+import weakref
+
+from .basic import COMPS
+from .policy import DEFAULT_COST
+
+_names = weakref.WeakKeyDictionary()
+_names_lock = threading.Lock()
+
+
+def _resolve_name(comp):
+    if isinstance(comp, functools.partial):
+        return comp_name(comp.func)
+
+    name = getattr(comp, '__name__', None)
+    if name is None:
+        # A callable object
+        return type(comp).__name__
+
+    # Try to surface a more useful name if lambda is used
+    if name == '<lambda>':
+        try:
+            source = inspect.getsource(comp)
+        except (IOError, OSError, TypeError):
+            # Defined somewhere without source, like an interactive session
+            return name
+        name = 'lambda ' + re.split('lambda', source)[1].strip()
+    return name
+
+
+def comp_name(comp):
+    """
+        Get the display name of a comp
+
+        Lambdas are named from their source, partials by the function they wrap, and callable objects
+        by their class.
+
+        Args:
+            comp : callable
+
+        Returns:
+            str
+    """
+    try:
+        with _names_lock:
+            name = _names.get(comp)
+    except TypeError:
+        # Can't be weakly referenced or hashed, so the name isn't cached
+        return _resolve_name(comp)
+    if name is None:
+        name = _resolve_name(comp)
+        with _names_lock:
+            _names[comp] = name
+    return name
+
+
+def dep_name(dep):
+    """
+        Get the comparison name of a comp dependency, given as a callable, comps constant, or name
+    """
+    if callable(dep):
+        return comp_name(dep)
+    if dep in COMPS:
+        return comp_name(COMPS[dep])
+    return dep
+
+
+def comp_columns(descs):
+    """
+        Get the union of the columns read by comps, in the order they are first named
+
+        Args:
+            descs : list - CompDescriptor objects
+
+        Returns:
+            list - Or None if any comp reads every column
+    """
+    columns = list()
+    for desc in descs:
+        if desc.columns is None:
+            return None
+        for column in desc.columns:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+class CompDescriptor(object):
+    """
+        A comp with its name, hints and streaming support resolved
+
+        Calling the descriptor calls the comp. The hints of a partial default to those of the function it wraps.
+
+        Args:
+            comp : callable - The comparison
+
+        Attributes:
+            comp : callable - The comparison
+            name : str - The display name, see comp_name
+            cost : int/float - See policy.hints
+            depends : list - The names of the comps this comp depends on, see policy.hints
+            stream : type - The comp's StreamComp subclass, or None if it can't stream
+            needs : str - What the comp uses of each result, see policy.hints. None if it needs the full results.
+            columns : list - The columns the comp reads, see policy.hints. None if it reads every column.
+    """
+    __slots__ = ['comp', 'name', 'cost', 'depends', 'stream', 'needs', 'columns']
+
+    def __init__(self, comp):
+        wrapped = comp.func if isinstance(comp, functools.partial) else comp
+        self.comp = comp
+        self.name = comp_name(comp)
+        self.cost = getattr(comp, 'cost', getattr(wrapped, 'cost', DEFAULT_COST))
+        depends = getattr(comp, 'depends', None) or getattr(wrapped, 'depends', None) or list()
+        self.depends = [dep_name(dep) for dep in depends]
+        self.stream = getattr(comp, 'stream', getattr(wrapped, 'stream', None))
+        self.needs = getattr(comp, 'needs', getattr(wrapped, 'needs', None))
+        self.columns = getattr(comp, 'columns', getattr(wrapped, 'columns', None))
+
+    def __repr__(self):
+        return '<CompDescriptor({})>'.format(self.name)
+
+    def __call__(self, *query_results):
+        return self.comp(*query_results)
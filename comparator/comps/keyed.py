@@ -0,0 +1,211 @@
+"""
+    Keyed comparison of unordered results
+
+    The left result is reduced to a compact hash index of (key hash, row hash) pairs, and the right
+    result is streamed against it in batches. No sorting is needed on either side, so the queries
+    do not need an ORDER BY.
+
+    Values are hashed from a canonical encoding rather than the dtype pandas infers for each batch, so
+    1, 1.0 and Decimal('1') hash the same, as do None, NaN and NaT.
+"""
+import datetime
+import decimal
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from pandas.util import hash_pandas_object
+
+from .stream import iter_batches
+
+
+class KeyedDiff(object):
+    """
+        The outcome of a keyed comparison
+
+        Truthy if both results contain the same keys with the same row values.
+
+        Args:
+            keys : list - The key columns used for the comparison
+            missing : list - Key tuples found in the left result but not the right
+            extra : list - Key tuples found in the right result but not the left
+            changed : list - Key tuples found in both results with different row values
+    """
+    def __init__(self, keys, missing, extra, changed):
+        self.keys = keys
+        self.missing = missing
+        self.extra = extra
+        self.changed = changed
+
+    def __repr__(self):
+        return '<KeyedDiff(missing={}, extra={}, changed={})>'.format(
+            len(self.missing), len(self.extra), len(self.changed))
+
+    def __bool__(self):
+        return not (self.missing or self.extra or self.changed)
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, KeyedDiff):
+            return (self.missing, self.extra, self.changed) == (other.missing, other.extra, other.changed)
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+_NA = getattr(pd, 'NA', None)
+
+
+def _encode(value):
+    """
+        Encode a value as a string that doesn't depend on its type's width or the driver that returned it
+    """
+    if value is None or value is pd.NaT or (_NA is not None and value is _NA):
+        return 'N'
+    if isinstance(value, (bool, np.bool_)):
+        return 'n%d' % value
+    if isinstance(value, numbers.Integral):
+        return 'n%d' % int(value)
+    if isinstance(value, (float, np.floating, decimal.Decimal)):
+        if value != value:
+            return 'N'
+        if value in (float('inf'), float('-inf')) or value != int(value):
+            return 'n' + repr(float(value))
+        return 'n%d' % int(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return 't' + value.isoformat()
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return 'y' + value.decode('latin-1')
+    return 's%s' % (value, )
+
+
+def hash_columns(frame, columns):
+    """
+        Hash each row of a frame over the given columns, from a canonical encoding of each value
+
+        Args:
+            frame : pandas.DataFrame
+            columns : list - The columns to hash, in order
+
+        Returns:
+            numpy.ndarray - A uint64 hash per row
+    """
+    encoded = pd.DataFrame(
+        dict((i, [_encode(v) for v in frame[c].astype(object)]) for i, c in enumerate(columns)),
+        index=frame.index, columns=range(len(columns)))
+    return hash_pandas_object(encoded, index=False).values.astype(np.uint64)
+
+
+def _hash_batch(batch, keys):
+    """
+        Hash a batch of rows into (key hashes, row hashes, frame)
+
+        Columns are hashed in name order so the column order of each query does not matter.
+    """
+    df = pd.DataFrame([dict(row.items()) for row in batch])
+    missing = [k for k in keys if k not in df.columns]
+    if missing:
+        raise KeyError('Key columns not found in result : %r' % missing)
+    key_hashes = hash_columns(df, keys)
+    row_hashes = hash_columns(df, sorted(df.columns))
+    return key_hashes, row_hashes, df
+
+
+class KeyIndex(object):
+    """
+        A compact hash index of one side of a keyed comparison
+
+        Only two 64-bit hashes are held per row (plus the lookup table), regardless of the width of
+        the row, so the index scales to tens of millions of keys.
+
+        Args:
+            rows : iterable - The rows to index. Each row must provide items(), like a dict or QueryResultRow.
+            keys : list - The key columns
+
+        Kwargs:
+            batch_size : int - The number of rows to hash at a time
+    """
+    def __init__(self, rows, keys, batch_size=100000):
+        key_hashes, row_hashes = [np.empty(0, dtype=np.uint64)], [np.empty(0, dtype=np.uint64)]
+        for batch in iter_batches(rows, batch_size):
+            kh, rh, _ = _hash_batch(batch, keys)
+            key_hashes.append(kh)
+            row_hashes.append(rh)
+
+        self.keys = keys
+        self.row_hashes = np.concatenate(row_hashes)
+        self._index = pd.Index(np.concatenate(key_hashes))
+        if not self._index.is_unique:
+            raise ValueError('Key columns %r are not unique in the indexed result' % keys)
+
+    def __len__(self):
+        return len(self.row_hashes)
+
+    def lookup(self, key_hashes):
+        """
+            Get the positions of the given key hashes in the index, -1 where not found
+        """
+        return self._index.get_indexer(key_hashes)
+
+
+def keyed_diff(left, right, keys, batch_size=100000):
+    """
+        Compare two results by key, regardless of row order
+
+        Args:
+            left : The "left" result, which is indexed. It must support positional row lookups
+                   (e.g. a QueryResult) so missing keys can be reported.
+            right : iterable - The "right" rows, which are streamed against the index
+            keys : list - The key columns
+
+        Kwargs:
+            batch_size : int - The number of right rows to hash at a time
+
+        Returns:
+            KeyedDiff
+    """
+    index = KeyIndex(left, keys, batch_size=batch_size)
+    seen = np.zeros(len(index), dtype=bool)
+    extra, changed = list(), list()
+
+    for batch in iter_batches(right, batch_size):
+        key_hashes, row_hashes, df = _hash_batch(batch, keys)
+        positions = index.lookup(key_hashes)
+        found = positions >= 0
+        seen[positions[found]] = True
+
+        diff = np.zeros(len(positions), dtype=bool)
+        diff[found] = index.row_hashes[positions[found]] != row_hashes[found]
+
+        key_values = df[keys]
+        extra.extend(key_values[~found].itertuples(index=False, name=None))
+        changed.extend(key_values[diff].itertuples(index=False, name=None))
+
+    missing = [tuple(left[int(pos)][k] for k in keys) for pos in np.flatnonzero(~seen)]
+    return KeyedDiff(keys, missing, extra, changed)
+
+
+def keyed_comp(keys, batch_size=100000):
+    """
+        Build a comparison that diffs two results by key columns without needing a sort
+
+        Args:
+            keys : str or list - The key column(s)
+
+        Kwargs:
+            batch_size : int - The number of rows to hash at a time
+
+        Returns:
+            callable - A comparison that returns a KeyedDiff
+    """
+    if not isinstance(keys, (list, tuple)):
+        keys = [keys]
+    keys = list(keys)
+
+    def keyed_diff_comp(left, right):
+        return keyed_diff(left, right, keys, batch_size=batch_size)
+
+    return keyed_diff_comp
@@ -0,0 +1,56 @@
+"""
+    Ordering and dependency hints for comparisons
+
+    A comp can set a 'cost' attribute, a rough relative expense used to run cheap comps first, and a
+    'depends' attribute, the comps that must pass before it is worth running. Both are only used by
+    Comparators with short_circuit set.
+
+    A comp can also set a 'needs' attribute when it only uses part of each result, so that a lazy
+    Comparator can push that down to the sources instead of fetching the full results, and a 'columns'
+    attribute listing the columns it reads, so that a Comparator can query only those columns.
+"""
+DEFAULT_COST = 100
+
+# The comp only calls len() on each result
+NEEDS_COUNT = 'count'
+# The comp only calls first() on each result
+NEEDS_FIRST = 'first'
+NEEDS = (NEEDS_COUNT, NEEDS_FIRST)
+
+
+def hints(cost=None, depends=None, needs=None, columns=None):
+    """
+        Decorate a comp with a cost, dependencies, and the parts of each result it uses
+
+        Kwargs:
+            cost : int/float - The relative expense of the comp. Lower cost comps are run first.
+            depends : str/callable or list - The comps that must pass for this comp to run, given as callables,
+                                             comps module constants, or function names
+            needs : str - NEEDS_COUNT or NEEDS_FIRST, if that is all the comp uses of each result
+            columns : str or list - The columns the comp reads from each result. An empty list if it reads none.
+
+        Usage example:
+
+        @hints(cost=50, depends=comps.LEN_COMP)
+        def totals_comp(left, right):
+            ...
+    """
+    if depends is not None and not isinstance(depends, (list, tuple)):
+        depends = [depends]
+    if needs is not None and needs not in NEEDS:
+        raise ValueError('needs must be one of %r' % (NEEDS, ))
+    if columns is not None and not isinstance(columns, (list, tuple)):
+        columns = [columns]
+
+    def decorator(comp):
+        if cost is not None:
+            comp.cost = cost
+        if depends is not None:
+            comp.depends = list(depends)
+        if needs is not None:
+            comp.needs = needs
+        if columns is not None:
+            comp.columns = list(columns)
+        return comp
+
+    return decorator
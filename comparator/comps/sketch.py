@@ -0,0 +1,532 @@
+"""
+    Approximate comparisons with fixed-size sketches
+
+    Each side is reduced to a sketch whose size depends on its parameters, not on the number of rows:
+    a HyperLogLog for distinct counts, a Bloom filter for set membership, and a quantile sketch for
+    numeric distributions. The sketch comps also stream, so with stream=True neither result is ever
+    held in memory.
+"""
+import functools
+import math
+
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+
+from pandas.api.types import is_numeric_dtype, is_bool_dtype
+
+from .keyed import hash_columns
+from .stream import StreamComp
+from .vector import as_floats, to_frame
+
+_LOW_32 = np.uint64(0xFFFFFFFF)
+
+
+def _frame(rows):
+    return pd.DataFrame([dict(row.items()) if hasattr(row, 'items') else row for row in rows])
+
+
+def _row_hashes(frame, columns=None):
+    """
+        Hash each row of a frame to a uint64, over the given columns or all of them in name order
+
+        The hashes don't depend on the dtype pandas infers for the frame, so batches of a streamed result
+        hash the same rows the same way, whether or not a batch has NULLs. See keyed.hash_columns.
+    """
+    if not len(frame.columns):
+        return np.empty(0, dtype=np.uint64)
+    columns = sorted(frame.columns) if columns is None else columns
+    missing = [c for c in columns if c not in frame.columns]
+    if missing:
+        raise KeyError('Columns not found in result : %r' % missing)
+    return hash_columns(frame, columns)
+
+
+def _bit_length(values):
+    """
+        The bit length of each uint64, computed exactly from its 32-bit halves
+    """
+    high = np.frexp((values >> np.uint64(32)).astype(np.float64))[1]
+    low = np.frexp((values & _LOW_32).astype(np.float64))[1]
+    return np.where(high > 0, high + 32, low)
+
+
+class HyperLogLog(object):
+    """
+        Estimates the number of distinct hashes added, in 2 ** precision bytes
+
+        The standard error of the estimate is about 1.04 / sqrt(2 ** precision). Sketches of the same
+        hashes are identical, so equal sets always give equal estimates.
+
+        Kwargs:
+            precision : int - The number of bits used to pick a register, from 4 to 18
+    """
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be from 4 to 18')
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def __repr__(self):
+        return '<HyperLogLog(precision={})>'.format(self.precision)
+
+    def add(self, hashes):
+        """
+            Args:
+                hashes : numpy.ndarray - uint64 hashes
+        """
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        # A sentinel bit caps the rank, so it fits the bits left over after the register index
+        rest = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = (65 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """
+            Combine another sketch of the same precision into this one
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        """
+            Returns:
+                int - The estimated number of distinct hashes
+        """
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small sets
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class BloomFilter(object):
+    """
+        A set of hashes with no false negatives, in about capacity * 1.44 * log2(1 / error_rate) bytes
+
+        One byte is used per bit so that batches of hashes are added with a single vectorized write.
+
+        Kwargs:
+            capacity : int - The number of distinct hashes expected
+            error_rate : float - The false positive rate at capacity
+    """
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(float(self.size) / capacity * math.log(2))))
+        self.bits = np.zeros(self.size, dtype=bool)
+
+    def __repr__(self):
+        return '<BloomFilter(capacity={}, error_rate={})>'.format(self.capacity, self.error_rate)
+
+    def _positions(self, hashes):
+        # Double hashing : the i-th position is h1 + i * h2
+        h1 = (hashes & _LOW_32)[:, None]
+        h2 = ((hashes >> np.uint64(32)) | np.uint64(1))[:, None]
+        steps = np.arange(self.hashes, dtype=np.uint64)[None, :]
+        return ((h1 + steps * h2) % np.uint64(self.size)).ravel()
+
+    def add(self, hashes):
+        """
+            Args:
+                hashes : numpy.ndarray - uint64 hashes
+        """
+        if not len(hashes):
+            return
+        self.bits[self._positions(hashes).astype(np.intp)] = True
+
+    def contains(self, hashes):
+        """
+            Returns:
+                numpy.ndarray - A boolean array, False where a hash was certainly never added
+        """
+        if not len(hashes):
+            return np.zeros(0, dtype=bool)
+        return self.bits[self._positions(hashes).astype(np.intp)].reshape(-1, self.hashes).all(axis=1)
+
+    def _estimate(self, bits):
+        set_bits = int(np.count_nonzero(bits))
+        if set_bits >= self.size:
+            return float('inf')
+        return -float(self.size) / self.hashes * math.log(1 - float(set_bits) / self.size)
+
+    def count(self):
+        """
+            Returns:
+                int - The estimated number of distinct hashes added
+        """
+        return int(round(self._estimate(self.bits)))
+
+    def difference(self, other):
+        """
+            Estimate the number of hashes added to this filter but not to another of the same size
+
+            Returns:
+                int
+        """
+        if (other.size, other.hashes) != (self.size, self.hashes):
+            raise ValueError('Cannot compare filters of different sizes')
+        union = self._estimate(self.bits | other.bits)
+        return max(0, int(round(union - self._estimate(other.bits))))
+
+
+class QuantileSketch(object):
+    """
+        Estimates quantiles of numeric values within a relative accuracy, in at most max_buckets buckets
+
+        Values are counted in logarithmically sized buckets, so any quantile is returned within
+        relative_accuracy of the true value. If there are more buckets than max_buckets, the buckets
+        nearest zero are merged, losing accuracy for the smallest magnitudes first.
+
+        Kwargs:
+            relative_accuracy : float - The relative accuracy of each quantile
+            max_buckets : int - The most buckets kept for each sign
+    """
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive = dict()
+        self._negative = dict()
+        self.zeros = 0
+        self.count = 0
+
+    def __repr__(self):
+        return '<QuantileSketch(relative_accuracy={}, count={})>'.format(self.relative_accuracy, self.count)
+
+    def _add_buckets(self, buckets, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / self._log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+        if len(buckets) > self.max_buckets:
+            keys = sorted(buckets)
+            lowest = keys[-self.max_buckets]
+            buckets[lowest] += sum(buckets.pop(key) for key in keys[:-self.max_buckets])
+
+    def add(self, values):
+        """
+            Args:
+                values : numpy.ndarray - Numeric values. NaNs are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        positive, negative = values[values > 0], values[values < 0]
+        self.zeros += len(values) - len(positive) - len(negative)
+        self.count += len(values)
+        if len(positive):
+            self._add_buckets(self._positive, positive)
+        if len(negative):
+            self._add_buckets(self._negative, -negative)
+
+    def _value(self, key):
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def quantile(self, q):
+        """
+            Args:
+                q : float - From 0 to 1
+
+            Returns:
+                float - The estimated value, or None if no values were added
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self._positive))
+
+
+class DistinctCounts(object):
+    """
+        The estimated number of distinct rows in two results
+
+        Truthy if the estimates differ by at most tolerance, relative to the larger one.
+
+        Args:
+            left : int - The estimated distinct rows of the left result
+            right : int - The estimated distinct rows of the right result
+            tolerance : float - The relative difference that still passes
+    """
+    def __init__(self, left, right, tolerance=0.0):
+        self.left = left
+        self.right = right
+        self.tolerance = tolerance
+
+    def __repr__(self):
+        return '<DistinctCounts(left={}, right={})>'.format(self.left, self.right)
+
+    def __bool__(self):
+        return abs(self.left - self.right) <= self.tolerance * max(self.left, self.right)
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, DistinctCounts):
+            return (self.left, self.right) == (other.left, other.right)
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class MembershipDiff(object):
+    """
+        The estimated difference between the rows (or keys) of two results
+
+        Truthy if the Bloom filters of both results are identical, which they always are when both
+        results hold the same set of rows. Different sets are only missed if every differing row is a
+        false positive of the other filter.
+
+        Args:
+            missing : int - The estimated rows of the left result not found in the right
+            extra : int - The estimated rows of the right result not found in the left
+            identical : bool - Whether the filters are identical
+    """
+    def __init__(self, missing, extra, identical):
+        self.missing = missing
+        self.extra = extra
+        self.identical = identical
+
+    def __repr__(self):
+        return '<MembershipDiff(missing~{}, extra~{})>'.format(self.missing, self.extra)
+
+    def __bool__(self):
+        return self.identical
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, MembershipDiff):
+            return (self.missing, self.extra, self.identical) == (other.missing, other.extra, other.identical)
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class QuantileDiff(object):
+    """
+        The estimated quantiles of the numeric columns of two results
+
+        Truthy if every quantile of every column differs by at most tolerance, relative to the larger
+        magnitude, and both results have the same numeric columns.
+
+        Args:
+            quantiles : OrderedDict - {column: {quantile: (left value, right value)}}
+            tolerance : float - The relative difference that still passes
+    """
+    def __init__(self, quantiles, tolerance=0.0):
+        self.quantiles = quantiles
+        self.tolerance = tolerance
+
+    def __repr__(self):
+        return '<QuantileDiff({})>'.format(self.mismatched())
+
+    def mismatched(self):
+        """
+            Returns:
+                list - (column, quantile) pairs outside of the tolerance
+        """
+        mismatched = list()
+        for column, values in self.quantiles.items():
+            for q, (left, right) in values.items():
+                if left is None or right is None:
+                    if left is not right:
+                        mismatched.append((column, q))
+                elif abs(left - right) > self.tolerance * max(abs(left), abs(right)):
+                    mismatched.append((column, q))
+        return mismatched
+
+    def __bool__(self):
+        return not self.mismatched()
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, QuantileDiff):
+            return self.quantiles == other.quantiles
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class SketchStreamComp(StreamComp):
+    """
+        Streaming form of a sketch comp, which adds every batch to a sketch of each side
+
+        Args:
+            make : callable - Returns a new, empty sketch
+            feed : callable - Adds a DataFrame of rows to a sketch
+            diff : callable - Compares the left and right sketches
+    """
+    def __init__(self, make, feed, diff):
+        super(SketchStreamComp, self).__init__()
+        self._make, self._feed, self._diff = make, feed, diff
+        self._left, self._right = make(), make()
+
+    def update(self, left, right):
+        if left:
+            self._feed(self._left, _frame(left))
+        if right:
+            self._feed(self._right, _frame(right))
+
+    def result(self):
+        return self._diff(self._left, self._right)
+
+
+def _sketch_comp(comp, make, feed, diff, columns=None):
+    """
+        Attach the streaming form, cost, and columns of a sketch comp, and return it
+    """
+    comp.stream = functools.partial(SketchStreamComp, make, feed, diff)
+    comp.cost = 5
+    if columns is not None:
+        comp.columns = list(columns)
+    return comp
+
+
+def _sketch(result, make, feed):
+    sketch = make()
+    frame = to_frame(result)
+    if len(frame):
+        feed(sketch, frame)
+    return sketch
+
+
+def distinct_comp(columns=None, precision=14, tolerance=0.0):
+    """
+        Build a comparison of the estimated number of distinct rows in each result
+
+        Kwargs:
+            columns : str or list - The columns that make a row distinct. Defaults to every column.
+            precision : int - See HyperLogLog
+            tolerance : float - The relative difference between the estimates that still passes
+
+        Returns:
+            callable - A comparison that returns a DistinctCounts
+    """
+    if columns is not None and not isinstance(columns, (list, tuple)):
+        columns = [columns]
+
+    def make():
+        return HyperLogLog(precision)
+
+    def feed(sketch, frame):
+        sketch.add(_row_hashes(frame, columns))
+
+    def diff(left, right):
+        return DistinctCounts(left.count(), right.count(), tolerance)
+
+    def distinct_count_comp(left, right):
+        return diff(_sketch(left, make, feed), _sketch(right, make, feed))
+
+    return _sketch_comp(distinct_count_comp, make, feed, diff, columns)
+
+
+def membership_comp(keys=None, capacity=1000000, error_rate=0.001):
+    """
+        Build a comparison of the sets of rows (or keys) in each result, regardless of row order
+
+        Kwargs:
+            keys : str or list - The key columns to compare. Defaults to every column.
+            capacity : int - The number of distinct rows expected in each result, see BloomFilter
+            error_rate : float - See BloomFilter
+
+        Returns:
+            callable - A comparison that returns a MembershipDiff
+    """
+    if keys is not None and not isinstance(keys, (list, tuple)):
+        keys = [keys]
+
+    def make():
+        return BloomFilter(capacity, error_rate)
+
+    def feed(sketch, frame):
+        sketch.add(_row_hashes(frame, keys))
+
+    def diff(left, right):
+        identical = bool(np.array_equal(left.bits, right.bits))
+        if identical:
+            return MembershipDiff(0, 0, True)
+        return MembershipDiff(left.difference(right), right.difference(left), False)
+
+    def membership_diff_comp(left, right):
+        return diff(_sketch(left, make, feed), _sketch(right, make, feed))
+
+    return _sketch_comp(membership_diff_comp, make, feed, diff, keys)
+
+
+def _numeric_columns(frame):
+    return [c for c in frame.columns if is_numeric_dtype(frame[c].dtype) and not is_bool_dtype(frame[c].dtype)]
+
+
+def quantile_comp(columns=None, quantiles=(0.01, 0.25, 0.5, 0.75, 0.99), relative_accuracy=0.01, tolerance=None):
+    """
+        Build a comparison of the distributions of numeric columns
+
+        Kwargs:
+            columns : str or list - The columns to compare. Defaults to every numeric column.
+            quantiles : tuple - The quantiles to compare, from 0 to 1
+            relative_accuracy : float - See QuantileSketch
+            tolerance : float - The relative difference between quantiles that still passes. Defaults to
+                                twice the relative accuracy, since each side is estimated within it.
+
+        Returns:
+            callable - A comparison that returns a QuantileDiff
+    """
+    if columns is not None and not isinstance(columns, (list, tuple)):
+        columns = [columns]
+    tolerance = 2 * relative_accuracy if tolerance is None else tolerance
+
+    def make():
+        return OrderedDict()
+
+    def feed(sketches, frame):
+        for column in (_numeric_columns(frame) if columns is None else columns):
+            if column not in frame.columns:
+                raise KeyError('Column not found in result : %r' % column)
+            if column not in sketches:
+                sketches[column] = QuantileSketch(relative_accuracy)
+            sketches[column].add(as_floats(pd.to_numeric(frame[column])))
+
+    def diff(left, right):
+        result = OrderedDict()
+        for column in list(left) + [c for c in right if c not in left]:
+            lsketch, rsketch = left.get(column), right.get(column)
+            result[column] = OrderedDict(
+                (q, (lsketch.quantile(q) if lsketch else None, rsketch.quantile(q) if rsketch else None))
+                for q in quantiles)
+        return QuantileDiff(result, tolerance)
+
+    def quantile_diff_comp(left, right):
+        return diff(_sketch(left, make, feed), _sketch(right, make, feed))
+
+    return _sketch_comp(quantile_diff_comp, make, feed, diff, columns)
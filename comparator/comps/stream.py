@@ -0,0 +1,122 @@
+"""
+    Incremental comparisons over two ordered streams of rows
+
+    A comparison callable can be made available to a streaming Comparator by setting its 'stream'
+    attribute to a StreamComp subclass. The StreamComp is instantiated once per run and fed aligned
+    batches of rows until every comparison is done or both streams are exhausted.
+"""
+from itertools import chain, islice
+
+
+class StreamComp(object):
+    """
+        Base class for a comparison that consumes two ordered row streams incrementally
+
+        Subclasses implement update and result, and set self.done once the outcome is known so
+        the remaining rows can be skipped.
+    """
+    def __init__(self):
+        self.done = False
+
+    def update(self, left, right):
+        """
+            Consume the next batch of rows from each side
+
+            Args:
+                left : list - The next rows from the "left" stream
+                right : list - The next rows from the "right" stream, aligned with left. The batches are
+                               the same length until one of the streams is exhausted.
+        """
+        raise NotImplementedError()
+
+    def result(self):
+        """
+            Returns:
+                The outcome of the comparison
+        """
+        raise NotImplementedError()
+
+
+class BasicStreamComp(StreamComp):
+    """
+        Streaming equivalent of basic_comp, True if every row matches in order
+    """
+    def __init__(self):
+        super(BasicStreamComp, self).__init__()
+        self._equal = True
+
+    def update(self, left, right):
+        if left != right:
+            self._equal = False
+            self.done = True
+
+    def result(self):
+        return self._equal
+
+
+class LenStreamComp(StreamComp):
+    """
+        Streaming equivalent of len_comp, True if both streams have the same number of rows
+    """
+    def __init__(self):
+        super(LenStreamComp, self).__init__()
+        self._equal = True
+
+    def update(self, left, right):
+        if len(left) != len(right):
+            self._equal = False
+            self.done = True
+
+    def result(self):
+        return self._equal
+
+
+class FirstStreamComp(StreamComp):
+    """
+        Streaming equivalent of first_eq_comp, True if the first rows match
+    """
+    def __init__(self):
+        super(FirstStreamComp, self).__init__()
+        self._equal = True
+
+    def update(self, left, right):
+        self._equal = left[:1] == right[:1]
+        self.done = True
+
+    def result(self):
+        return self._equal
+
+
+def iter_batches(rows, batch_size):
+    """
+        Split an iterable of rows into lists of at most batch_size rows
+    """
+    # Wrapped in a generator since some results (e.g. QueryResult) restart when iter() is called again
+    rows = (row for row in rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def align_batches(left, right, batch_size):
+    """
+        Re-chunk two streams of row batches into aligned pairs of batches
+
+        Args:
+            left : iterable - Batches of rows from the "left" source
+            right : iterable - Batches of rows from the "right" source
+            batch_size : int - The number of rows in each aligned batch
+
+        Yields:
+            tuple - (left rows, right rows)
+    """
+    lrows = chain.from_iterable(left)
+    rrows = chain.from_iterable(right)
+    while True:
+        lbatch = list(islice(lrows, batch_size))
+        rbatch = list(islice(rrows, batch_size))
+        if not lbatch and not rbatch:
+            return
+        yield lbatch, rbatch
@@ -0,0 +1,218 @@
+"""
+    Vectorized comparisons of whole columns
+
+    Each result is converted to a pandas DataFrame once, and the comparisons are run column by column
+    with numpy instead of row by row in python. Converted frames are shared between every comp run on
+    the same result, so they should not be modified in place.
+"""
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+
+from pandas.api.types import is_numeric_dtype, is_bool_dtype
+
+from ..arrow import is_table
+
+_frames = dict()
+_frames_lock = threading.Lock()
+
+
+def _evict(key, ref):
+    with _frames_lock:
+        entry = _frames.get(key)
+        if entry is not None and entry[0] is ref:
+            del _frames[key]
+
+
+def _convert(result):
+    if is_table(result):
+        # Arrow Tables share their buffers with the frame where the column types allow
+        return result.to_pandas()
+    if hasattr(result, 'df'):
+        return result.df()
+    return pd.DataFrame([dict(row.items()) if hasattr(row, 'items') else row for row in result])
+
+
+def to_frame(result):
+    """
+        Get a query result as a DataFrame, converting it only once while the result is alive
+
+        Args:
+            result - A DataFrame, a QueryResult, or an iterable of rows
+
+        Returns:
+            pandas.DataFrame
+    """
+    if isinstance(result, pd.DataFrame):
+        return result
+
+    key = id(result)
+    with _frames_lock:
+        entry = _frames.get(key)
+    if entry is not None and entry[0]() is result:
+        return entry[1]
+
+    frame = _convert(result)
+    try:
+        ref = weakref.ref(result, lambda ref, key=key: _evict(key, ref))
+    except TypeError:
+        # Results that can't be weakly referenced, like lists, are converted every time
+        return frame
+    with _frames_lock:
+        _frames[key] = (ref, frame)
+    return frame
+
+
+class ColumnMismatches(object):
+    """
+        The number of mismatched values in each column of two results
+
+        Truthy if both results have the same columns and number of rows, and no values differ. Columns
+        found in only one result count every row as a mismatch.
+
+        Args:
+            counts : OrderedDict - {column: number of mismatched rows}
+            lrows : int - The number of rows in the left result
+            rrows : int - The number of rows in the right result
+    """
+    def __init__(self, counts, lrows, rrows):
+        self.counts = counts
+        self.lrows = lrows
+        self.rrows = rrows
+
+    def __repr__(self):
+        return '<ColumnMismatches({})>'.format(dict((k, v) for k, v in self.counts.items() if v))
+
+    def __bool__(self):
+        return self.lrows == self.rrows and not any(self.counts.values())
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, ColumnMismatches):
+            return (self.counts, self.lrows, self.rrows) == (other.counts, other.lrows, other.rrows)
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _numeric(series):
+    return is_numeric_dtype(series.dtype) and not is_bool_dtype(series.dtype)
+
+
+def as_floats(series):
+    """
+        Get the values of a numeric column as a float64 array, with every kind of null as NaN
+
+        Works with any pandas the package supports, unlike Series.to_numpy(na_value=...), which needs pandas 1.0.
+    """
+    return np.asarray(series.astype(object).where(series.notna(), np.nan), dtype=np.float64)
+
+
+def column_equal(left, right, nulls_equal=True, rtol=None, atol=0.0):
+    """
+        Compare two columns position by position
+
+        Args:
+            left : pandas.Series
+            right : pandas.Series - Of the same length as left
+
+        Kwargs:
+            nulls_equal : bool - Treat nulls (None, NaN, NaT) as equal to each other, like SQL's
+                                 IS NOT DISTINCT FROM. Otherwise a null is never equal to anything, like SQL's =.
+            rtol : float - Compare numeric columns within this relative tolerance. If None, values must be exact.
+            atol : float - The absolute tolerance for numeric columns, used with rtol
+
+        Returns:
+            numpy.ndarray - A boolean array, True where the values are equal
+    """
+    left, right = left.reset_index(drop=True), right.reset_index(drop=True)
+    lnull, rnull = left.isna().values, right.isna().values
+
+    if rtol is not None and _numeric(left) and _numeric(right):
+        equal = np.isclose(
+            as_floats(left), as_floats(right), rtol=rtol, atol=atol, equal_nan=False)
+    else:
+        equal = np.asarray(left.eq(right).fillna(False), dtype=bool)
+
+    equal = equal & ~(lnull | rnull)
+    if nulls_equal:
+        equal |= lnull & rnull
+    return equal
+
+
+def column_mismatches(left, right, nulls_equal=True, rtol=None, atol=0.0):
+    """
+        Count the mismatched values in each column of two results
+
+        Rows are compared by position. Rows past the end of the shorter result count as mismatches.
+
+        Args:
+            left - The "left" result, see to_frame
+            right - The "right" result, see to_frame
+
+        Kwargs:
+            See column_equal
+
+        Returns:
+            ColumnMismatches
+    """
+    lframe, rframe = to_frame(left), to_frame(right)
+    lrows, rrows = len(lframe), len(rframe)
+    rows = min(lrows, rrows)
+    extra = max(lrows, rrows) - rows
+
+    counts = OrderedDict()
+    for col in list(lframe.columns) + [c for c in rframe.columns if c not in lframe.columns]:
+        if col not in lframe.columns or col not in rframe.columns:
+            counts[col] = max(lrows, rrows)
+            continue
+        equal = column_equal(
+            lframe[col].iloc[:rows], rframe[col].iloc[:rows], nulls_equal=nulls_equal, rtol=rtol, atol=atol)
+        counts[col] = int(rows - equal.sum()) + extra
+    return ColumnMismatches(counts, lrows, rrows)
+
+
+def vector_eq_comp(left, right):
+    """
+        Exact, column-wise equality of two results, where a null is never equal to anything
+    """
+    return bool(column_mismatches(left, right, nulls_equal=False))
+
+
+def null_eq_comp(left, right):
+    """
+        Column-wise equality of two results, where nulls are equal to each other
+    """
+    return bool(column_mismatches(left, right, nulls_equal=True))
+
+
+def mismatch_counts_comp(left, right):
+    """
+        The number of mismatched values in each column of two results, where nulls are equal to each other
+    """
+    return column_mismatches(left, right)
+
+
+def approx_comp(rtol=1e-09, atol=0.0):
+    """
+        Build a comparison that allows numeric columns to differ within a tolerance
+
+        Kwargs:
+            rtol : float - The relative tolerance
+            atol : float - The absolute tolerance
+
+        Returns:
+            callable - A comparison that returns a bool
+    """
+    def approx_eq_comp(left, right):
+        return bool(column_mismatches(left, right, nulls_equal=True, rtol=rtol, atol=atol))
+
+    approx_eq_comp.cost = 5
+    approx_eq_comp.depends = ['len']
+    return approx_eq_comp
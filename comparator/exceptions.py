@@ -9,3 +9,7 @@ class QueryFormatError(Exception):
 
 class InvalidCompSetException(Exception):
     pass
+
+
+class ComparisonCancelled(Exception):
+    pass
@@ -0,0 +1,43 @@
+"""
+    Lazy query results
+
+    A Comparator created with lazy=True doesn't fetch its query results up front. Comps that only need the
+    row count or the first row of each result (see comps.hints) are given a ResultHandle for each side, and
+    the SourcePair pushes that need down to the source by rewriting the query as a COUNT(*) or LIMIT 1.
+    The full results are fetched the first time a comp needs them, and used by every handle after that.
+"""
+
+
+class ResultHandle(object):
+    """
+        Stands in for one query result of a SourcePair, fetching only what is asked of it
+
+        Args:
+            sp : SourcePair - The pair the result belongs to
+            side : int - 0 for the lquery result, 1 for the rquery result
+    """
+    def __init__(self, sp, side):
+        self._sp = sp
+        self._side = side
+
+    def __repr__(self):
+        return '<ResultHandle({}, {})>'.format(self._sp, 'right' if self._side else 'left')
+
+    def __len__(self):
+        return self._sp.count(self._side)
+
+    def first(self):
+        """
+            Returns:
+                The first row of the result
+        """
+        return self._sp.first(self._side)
+
+    def fetch(self):
+        """
+            Returns:
+                The full query result, which is fetched if it hasn't been already
+        """
+        if self._sp.empty:
+            self._sp.get_query_results()
+        return self._sp.query_results[self._side]
@@ -0,0 +1,99 @@
+"""
+    Pools for running the comps of a Comparator at the same time
+
+    Comps run on threads share the query results directly. For CPU-bound comps, a process pool is used
+    instead, and the query results are handed to each worker once, when it starts, rather than with every
+    comp. On platforms that fork, the workers inherit the results from the parent without any copying.
+"""
+import multiprocessing
+import pickle
+import sys
+import time
+
+from timeit import default_timer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .exceptions import InvalidCompSetException
+from .profile import _cpu_time
+
+THREAD = 'thread'
+PROCESS = 'process'
+EXECUTORS = (THREAD, PROCESS)
+
+# The query results of the Comparator a process pool worker was started for
+_worker_results = None
+
+
+def _init_worker(query_results):
+    global _worker_results
+    _worker_results = query_results
+
+
+def _run_worker_comp(comp):
+    return _run_comp(comp, _worker_results)
+
+
+def _run_comp(comp, query_results):
+    started, cpu, start = time.time(), _cpu_time(), default_timer()
+    value = comp(*query_results)
+    return value, default_timer() - start, started, _cpu_time() - cpu
+
+
+def check_executor(kind, comps):
+    """
+        Check that a set of comps can be run by a kind of executor
+
+        Raises:
+            InvalidCompSetException
+    """
+    if kind not in EXECUTORS:
+        raise InvalidCompSetException('comp_executor must be one of %r' % (EXECUTORS, ))
+    if kind != PROCESS:
+        return
+    if sys.version_info < (3, 7):
+        raise InvalidCompSetException('Running comps in a process pool requires Python 3.7+')
+    for comp in comps:
+        try:
+            pickle.dumps(comp)
+        except Exception:
+            raise InvalidCompSetException(
+                'Comps run in a process pool must be importable, module level functions : %r' % comp)
+
+
+class CompPool(object):
+    """
+        Runs comps against a fixed set of query results
+
+        Args:
+            kind : str - 'thread' or 'process'
+            workers : int - The number of threads or processes
+            query_results : tuple - The query results each comp is called with
+    """
+    def __init__(self, kind, workers, query_results):
+        self._kind = kind
+        self._query_results = query_results
+        if kind == PROCESS:
+            context = None
+            if 'fork' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('fork')
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(query_results, ))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown(wait=True)
+
+    def submit(self, comp):
+        """
+            Start running a comp
+
+            Returns:
+                concurrent.futures.Future - Resolves to (result, elapsed seconds, unix start time, CPU seconds)
+        """
+        if self._kind == PROCESS:
+            return self._executor.submit(_run_worker_comp, comp)
+        return self._executor.submit(_run_comp, comp, self._query_results)
@@ -0,0 +1,131 @@
+"""
+    Planning for ComparatorSets that share queries
+
+    A QueryPlan groups identical (source, query) pairs across every SourcePair of a set. When attached to
+    the SourcePairs, each unique query is run once and its result is handed to every SourcePair that
+    needs it, even when the SourcePairs run at the same time.
+"""
+import threading
+
+from collections import OrderedDict
+
+from .cache import source_key
+
+
+class _Entry(object):
+    __slots__ = ['lock', 'done', 'result']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = False
+        self.result = None
+
+
+class QueryPlan(object):
+    """
+        The deduplicated set of queries for a group of SourcePairs
+
+        Templated rqueries can't be known until the lquery has run, so they are only deduplicated once
+        rendered, and are listed separately by explain().
+
+        Args:
+            source_pairs : list - The SourcePair objects to plan
+    """
+    def __init__(self, source_pairs):
+        self._groups = OrderedDict()
+        self._templated = 0
+        self._entries = dict()
+        self._afutures = dict()
+        self._lock = threading.Lock()
+        self.executed = 0
+
+        for sp in source_pairs:
+            self._add(sp._left, sp._lquery)
+            if sp._right is not None:
+                if sp.templated:
+                    self._templated += 1
+                else:
+                    self._add(sp._right, sp._rquery)
+
+    def __repr__(self):
+        return '<QueryPlan(queries={qp.queries}, unique={qp.unique})>'.format(qp=self)
+
+    def _add(self, source, query):
+        key = (source_key(source), query)
+        group = self._groups.setdefault(key, [source, query, 0])
+        group[2] += 1
+
+    @property
+    def queries(self):
+        """
+            The number of queries the SourcePairs would run without the plan
+        """
+        return sum(group[2] for group in self._groups.values()) + self._templated
+
+    @property
+    def unique(self):
+        """
+            The number of queries that will run with the plan, counting each templated rquery
+        """
+        return len(self._groups) + self._templated
+
+    @property
+    def saved(self):
+        """
+            The number of round trips saved by the plan
+        """
+        return self.queries - self.unique
+
+    def fetch(self, source, query, run):
+        """
+            Get the result of a query, running it only if no other SourcePair has
+
+            Concurrent callers for the same query wait for the first to finish. A failed query is
+            retried by the next caller.
+
+            Args:
+                source : obj - The source to query
+                query : str - The query to run
+                run : callable - Called with (source, query) to run the query
+        """
+        key = (source_key(source), query)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+        with entry.lock:
+            if not entry.done:
+                entry.result = run(source, query)
+                entry.done = True
+                self.executed += 1
+        return entry.result
+
+    def discard(self, source, query):
+        """
+            Drop the shared result of one query, so the next SourcePair to need it runs it again
+        """
+        key = (source_key(source), query)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._afutures.pop(key, None)
+
+    def clear(self):
+        """
+            Drop every shared result so the queries run again
+        """
+        with self._lock:
+            self._entries.clear()
+            self._afutures.clear()
+            self.executed = 0
+
+    def explain(self):
+        """
+            Describe the queries that will run and how many times each is shared
+
+            Returns:
+                str
+        """
+        lines = ['QueryPlan: {qp.queries} queries, {qp.unique} unique, {qp.saved} round trips saved'.format(qp=self)]
+        for source, query, count in self._groups.values():
+            lines.append('  [{}x] {!r} : {}'.format(count, source, ' '.join(query.split())))
+        if self._templated:
+            lines.append('  {} templated rquery(s) rendered at run time'.format(self._templated))
+        return '\n'.join(lines)
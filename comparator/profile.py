@@ -0,0 +1,256 @@
+"""
+    Per-stage timing of comparisons
+
+    A Comparator or SourcePair given a Profiler measures each stage of a run : the left query, formatting
+    the rquery, the right query, and each comp. A Stage records its wall time, CPU time, row count, and
+    optionally its peak memory, and is passed to each of the Profiler's hooks as it finishes. The hooks
+    here export Prometheus text metrics or OpenTelemetry-style spans.
+
+    Without a Profiler nothing is measured, and each stage costs a single None check.
+"""
+import threading
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from collections import OrderedDict
+from timeit import default_timer
+
+# CPU time of the calling thread, so concurrent stages don't count each other's work
+_cpu_time = getattr(time, 'thread_time', None) or getattr(time, 'process_time', None) or time.clock
+
+
+def result_rows(result):
+    """
+        The number of rows in a query result, or None if it has no length
+    """
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class Stage(object):
+    """
+        The measurements of one stage of a run
+
+        Args:
+            name : str - The stage, 'lquery', 'format_rquery', 'rquery', 'count', 'first', 'comp', or 'stream'
+            start : float - The unix time the stage started at
+            wall : float - The number of seconds the stage took
+
+        Kwargs:
+            cpu : float - The number of CPU seconds used by the thread that ran the stage
+            rows : int - The number of rows the stage produced
+            peak_memory : int - The peak bytes allocated by python during the stage, if the Profiler traces memory
+            labels : dict - Identify the stage, like {'comparator': name, 'comp': comp name}
+    """
+    __slots__ = ['name', 'start', 'wall', 'cpu', 'rows', 'peak_memory', 'labels']
+
+    def __init__(self, name, start, wall, cpu=None, rows=None, peak_memory=None, labels=None):
+        self.name = name
+        self.start = start
+        self.wall = wall
+        self.cpu = cpu
+        self.rows = rows
+        self.peak_memory = peak_memory
+        self.labels = labels or dict()
+
+    def __repr__(self):
+        return '<Stage({s.name}, wall={s.wall:.6f}, rows={s.rows})>'.format(s=self)
+
+    def dict(self):
+        return dict((attr, getattr(self, attr)) for attr in self.__slots__)
+
+
+class _NoStage(object):
+    """
+        Stands in for a stage timer when there is no Profiler
+    """
+    __slots__ = []
+    stage = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NO_STAGE = _NoStage()
+
+
+class _StageTimer(object):
+    def __init__(self, profiler, name, stages, labels):
+        self._profiler = profiler
+        self._name = name
+        self._stages = stages
+        self._labels = labels
+        self.rows = None
+        self.stage = None
+
+    def __enter__(self):
+        if self._profiler._memory:
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.time()
+        self._cpu = _cpu_time()
+        self._wall = default_timer()
+        return self
+
+    def __exit__(self, *exc):
+        wall = default_timer() - self._wall
+        cpu = _cpu_time() - self._cpu
+        peak = None
+        if self._profiler._memory:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self._memory)
+        self.stage = Stage(self._name, self._start, wall, cpu, self.rows, peak, self._labels)
+        self._profiler.emit(self.stage, self._stages)
+        return False
+
+
+class Profiler(object):
+    """
+        Measures the stages of Comparator runs and passes each to a set of hooks
+
+        One Profiler can be shared by every Comparator in a ComparatorSet. Hooks are called on the thread
+        that ran the stage, so they must be thread-safe.
+
+        Kwargs:
+            hooks : list - Callables that receive each finished Stage, like a PrometheusExporter or SpanExporter
+            memory : bool - Record the peak memory of each stage with tracemalloc, which is started if it
+                            isn't already. Tracing slows down allocations, and stages that run at the same
+                            time share one peak. Requires Python 3.9+.
+    """
+    def __init__(self, hooks=None, memory=False):
+        if memory and not hasattr(tracemalloc, 'reset_peak'):
+            raise ValueError('Profiling memory requires Python 3.9+')
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.hooks = list(hooks or list())
+        self._memory = memory
+
+    def __repr__(self):
+        return '<Profiler(hooks={})>'.format(len(self.hooks))
+
+    def stage(self, name, stages=None, **labels):
+        """
+            A context manager that measures a stage. Set its 'rows' attribute to record a row count.
+
+            Args:
+                name : str - The stage name
+
+            Kwargs:
+                stages : list - The finished Stage is appended to this list
+                labels - Identify the stage, see Stage
+        """
+        return _StageTimer(self, name, stages, labels)
+
+    def emit(self, stage, stages=None):
+        """
+            Record a finished Stage and pass it to the hooks
+
+            Kwargs:
+                stages : list - The Stage is appended to this list
+        """
+        if stages is not None:
+            stages.append(stage)
+        for hook in self.hooks:
+            hook(stage)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusExporter(object):
+    """
+        A Profiler hook that aggregates stages into Prometheus metrics
+
+        Stages are grouped by their name and labels. render() returns the metrics in the Prometheus text
+        exposition format, for a scrape endpoint or the node exporter's textfile collector.
+
+        Kwargs:
+            prefix : str - The prefix of each metric name
+    """
+    def __init__(self, prefix='comparator'):
+        self.prefix = prefix
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, stage):
+        labels = tuple(sorted(dict(stage.labels, stage=stage.name).items()))
+        with self._lock:
+            metric = self._metrics.setdefault(labels, [0, 0.0, 0.0, 0, None])
+            metric[0] += 1
+            metric[1] += stage.wall
+            metric[2] += stage.cpu or 0.0
+            metric[3] += stage.rows or 0
+            if stage.peak_memory is not None:
+                metric[4] = max(metric[4] or 0, stage.peak_memory)
+
+    def render(self):
+        """
+            Returns:
+                str - The metrics in the Prometheus text format
+        """
+        with self._lock:
+            metrics = [(labels, list(values)) for labels, values in self._metrics.items()]
+
+        series = [
+            ('stage_seconds', 'summary', 'Wall time of each comparison stage',
+             [('_count', 0), ('_sum', 1)]),
+            ('stage_cpu_seconds_total', 'counter', 'CPU time of each comparison stage', [('', 2)]),
+            ('stage_rows_total', 'counter', 'Rows produced by each comparison stage', [('', 3)]),
+            ('stage_peak_memory_bytes', 'gauge', 'Peak memory allocated by a comparison stage', [('', 4)])]
+        lines = list()
+        for name, kind, help_text, samples in series:
+            name = '{}_{}'.format(self.prefix, name)
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, values in metrics:
+                label_text = ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels)
+                for suffix, index in samples:
+                    if values[index] is not None:
+                        lines.append('{}{}{{{}}} {}'.format(name, suffix, label_text, values[index]))
+        return '\n'.join(lines) + '\n'
+
+
+class SpanExporter(object):
+    """
+        A Profiler hook that converts each stage into an OpenTelemetry-style span
+
+        Each span is a dict with 'name', 'start_time_unix_nano', 'end_time_unix_nano', and 'attributes'.
+
+        Kwargs:
+            export : callable - Called with each span, e.g. to hand it to a tracer. If None, the spans are
+                                kept in the 'spans' list.
+            prefix : str - The prefix of each span name and attribute
+    """
+    def __init__(self, export=None, prefix='comparator'):
+        self.export = export
+        self.prefix = prefix
+        self.spans = list()
+
+    def __call__(self, stage):
+        attributes = dict(('{}.{}'.format(self.prefix, k), v) for k, v in stage.labels.items())
+        for attr in ('cpu', 'rows', 'peak_memory'):
+            value = getattr(stage, attr)
+            if value is not None:
+                attributes['{}.{}'.format(self.prefix, attr)] = value
+        start = int(stage.start * 1e9)
+        span = {
+            'name': '{}.{}'.format(self.prefix, stage.name),
+            'start_time_unix_nano': start,
+            'end_time_unix_nano': start + int(stage.wall * 1e9),
+            'attributes': attributes}
+        if self.export is None:
+            self.spans.append(span)
+        else:
+            self.export(span)
@@ -0,0 +1,280 @@
+"""
+    Containers for the results of comparisons
+"""
+import copy
+import math
+import six
+
+from array import array
+from collections import OrderedDict
+
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class ComparatorResult(object):
+    """
+        A container object to hold the results of a comparison
+
+        This primarily provides syntactic sugar on what is really just a (name, result) tuple. The "truthiness" of a
+        result can be checked easily, as well as other standard comparison operators if the particular comparison
+        returns a value other than a boolean.
+
+        ComparatorResults are immutable, so they can be shared without copying. The result value itself is
+        not copied, so comparisons returning mutable values should not be modified in place.
+
+        Args:
+            comparator_name : str - The name of the calling Comparator
+            name : str - The name of the comparison
+            result - The result of the comparison
+
+        Kwargs:
+            elapsed : float - The number of seconds the comparison took
+            status : str - The status of the comparison. Defaults to 'passed' or 'failed' based on the result.
+                           A comparison that was not run because a comparison it depends on failed is 'skipped'.
+            profile : profile.Stage - The measurements of the comparison, if the Comparator has a Profiler
+    """
+    __slots__ = ['_cname', '_name', '_result', '_elapsed', '_status', '_profile']
+
+    def __init__(self, comparator_name, name, result, elapsed=None, status=None, profile=None):
+        if status is None:
+            status = PASSED if result else FAILED
+        object.__setattr__(self, '_cname', comparator_name)
+        object.__setattr__(self, '_name', str(name))
+        object.__setattr__(self, '_result', result)
+        object.__setattr__(self, '_elapsed', elapsed)
+        object.__setattr__(self, '_status', status)
+        object.__setattr__(self, '_profile', profile)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ComparatorResult is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('ComparatorResult is immutable')
+
+    def __reduce__(self):
+        return (ComparatorResult, (self._cname, self._name, self._result, self._elapsed, self._status, self._profile))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return ComparatorResult(
+            self._cname, self._name, copy.deepcopy(self._result, memo), self._elapsed, self._status, self._profile)
+
+    def __repr__(self):
+        return '<ComparatorResult({cr._name}, {cr._result})>'.format(cr=self)
+
+    def __str__(self):
+        return '{cr._name} : {cr._result}'.format(cr=self)
+
+    def __bool__(self):
+        return bool(self._result)
+
+    __nonzero__ = __bool__
+
+    def __getitem__(self, key):
+        if isinstance(key, six.integer_types):
+            key = {0: 'name', 1: 'result'}.get(key, None)
+            if key is None:
+                raise IndexError('list index out of range')
+        if key == 'name':
+            return self._name
+        elif key == 'result':
+            return self._result
+        else:
+            raise KeyError(key)
+
+    def __eq__(self, other):
+        return self._result == other
+
+    def __ne__(self, other):
+        return self._result != other
+
+    def __gt__(self, other):
+        return self._result > other
+
+    def __ge__(self, other):
+        return self._result >= other
+
+    def __lt__(self, other):
+        return self._result < other
+
+    def __le__(self, other):
+        return self._result <= other
+
+    @property
+    def comparator_name(self):
+        return self._cname
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def elapsed(self):
+        return self._elapsed
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def profile(self):
+        return self._profile
+
+
+class ResultStore(object):
+    """
+        A columnar container for the results of many comparisons
+
+        Each field of the results is held in its own column, with timings and pass/fail flags in typed
+        arrays, so a set of thousands of results can be filtered, grouped, and exported without creating
+        a ComparatorResult per row.
+
+        Kwargs:
+            results : iterable - ComparatorResult objects to add to the store
+    """
+    COLUMNS = ('comparator_name', 'name', 'result', 'elapsed', 'status')
+
+    def __init__(self, results=None):
+        self._cnames = list()
+        self._names = list()
+        self._results = list()
+        self._elapsed = array('d')
+        self._passed = array('b')
+        self._statuses = list()
+        if results is not None:
+            self.extend(results)
+
+    def __repr__(self):
+        return '<ResultStore(results={}, failures={})>'.format(len(self), len(self) - sum(self._passed))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        elapsed = self._elapsed[index]
+        return ComparatorResult(
+            self._cnames[index], self._names[index], self._results[index],
+            None if math.isnan(elapsed) else elapsed, self._statuses[index])
+
+    def append(self, result):
+        """
+            Add a ComparatorResult to the store
+        """
+        self._cnames.append(result.comparator_name)
+        self._names.append(result.name)
+        self._results.append(result.result)
+        self._elapsed.append(float('nan') if result.elapsed is None else result.elapsed)
+        self._passed.append(result.status == PASSED)
+        self._statuses.append(result.status)
+
+    def extend(self, results):
+        """
+            Add each of an iterable of ComparatorResults to the store
+        """
+        for result in results:
+            self.append(result)
+
+    def _take(self, indexes):
+        store = ResultStore()
+        store._cnames = [self._cnames[i] for i in indexes]
+        store._names = [self._names[i] for i in indexes]
+        store._results = [self._results[i] for i in indexes]
+        store._elapsed = array('d', [self._elapsed[i] for i in indexes])
+        store._passed = array('b', [self._passed[i] for i in indexes])
+        store._statuses = [self._statuses[i] for i in indexes]
+        return store
+
+    def column(self, name):
+        """
+            Get a single column of the store
+
+            Args:
+                name : str - One of ResultStore.COLUMNS
+
+            Returns:
+                list or array
+        """
+        columns = {
+            'comparator_name': self._cnames,
+            'name': self._names,
+            'result': self._results,
+            'elapsed': self._elapsed,
+            'status': self._statuses,
+        }
+        if name not in columns:
+            raise KeyError(name)
+        return columns[name]
+
+    def failures(self):
+        """
+            Get a new ResultStore holding only the results that did not pass
+        """
+        return self._take([i for i, passed in enumerate(self._passed) if not passed])
+
+    def filter(self, status=None, comparator_name=None):
+        """
+            Get a new ResultStore holding only the results matching the given fields
+
+            Kwargs:
+                status : str - Keep results with this status
+                comparator_name : str - Keep results from the Comparator with this name
+        """
+        indexes = [
+            i for i in range(len(self))
+            if (status is None or self._statuses[i] == status)
+            and (comparator_name is None or self._cnames[i] == comparator_name)]
+        return self._take(indexes)
+
+    def groupby(self):
+        """
+            Group the results by the name of their Comparator
+
+            Returns:
+                OrderedDict - {comparator_name: ResultStore}
+        """
+        groups = OrderedDict()
+        for i, cname in enumerate(self._cnames):
+            groups.setdefault(cname, list()).append(i)
+        return OrderedDict((cname, self._take(indexes)) for cname, indexes in six.iteritems(groups))
+
+    def df(self):
+        """
+            Get the results as a pandas DataFrame, with one column per field
+
+            Returns:
+                pandas.DataFrame
+        """
+        from pandas import DataFrame
+        return DataFrame(OrderedDict((name, self.column(name)) for name in self.COLUMNS), columns=self.COLUMNS)
+
+    def arrow(self):
+        """
+            Get the results as a pyarrow Table. Result values are converted to strings, since they may be
+            of any type.
+
+            Returns:
+                pyarrow.Table
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('pyarrow is required for ResultStore.arrow() : pip install comparator[arrow]')
+        return pa.table(OrderedDict([
+            ('comparator_name', pa.array(self._cnames, type=pa.string())),
+            ('name', pa.array(self._names, type=pa.string())),
+            ('result', pa.array([str(r) for r in self._results], type=pa.string())),
+            ('elapsed', pa.array(self._elapsed, type=pa.float64(), from_pandas=True)),
+            ('status', pa.array(self._statuses, type=pa.string())),
+        ]))
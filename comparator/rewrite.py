@@ -0,0 +1,119 @@
+"""
+    Rewriting of queries before they are sent to a source
+
+    Queries are wrapped in a subquery rather than parsed, so any SELECT can be rewritten as long as the
+    columns referenced by the rewrite are in its output.
+
+    SQL doesn't require the outer query to keep the order of a subquery, so an ORDER BY in a query that is
+    filtered (where_query, watermark_query) or projected (project_query) may not hold, depending on the
+    database. Comps that compare rows by position should only be used on rewritten queries with a database
+    known to keep the order, while keyed and sketch comps don't depend on it. Only limit_query appends to
+    the query instead, so its ORDER BY still applies.
+"""
+import datetime
+import re
+import six
+
+_WRAPPED = 'SELECT * FROM ({query}) AS _cmp WHERE {where}'
+_COUNT = 'SELECT COUNT(*) AS row_count FROM ({query}) AS _cmp'
+_LIMITED = 'SELECT * FROM ({query}) AS _cmp LIMIT {rows}'
+_PROJECTED = 'SELECT {columns} FROM ({query}) AS _cmp'
+
+# A LIMIT, OFFSET, or FETCH clause at the end of a query, outside of any parentheses
+_TRAILING_LIMIT = re.compile(r'\b(limit|offset|fetch)\b[^)]*$', re.I)
+
+
+def sql_literal(value):
+    """
+        Format a python value as a SQL literal
+
+        Numbers are left as they are, dates and times are formatted as ISO strings, and everything else is
+        quoted as a string with single quotes escaped.
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, six.integer_types + (float, )):
+        return repr(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        value = value.isoformat(' ') if isinstance(value, datetime.datetime) else value.isoformat()
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def where_query(query, where):
+    """
+        Filter the output of a query
+
+        Args:
+            query : str - The query to filter
+            where : str - A SQL condition on the output columns of the query
+
+        Returns:
+            str
+    """
+    return _WRAPPED.format(query=query.strip().rstrip(';'), where=where)
+
+
+def count_query(query):
+    """
+        Count the rows of a query's output, in a single 'row_count' column
+    """
+    return _COUNT.format(query=query.strip().rstrip(';'))
+
+
+def limit_query(query, rows=1):
+    """
+        Keep only the first rows of a query's output
+
+        The LIMIT is appended so that the query's ORDER BY still applies. Queries that already end with a
+        LIMIT, OFFSET, or FETCH clause are wrapped instead.
+
+        Args:
+            query : str - The query to limit
+
+        Kwargs:
+            rows : int - The number of rows to keep
+
+        Returns:
+            str
+    """
+    query = query.strip().rstrip(';').rstrip()
+    if _TRAILING_LIMIT.search(query):
+        return _LIMITED.format(query=query, rows=rows)
+    return '{} LIMIT {}'.format(query, rows)
+
+
+def project_query(query, columns):
+    """
+        Select only some columns of a query's output
+
+        The query's ORDER BY ends up in a subquery, where the database may not keep it.
+
+        Args:
+            query : str - The query to project
+            columns : list - The columns to keep. If empty or None, the query is returned unchanged.
+
+        Returns:
+            str
+    """
+    if not columns:
+        return query
+    return _PROJECTED.format(columns=', '.join(columns), query=query.strip().rstrip(';'))
+
+
+def watermark_query(query, column, value):
+    """
+        Filter a query to the rows past a watermark
+
+        Args:
+            query : str - The query to filter
+            column : str - The watermark column in the output of the query
+            value - The last compared watermark. If None, the query is returned unchanged.
+
+        Returns:
+            str
+    """
+    if value is None:
+        return query
+    return where_query(query, '{} > {}'.format(column, sql_literal(value)))
@@ -0,0 +1,165 @@
+"""
+    Sampled comparisons of very large results
+
+    Both queries are filtered to the same deterministic sample of keys, by hashing the key columns in each
+    database and keeping the rows whose hash falls in the first buckets. The sampled rows are joined by key,
+    and the mismatch rate is reported with a Wilson score confidence interval.
+"""
+import math
+
+from .checksum import POSTGRES_HASH
+from .comps.vector import column_equal, to_frame
+
+_SAMPLE_WHERE = 'MOD(MOD({hash}, {buckets}) + {buckets}, {buckets}) < {threshold}'
+
+# z scores for common confidence levels, for pythons without statistics.NormalDist
+_Z_SCORES = {0.8: 1.2815515655446004, 0.9: 1.6448536269514722, 0.95: 1.959963984540054, 0.99: 2.5758293035489004}
+
+
+def _z_score(confidence):
+    try:
+        from statistics import NormalDist
+    except ImportError:
+        if confidence not in _Z_SCORES:
+            raise ValueError('confidence must be one of %r' % sorted(_Z_SCORES))
+        return _Z_SCORES[confidence]
+    return NormalDist().inv_cdf(0.5 + confidence / 2.0)
+
+
+def wilson_interval(mismatches, rows, confidence=0.95):
+    """
+        The Wilson score interval of a mismatch rate
+
+        Args:
+            mismatches : int - The number of mismatched rows
+            rows : int - The number of rows compared
+
+        Kwargs:
+            confidence : float - The confidence level of the interval
+
+        Returns:
+            tuple - (low, high)
+    """
+    if not rows:
+        return (0.0, 1.0)
+    z = _z_score(confidence)
+    p = float(mismatches) / rows
+    denom = 1 + z * z / rows
+    centre = (p + z * z / (2 * rows)) / denom
+    half = z * math.sqrt(p * (1 - p) / rows + z * z / (4.0 * rows * rows)) / denom
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+
+class SampleSpec(object):
+    """
+        Describes how to sample both queries of a SourcePair by key
+
+        Args:
+            keys : str or list - The key column(s) in the output of both queries. They must be unique.
+
+        Kwargs:
+            rate : float - The fraction of keys to sample
+            buckets : int - The number of hash buckets. The rate is rounded down to a whole number of buckets.
+            hash_expr : str - A SQL expression producing an integer hash, formatted with {columns}. Both sources
+                              must produce the same hash for the same keys. Defaults to a Postgres/Redshift
+                              compatible md5 expression.
+            max_rate : float - The highest mismatch rate that passes
+            confidence : float - The confidence level of the reported interval
+    """
+    def __init__(self, keys, rate=0.01, buckets=10000, hash_expr=POSTGRES_HASH, max_rate=0.0, confidence=0.95):
+        if not 0 < rate <= 1:
+            raise ValueError('rate must be greater than 0 and at most 1')
+        if not isinstance(keys, (list, tuple)):
+            keys = [keys]
+
+        self.keys = list(keys)
+        self.buckets = buckets
+        self.threshold = max(1, int(rate * buckets))
+        self.hash_expr = hash_expr
+        self.max_rate = max_rate
+        self.confidence = confidence
+
+    def __repr__(self):
+        return '<SampleSpec({ss.keys}, rate={ss.rate})>'.format(ss=self)
+
+    @property
+    def rate(self):
+        return float(self.threshold) / self.buckets
+
+    def where(self):
+        """
+            The SQL condition that keeps the sampled rows
+        """
+        return _SAMPLE_WHERE.format(
+            hash=self.hash_expr.format(columns=', '.join(self.keys)), buckets=self.buckets, threshold=self.threshold)
+
+
+class SampleResult(object):
+    """
+        The outcome of a sampled comparison
+
+        Truthy if the mismatch rate of the sample is at most the spec's max_rate.
+
+        Args:
+            mismatches : int - The number of sampled keys that are missing from a side or have different values
+            rows : int - The number of distinct sampled keys across both sides
+            spec : SampleSpec
+    """
+    def __init__(self, mismatches, rows, spec):
+        self.mismatches = mismatches
+        self.rows = rows
+        self.rate = float(mismatches) / rows if rows else 0.0
+        self.interval = wilson_interval(mismatches, rows, spec.confidence)
+        self.confidence = spec.confidence
+        self.max_rate = spec.max_rate
+
+    def __repr__(self):
+        return '<SampleResult(rate={:.6f}, interval=({:.6f}, {:.6f}), rows={})>'.format(
+            self.rate, self.interval[0], self.interval[1], self.rows)
+
+    def __bool__(self):
+        return self.rate <= self.max_rate
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, SampleResult):
+            return (self.mismatches, self.rows) == (other.mismatches, other.rows)
+        return bool(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def sample_diff(left, right, spec):
+    """
+        Join two sampled results by key and count the mismatched keys
+
+        Columns found in only one of the results are not compared.
+
+        Args:
+            left - The sampled "left" result, see comps.vector.to_frame
+            right - The sampled "right" result
+            spec : SampleSpec
+
+        Returns:
+            SampleResult
+    """
+    lframe, rframe = to_frame(left), to_frame(right)
+    for frame in (lframe, rframe):
+        if len(frame.columns):
+            missing = [k for k in spec.keys if k not in frame.columns]
+            if missing:
+                raise KeyError('Key columns not found in result : %r' % missing)
+    if not len(lframe.columns) or not len(rframe.columns):
+        # One side is empty, so every key of the other is a mismatch
+        rows = len(lframe) + len(rframe)
+        return SampleResult(rows, rows, spec)
+
+    merged = lframe.merge(rframe, on=spec.keys, how='outer', suffixes=('_l', '_r'), indicator=True)
+    equal = (merged['_merge'] == 'both').values
+    for col in lframe.columns:
+        if col in spec.keys or col not in rframe.columns:
+            continue
+        equal = equal & column_equal(merged[col + '_l'], merged[col + '_r'])
+    return SampleResult(int(len(merged) - equal.sum()), len(merged), spec)
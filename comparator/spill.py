@@ -0,0 +1,97 @@
+"""
+    Spilling query results to memory-mapped Arrow files
+
+    A SourcePair with storage='disk' writes each query result to an Arrow IPC file as it is read, batch by
+    batch when the source implements 'iter_query', and hands its comps a pyarrow Table that is memory-mapped
+    from the file. Pages of the file are only read when a comp touches them, so results can be larger than
+    the available memory. The files are deleted when the SourcePair is cleared.
+
+    pyarrow is required : pip install comparator[arrow]
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from .arrow import _pyarrow, to_arrow
+
+_log = logging.getLogger(__name__)
+
+
+class SpillStore(object):
+    """
+        A temporary directory of memory-mapped Arrow files
+
+        Kwargs:
+            directory : str - The directory to create the temporary directory in. Defaults to the system's.
+    """
+    def __init__(self, directory=None):
+        _pyarrow()
+        self._parent = directory
+        self._path = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<SpillStore({})>'.format(self._path)
+
+    @property
+    def path(self):
+        return self._path
+
+    def _new_file(self, name):
+        with self._lock:
+            if self._path is None:
+                self._path = tempfile.mkdtemp(prefix='comparator-', dir=self._parent)
+            self._count += 1
+            return os.path.join(self._path, '{}-{}.arrow'.format(name, self._count))
+
+    def write(self, name, batches):
+        """
+            Write batches of rows to a new file and map it back into a Table
+
+            Each batch is converted with arrow.to_arrow, and cast to the schema of the first batch.
+
+            Args:
+                name : str - A name for the file
+                batches : iterable - Batches of rows, Tables, or DataFrames
+
+            Returns:
+                pyarrow.Table - Backed by the memory-mapped file
+        """
+        pa = _pyarrow()
+        path = self._new_file(name)
+        writer = None
+        schema = pa.schema([])
+        rows = 0
+        try:
+            for batch in batches:
+                table = to_arrow(batch)
+                if not table.num_rows:
+                    # Empty batches can't be trusted for column types
+                    schema = table.schema if writer is None else schema
+                    continue
+                if writer is None:
+                    schema = table.schema
+                    writer = pa.ipc.new_file(path, schema)
+                elif table.schema != schema:
+                    table = table.cast(schema)
+                writer.write_table(table)
+                rows += table.num_rows
+            if writer is None:
+                writer = pa.ipc.new_file(path, schema)
+        finally:
+            if writer is not None:
+                writer.close()
+        _log.info('Spilled %d rows to %s', rows, path)
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+    def clear(self):
+        """
+            Delete every file in the store
+        """
+        with self._lock:
+            path, self._path = self._path, None
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,203 @@
+"""
+    Persisted state for incremental comparisons
+
+    An incremental Comparator only queries the rows past the watermark of its last passing run. The
+    watermark and a rollup of previous runs are kept in a local state store, keyed by the name of the
+    Comparator, so they survive between processes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .results import PASSED, FAILED
+
+
+class WatermarkState(object):
+    """
+        The persisted state of an incremental Comparator
+
+        The watermark only advances when every comparison of a run passes, so the rows of a failed run
+        are compared again by the next. A passing run therefore covers every row up to the watermark.
+
+        Kwargs:
+            watermark - The highest watermark value compared by a passing run
+            runs : int - The number of completed runs
+            failures : int - The number of failed runs since the last passing run
+            rows : int - The number of lquery rows compared by passing runs
+            status : str - The cumulative status, 'passed' if every row up to the watermark has passed
+            updated : float - The unix time of the last run
+    """
+    __slots__ = ['watermark', 'runs', 'failures', 'rows', 'status', 'updated']
+
+    def __init__(self, watermark=None, runs=0, failures=0, rows=0, status=None, updated=None):
+        self.watermark = watermark
+        self.runs = runs
+        self.failures = failures
+        self.rows = rows
+        self.status = status
+        self.updated = updated
+
+    def __repr__(self):
+        return '<WatermarkState(watermark={ws.watermark!r}, runs={ws.runs}, status={ws.status})>'.format(ws=self)
+
+    def dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def record(self, passed, watermark=None, rows=0):
+        """
+            Roll the outcome of a run into the state
+
+            Args:
+                passed : bool - Whether every comparison of the run passed
+
+            Kwargs:
+                watermark - The highest watermark value of the run. Ignored if the run failed or it is None.
+                rows : int - The number of lquery rows compared by the run
+        """
+        self.runs += 1
+        self.updated = time.time()
+        if passed:
+            self.failures = 0
+            self.rows += rows
+            self.status = PASSED
+            if watermark is not None:
+                self.watermark = watermark
+        else:
+            self.failures += 1
+            self.status = FAILED
+
+
+def _encode(state):
+    # Values without a JSON type, like datetimes and decimals, are stored as strings
+    return json.dumps(state.dict(), default=str, sort_keys=True)
+
+
+def _decode(text):
+    return WatermarkState(**json.loads(text))
+
+
+class StateStore(object):
+    """
+        A state store backed by a SQLite database
+
+        Args:
+            path : str - The SQLite database file, created if it does not exist
+    """
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS comparator_state (name TEXT PRIMARY KEY, state TEXT NOT NULL)')
+        finally:
+            conn.close()
+
+    def __repr__(self):
+        return '<StateStore({})>'.format(self._path)
+
+    def _connect(self):
+        return sqlite3.connect(self._path)
+
+    def get(self, name):
+        """
+            Get the state of a Comparator
+
+            Returns:
+                WatermarkState - An empty state if the Comparator has not run before
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT state FROM comparator_state WHERE name = ?', (name, )).fetchone()
+            finally:
+                conn.close()
+        return _decode(row[0]) if row else WatermarkState()
+
+    def set(self, name, state):
+        """
+            Persist the state of a Comparator
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO comparator_state (name, state) VALUES (?, ?)', (name, _encode(state)))
+            finally:
+                conn.close()
+
+    def delete(self, name):
+        """
+            Forget the state of a Comparator, so its next run compares every row
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM comparator_state WHERE name = ?', (name, ))
+            finally:
+                conn.close()
+
+
+class FileStateStore(object):
+    """
+        A state store backed by a single JSON file
+
+        The whole file is rewritten on every update, so this is best suited to a small number of Comparators.
+
+        Args:
+            path : str - The JSON file, created if it does not exist
+    """
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<FileStateStore({})>'.format(self._path)
+
+    def _read(self):
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (IOError, OSError):
+            return dict()
+
+    def _write(self, states):
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(states, f, sort_keys=True)
+        # Replace the file in one step so a crash never leaves it half written
+        getattr(os, 'replace', os.rename)(tmp, self._path)
+
+    def get(self, name):
+        """
+            Get the state of a Comparator
+
+            Returns:
+                WatermarkState - An empty state if the Comparator has not run before
+        """
+        with self._lock:
+            state = self._read().get(name)
+        return WatermarkState(**state) if state else WatermarkState()
+
+    def set(self, name, state):
+        """
+            Persist the state of a Comparator
+        """
+        with self._lock:
+            states = self._read()
+            states[name] = json.loads(_encode(state))
+            self._write(states)
+
+    def delete(self, name):
+        """
+            Forget the state of a Comparator, so its next run compares every row
+        """
+        with self._lock:
+            states = self._read()
+            if states.pop(name, None) is not None:
+                self._write(states)
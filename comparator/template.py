@@ -0,0 +1,100 @@
+"""
+    Compiled rquery templates
+
+    An rquery can reference the result of the lquery with {{ column }} slots. The query is parsed once
+    into literal and slot segments, so rendering is a single join no matter how many slots it has.
+"""
+import re
+import six
+
+from .arrow import is_arrow
+from .exceptions import QueryFormatError
+
+RQUERY_SLOT = re.compile(r'\{\{[\s]?([a-zA-Z0-9\_]+)[\s]?\}\}')
+
+
+class RQueryTemplate(object):
+    """
+        An rquery parsed into literal text and {{ column }} slots
+
+        Args:
+            source : str - The query text
+    """
+    __slots__ = ['source', '_segments', 'keys']
+
+    def __init__(self, source):
+        self.source = source
+
+        # Alternating literal text and slot keys, starting and ending with literal text
+        self._segments = RQUERY_SLOT.split(source)
+        self.keys = list()
+        for key in self._segments[1::2]:
+            if key not in self.keys:
+                self.keys.append(key)
+
+    def __repr__(self):
+        return '<RQueryTemplate(keys={})>'.format(self.keys)
+
+    @property
+    def templated(self):
+        return bool(self.keys)
+
+    def render(self, format_key):
+        """
+            Fill each slot of the template
+
+            Args:
+                format_key : callable - Called once per distinct key, returning the text to put in its slots
+
+            Returns:
+                str
+        """
+        if not self.keys:
+            return self.source
+
+        values = dict((key, format_key(key)) for key in self.keys)
+        segments = list(self._segments)
+        segments[1::2] = [values[key] for key in segments[1::2]]
+        return ''.join(segments)
+
+
+def _column(result, key):
+    try:
+        return result[key]
+    except KeyError:
+        raise QueryFormatError('Key not found in lquery result : ' + key)
+
+
+def format_result_column(result, key):
+    """
+        Format a column of a query result as a SQL tuple for an rquery slot
+    """
+    col = _column(result, key)
+    if is_arrow(col):
+        return format_values(col.to_pylist())
+    return col._rquery_format()
+
+
+def result_column_values(result, key):
+    """
+        Get every value of a column of a query result, for binding to an rquery slot
+    """
+    col = _column(result, key)
+    if is_arrow(col):
+        return col.to_pylist()
+    return list(col)
+
+
+def format_values(values):
+    """
+        Format a list of values as a SQL tuple for an rquery slot, the same way as a result column
+
+        None values are dropped, and an empty list is filled with a value that matches nothing.
+    """
+    values = [str(v) if isinstance(v, six.string_types) else v for v in values if v is not None]
+    if not values:
+        return str("('__xxx__EMPTYRESULT__xxx__')")
+    elif len(values) == 1:
+        v = values[0]
+        return str("('{}')".format(v) if isinstance(v, six.string_types) else '({})'.format(v))
+    return str(tuple(values))
@@ -35,7 +35,7 @@ setup(
     license='Apache 2.0',
     keywords='utility compare database',
     url='https://github.com/aaronbiller/comparator',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     tests_require=[
         'pytest',
         'pytest-cov',
@@ -53,8 +53,12 @@ setup(
         'pytest-runner==4.2',
     ],
     extras_require={
+        'arrow': [
+            'pyarrow',
+        ],
         ':python_version == "2.7"': [
             'pathlib2==2.3.2',
+            'futures>=3.2.0',
         ],
     },
     include_package_data=True,
@@ -0,0 +1,5 @@
+import six
+
+collect_ignore = []
+if six.PY2:
+    collect_ignore.append('test_aio.py')
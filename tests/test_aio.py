@@ -0,0 +1,219 @@
+import asyncio
+import pytest
+
+from comparator import SourcePair, Comparator, ComparatorSet
+from comparator.cache import QueryCache
+from comparator.compare import ComparatorResult
+from tests.test_compare import (
+    FakeSource, FakeStreamSource, query, other_query, left_results, right_results, mismatch_right_results)
+
+
+def run(coro):
+    # asyncio.run is not available on Python 3.6
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class AsyncFakeSource(FakeSource):
+    """
+        A source that exposes an 'aquery' coroutine
+    """
+    def query(self, query_string):
+        raise AssertionError('The blocking query method should not be called')
+
+    async def aquery(self, query_string):
+        self.queries.append(query_string)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return self.result
+
+
+def test_aget_query_results():
+    l, r = AsyncFakeSource(left_results), FakeSource(right_results)
+    sp = SourcePair(l, query, r, other_query)
+    run(sp.aget_query_results())
+    assert sp.query_results == (left_results, right_results)
+    assert l.queries == [query]
+    assert r.queries == [other_query]
+
+    rquery = 'select * from somewhere where id in {{ a }}'
+    sp = SourcePair(l, query, r, rquery)
+    run(sp.aget_query_results())
+    assert r.queries[-1] == 'select * from somewhere where id in (1, 4)'
+
+    sp = SourcePair(l, query)
+    run(sp.aget_query_results())
+    assert sp.query_results == (left_results, )
+
+
+def test_acompare():
+    l, r = AsyncFakeSource(left_results), AsyncFakeSource(mismatch_right_results)
+    c = Comparator(l, query, r, comps=['first', 'len'], name='test')
+
+    async def collect():
+        return [result async for result in c.acompare()]
+
+    results = run(collect())
+    assert results == [
+        ComparatorResult('test', 'first_eq_comp', True),
+        ComparatorResult('test', 'len_comp', False)]
+    assert len(l.queries) == 1
+
+    c.clear()
+    assert run(c.arun_comparisons()) == results
+    assert len(l.queries) == 2
+
+    # Results are reused once the queries have run
+    assert run(collect()) == results
+    assert run(c.arun_comparisons()) == results
+    assert len(l.queries) == 2
+
+
+def test_comparatorset_arun():
+    l, r = AsyncFakeSource(left_results, delay=0.01), FakeSource(right_results)
+    cs = ComparatorSet.from_dict([{'name': str(i), 'lquery': query} for i in range(5)], l, r)
+
+    async def collect(**kwargs):
+        return [c async for c in cs.arun(**kwargs)]
+
+    finished = run(collect(max_concurrency=3, source_limits={l: 1}))
+    assert sorted(c.name for c in finished) == [str(i) for i in range(5)]
+    assert all(c.results == [True] for c in finished)
+    assert l.peak == 1
+
+    # A pair that queries the same source on both sides takes a slot per query
+    l = AsyncFakeSource(left_results, delay=0.01)
+    cs = ComparatorSet.from_dict([{'lquery': query}, {'lquery': other_query}], l, l)
+    finished = run(collect(source_limits={l: 1}))
+    assert all(c.results == [True] for c in finished)
+    assert l.peak == 1
+
+    class BrokenSource(AsyncFakeSource):
+        async def aquery(self, query_string):
+            raise RuntimeError('connection refused')
+
+    l, r = AsyncFakeSource(left_results), AsyncFakeSource(right_results)
+    cs = ComparatorSet([SourcePair(l, query, r), SourcePair(BrokenSource(None), query, r)])
+    finished = run(collect())
+    assert len(finished) == 2
+    assert [c.error for c in finished if c.error is not None][0].args == ('connection refused', )
+
+    # Remaining tasks are cancelled once the caller stops iterating
+    l = AsyncFakeSource(left_results, delay=0.01)
+    cs = ComparatorSet.from_dict([{'lquery': query} for _ in range(10)], l, r)
+
+    async def first():
+        gen = cs.arun(max_concurrency=1)
+        async for c in gen:
+            await gen.aclose()
+            return c
+
+    assert run(first()).results == [True]
+    assert len(l.queries) < 10
+
+    cs = ComparatorSet([])
+    assert run(collect()) == []
+
+
+def test_arun_stream():
+    rows = [(i, 'row %d' % i) for i in range(20)]
+    l, r = FakeStreamSource(rows), FakeStreamSource(rows)
+    c = Comparator(l, query, r, stream=True, batch_size=5)
+    assert run(c.arun_comparisons()) == [True]
+    assert l.batches_read == 4
+
+    async def collect():
+        return [result async for result in c.acompare()]
+
+    c.clear()
+    assert run(collect()) == [True]
+    assert l.batches_read == 8
+
+    c.clear()
+    cs = ComparatorSet([c._sp])
+    cs._comparisons = [c]
+
+    async def run_set():
+        return [comp async for comp in cs.arun(source_limits={l: 1})]
+
+    assert [comp.results for comp in run(run_set())] == [[True]]
+    assert l.batches_read == 12
+
+
+def test_aget_query_results_cache():
+    l, r = AsyncFakeSource(left_results), FakeSource(right_results)
+    cache = QueryCache()
+    for _ in range(2):
+        sp = SourcePair(l, query, r, other_query, cache=cache)
+        run(sp.aget_query_results())
+        assert sp.query_results == (left_results, right_results)
+    assert l.queries == [query]
+    assert r.queries == [other_query]
+
+
+def test_comparatorset_arun_dedupe():
+    l, r = AsyncFakeSource(left_results, delay=0.01), FakeSource(right_results)
+    dicts = [{'lquery': query, 'rquery': other_query} for _ in range(4)]
+    cs = ComparatorSet.from_dict(dicts, l, r, dedupe=True)
+
+    async def collect():
+        return [c async for c in cs.arun()]
+
+    assert all(c.results == [True] for c in run(collect()))
+    assert l.queries == [query]
+    assert r.queries == [other_query]
+    assert cs.plan.executed == 2
+
+    # Failed shared queries are retried
+    class FlakySource(AsyncFakeSource):
+        async def aquery(self, query_string):
+            self.queries.append(query_string)
+            if len(self.queries) == 1:
+                raise RuntimeError('flaky')
+            return self.result
+
+    l = FlakySource(left_results)
+    cs = ComparatorSet.from_dict([{'lquery': query, 'comps': lambda x: bool(x)}], l, dedupe=True)
+    assert run(collect())[0].error is not None
+    c = run(collect())[0]
+    assert c.results == [True]
+    assert c.error is None
+    assert len(l.queries) == 2
+
+
+def test_aget_query_results_key_batches():
+    from tests.test_template import KeySource
+    lresult = FakeSource(left_results)
+    right = KeySource([{'a': 1}])
+    sp = SourcePair(lresult, query, right, 'select {{ a }}', key_strategy='batch', key_batch_size=1)
+    run(sp.aget_query_results())
+    assert [q for q, _ in right.queries] == ['select (1)', 'select (4)']
+    assert sp.rresult == [{'a': 1}, {'a': 1}]
+
+
+def test_comparatorset_arun_max_failures():
+    l, r = FakeSource(left_results, delay=0.01), FakeSource(mismatch_right_results)
+    cs = ComparatorSet.from_dict([{'lquery': query} for _ in range(10)], l, r)
+
+    async def collect():
+        return [c async for c in cs.arun(max_concurrency=2, max_failures=2)]
+
+    finished = run(collect())
+    assert len(finished) == 2
+    assert all(c.failed for c in finished)
+    assert len(l.queries) < 10
+
+
+def test_aget_query_results_disk_storage(tmpdir):
+    pytest.importorskip('pyarrow')
+    l, r = FakeStreamSource([{'a': 1}, {'a': 2}]), FakeSource([{'a': 1}])
+    sp = SourcePair(l, query, r, storage='disk', spill_dir=str(tmpdir))
+    run(sp.aget_query_results())
+    assert sp.lresult.num_rows == 2
+    assert sp.rresult.to_pylist() == [{'a': 1}]
+    sp.clear()
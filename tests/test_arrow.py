@@ -0,0 +1,72 @@
+import pytest
+
+from comparator import Comparator, ComparatorSet, SourcePair
+from comparator.arrow import ArrowSource, to_arrow
+from comparator.cache import QueryCache, source_key
+from comparator.comps import BASIC_COMP, LEN_COMP, FIRST_COMP, VECTOR_COMP, MISMATCH_COMP
+from comparator.comps.vector import to_frame
+from tests.test_compare import FakeSource, get_mock_query_result, left_query_results, query
+
+pa = pytest.importorskip('pyarrow')
+
+
+class ArrowNativeSource(FakeSource):
+    def query(self, query_string):
+        raise AssertionError('query_arrow should be used')
+
+    def query_arrow(self, query_string):
+        self.queries.append(query_string)
+        return pa.RecordBatch.from_pylist(self.result)
+
+
+def test_to_arrow():
+    table = to_arrow(get_mock_query_result(left_query_results))
+    assert isinstance(table, pa.Table)
+    assert table.to_pylist() == left_query_results
+    assert to_arrow(table) is table
+    assert to_arrow(table.to_pandas()).equals(table)
+
+
+def test_arrow_source_pair():
+    l, r = FakeSource(get_mock_query_result(left_query_results)), ArrowNativeSource(left_query_results)
+    sp = SourcePair(l, query, r, result_format='arrow')
+    sp.get_query_results()
+    assert all(isinstance(result, pa.Table) for result in sp.query_results)
+    assert r.queries == [query]
+    assert to_frame(sp.lresult).equals(sp.lresult.to_pandas())
+
+    c = Comparator(sp=sp, comps=[BASIC_COMP, LEN_COMP, FIRST_COMP, VECTOR_COMP, MISMATCH_COMP])
+    assert c.run_comparisons() == [True, True, True, True, True]
+
+    mismatched = FakeSource(left_query_results[:1] + [{'a': 4, 'b': 0, 'c': 6}])
+    c = Comparator(sp=SourcePair(l, query, mismatched, result_format='arrow'),
+                   comps=[BASIC_COMP, LEN_COMP, FIRST_COMP, MISMATCH_COMP])
+    results = c.run_comparisons()
+    assert results[:3] == [False, True, True]
+    assert dict(results[3].result.counts) == {'a': 0, 'b': 1, 'c': 0}
+
+
+def test_arrow_templated_rquery():
+    l, r = FakeSource(left_query_results), FakeSource([{'a': 1}])
+    sp = SourcePair(l, query, r, 'select * from t where a in {{ a }}', result_format='arrow',
+                    key_strategy='batch', key_batch_size=1)
+    sp.get_query_results()
+    assert r.queries == ['select * from t where a in (1)', 'select * from t where a in (4)']
+    assert sp.rresult.to_pylist() == [{'a': 1}, {'a': 1}]
+
+
+def test_arrow_sources_share_cache_and_limits():
+    l, r = FakeSource(left_query_results, delay=0.01), FakeSource(left_query_results)
+    sps = [SourcePair(l, query, r, result_format='arrow') for _ in range(3)] + [SourcePair(l, query, r)]
+    assert source_key(sps[0]._left) == source_key(sps[1]._left) != source_key(l)
+    assert ArrowSource(l).__wrapped__ is l
+
+    # Limits are given for the wrapped source
+    assert all(c.results == [True] for c in ComparatorSet(sps).run(source_limits={l: 1}))
+    assert l.peak == 1
+
+    # Arrow and row results of the same query are cached separately
+    l.queries = list()
+    cs = ComparatorSet(sps, cache=QueryCache())
+    assert all(c.results == [True] for c in cs.run(max_workers=1))
+    assert len(l.queries) == 2
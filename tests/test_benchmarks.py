@@ -0,0 +1,43 @@
+import json
+import pytest
+
+# The benchmarks record peak memory with tracemalloc, which needs Python 3.4+
+pytest.importorskip('tracemalloc')
+
+from benchmarks import run  # noqa: E402
+from benchmarks.scenarios import SCENARIOS  # noqa: E402
+from benchmarks.sources import SyntheticSource, synthetic_result  # noqa: E402
+
+
+def test_synthetic_sources():
+    left, right = synthetic_result(5), synthetic_result(5, side='right')
+    assert left == right
+    assert left is not right
+    assert synthetic_result(5) is left
+    assert list(left.keys()) == ['id', 'col_1', 'col_2', 'col_3']
+
+    source = SyntheticSource(5, columns=2)
+    assert list(source.query('select').keys()) == ['id', 'col_1']
+    assert source.queries == 1
+
+
+def test_run_benchmarks(tmpdir):
+    assert run.parse_size('10k') == 10000
+    assert run.parse_size('1.5M') == 1500000
+    assert run.parse_size('200') == 200
+
+    results = run.run_benchmarks(list(SCENARIOS), [20], repeat=1)
+    assert list(results) == ['{}[20]'.format(name) for name in SCENARIOS]
+    assert all(r['seconds'] > 0 and r['peak_bytes'] >= 0 for r in results.values())
+
+    baseline = {'len_comp[20]': {'seconds': 1.0, 'peak_bytes': 10 ** 6}, 'other[20]': {'seconds': 0.0}}
+    assert run.compare(results, baseline) == []
+    baseline['len_comp[20]'] = {'seconds': 0.0, 'peak_bytes': 0}
+    results['len_comp[20]'] = {'seconds': 0.5, 'peak_bytes': 10 ** 6}
+    assert len(run.compare(results, baseline)) == 2
+
+    saved = str(tmpdir.join('baseline.json'))
+    assert run.main(['--scenarios', 'len_comp,first_eq_comp', '--sizes', '10', '--save', saved]) == 0
+    with open(saved) as f:
+        assert set(json.load(f)['results']) == {'len_comp[10]', 'first_eq_comp[10]'}
+    assert run.main(['--scenarios', 'len_comp', '--sizes', '10', '--no-memory', '--baseline', saved]) == 0
@@ -0,0 +1,89 @@
+import mock
+
+from comparator import ComparatorSet, SourcePair
+from comparator.cache import QueryCache, source_key
+from tests.test_compare import FakeSource, query, other_query, left_results, right_results
+
+
+class NamedSource(FakeSource):
+    cache_key = 'postgres://reference'
+
+
+def test_query_cache():
+    l, r = FakeSource(left_results), FakeSource(right_results)
+    cache = QueryCache(maxsize=2)
+    assert cache.get(l, query) == (False, None)
+
+    cache.set(l, query, left_results)
+    cache.set(r, query, right_results)
+    assert cache.get(l, query) == (True, left_results)
+    assert cache.get(r, query) == (True, right_results)
+    assert len(cache) == 2
+
+    # The least recently used result is evicted
+    cache.get(l, query)
+    cache.set(l, other_query, left_results)
+    assert cache.get(r, query) == (False, None)
+    assert cache.get(l, query) == (True, left_results)
+    assert repr(cache) == '<QueryCache(size=2, hits=4, misses=2)>'
+
+    cache.clear()
+    assert len(cache) == 0
+
+    assert source_key(NamedSource(None)) == 'postgres://reference'
+    assert source_key(l).startswith('FakeSource@')
+
+
+def test_query_cache_ttl():
+    l = FakeSource(left_results)
+    cache = QueryCache(ttl=10)
+    with mock.patch('comparator.cache.time.time', return_value=100):
+        cache.set(l, query, left_results)
+    with mock.patch('comparator.cache.time.time', return_value=105):
+        assert cache.get(l, query) == (True, left_results)
+    with mock.patch('comparator.cache.time.time', return_value=111):
+        assert cache.get(l, query) == (False, None)
+
+
+def test_query_cache_disk(tmpdir):
+    path = str(tmpdir.join('cache'))
+    l, unnamed = NamedSource([1, 2, 3]), FakeSource([4, 5, 6])
+    cache = QueryCache(ttl=10, path=path)
+    with mock.patch('comparator.cache.time.time', return_value=100):
+        cache.set(l, query, l.result)
+        cache.set(unnamed, query, unnamed.result)
+    assert len(tmpdir.join('cache').listdir()) == 1
+
+    other = QueryCache(ttl=10, path=path)
+    with mock.patch('comparator.cache.time.time', return_value=105):
+        assert other.get(NamedSource(None), query) == (True, [1, 2, 3])
+        assert other.get(unnamed, query) == (False, None)
+        assert other.get(NamedSource(None), other_query) == (False, None)
+    with mock.patch('comparator.cache.time.time', return_value=111):
+        assert QueryCache(ttl=10, path=path).get(l, query) == (False, None)
+
+    with mock.patch('comparator.cache._log') as log:
+        with mock.patch('comparator.cache.pickle.dump', side_effect=IOError('disk full')):
+            cache.set(l, other_query, l.result)
+    assert log.warning.call_count == 1
+
+
+def test_shared_cache():
+    l, r = FakeSource(left_results), FakeSource(right_results)
+    cache = QueryCache()
+    dicts = [{'lquery': query, 'rquery': other_query}, {'lquery': query, 'rquery': query}]
+    cs = ComparatorSet.from_dict(dicts, l, r, cache=cache)
+    for c in cs:
+        c.run_comparisons()
+    assert l.queries == [query]
+    assert r.queries == [other_query, query]
+
+    sp = SourcePair(l, query, r, other_query, cache=cache)
+    sp.get_query_results()
+    assert sp.query_results == (left_results, right_results)
+    assert len(l.queries) == 1
+
+    cs = ComparatorSet([SourcePair(l, other_query)], cache=cache)
+    list(cs.run())
+    list(ComparatorSet([SourcePair(l, other_query)], cache=cache).run())
+    assert l.queries == [query, other_query]
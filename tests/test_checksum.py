@@ -0,0 +1,76 @@
+import pytest
+import sqlite3
+
+from comparator import Comparator, SourcePair
+from comparator.checksum import ChecksumSpec, ChecksumResult, checksum_diff
+from comparator.exceptions import InvalidCompSetException
+
+
+class SqliteSource(object):
+    def __init__(self, rows):
+        self.queries = list()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('CREATE TABLE t (id INTEGER, value INTEGER)')
+        self._conn.executemany('INSERT INTO t VALUES (?, ?)', rows)
+
+    def query(self, query_string):
+        self.queries.append(query_string)
+        return [dict(row) for row in self._conn.execute(query_string)]
+
+
+rows = [(i, i * 2) for i in range(1000)]
+spec = ChecksumSpec('t', 'id', ['id', 'value'], chunks=4, min_rows=10, hash_expr='id * 1000 + value')
+
+
+def test_checksum_spec():
+    with pytest.raises(ValueError):
+        ChecksumSpec('t', 'id', 'value', chunks=1)
+
+    s = ChecksumSpec('t', 'id', 'value', where='value > 0')
+    assert s.columns == ['value']
+    assert s.bounds_query() == 'SELECT MIN(id) AS lo, MAX(id) AS hi FROM t WHERE value > 0'
+    assert s.chunk_query(0, 99, 10) == (
+        "SELECT FLOOR((id - 0) / 10) AS chunk, COUNT(*) AS cnt, "
+        "SUM(('x' || substr(md5(ROW(value)::text), 1, 8))::bit(32)::int) AS checksum "
+        "FROM t WHERE id >= 0 AND id <= 99 AND (value > 0) GROUP BY 1")
+    assert repr(s) == '<ChecksumSpec(t, id)>'
+
+
+def test_checksum_diff():
+    l, r = SqliteSource(rows), SqliteSource(rows)
+    result = SourcePair(l, 'unused', r).checksum(spec)
+    assert result
+    assert result == True  # noqa: E712
+    assert result.ranges == []
+    assert result.queries == 2
+
+    changed = list(rows)
+    changed[123] = (123, 0)
+    changed[900] = (900, 0)
+    l, r = SqliteSource(rows), SqliteSource(changed[:-5])
+    result = checksum_diff(SourcePair(l, 'unused', r), spec)
+    assert not result
+    assert [lo <= 123 <= hi for lo, hi in result.ranges].count(True) == 1
+    assert [lo <= 900 <= hi for lo, hi in result.ranges].count(True) == 1
+    assert [lo <= 997 <= hi for lo, hi in result.ranges].count(True) == 1
+    assert all(hi - lo < 10 for lo, hi in result.ranges)
+    assert result != ChecksumResult([], 1)
+    assert 'ranges=' in repr(result)
+
+    empty = checksum_diff(SourcePair(SqliteSource([]), 'unused', SqliteSource([])), spec)
+    assert empty == ChecksumResult([], 1)
+
+    with pytest.raises(InvalidCompSetException):
+        SourcePair(l, 'unused').checksum(spec)
+
+
+def test_checksum_comparator():
+    l, r = SqliteSource(rows), SqliteSource(rows[1:])
+    c = Comparator(l, 'select * from t', r, checksum=spec, name='test')
+    assert c.get_query_results() == (None, None)
+    res = c.run_comparisons()
+    assert res[0].name == 'checksum_comp'
+    assert res[0].result.ranges == [(0, 3)]
+    assert not any('select * from t' == q for q in l.queries)
+    assert c.run_comparisons() == res
@@ -1,5 +1,8 @@
+import copy
 import mock
 import pytest
+import threading
+import time
 import types
 
 from spackl.db import Postgres, QueryResult
@@ -8,7 +11,8 @@ from sqlalchemy.engine import ResultProxy
 from comparator import comps
 from comparator import SourcePair, Comparator, ComparatorSet
 from comparator.compare import ComparatorResult
-from comparator.exceptions import InvalidCompSetException, QueryFormatError
+from comparator.exceptions import ComparisonCancelled, InvalidCompSetException, QueryFormatError
+from comparator.rewrite import count_query, limit_query, project_query
 
 query = 'select * from nowhere'
 other_query = 'select count(*) from somewhere'
@@ -25,6 +29,46 @@ def get_mock_query_result(values):
     return QueryResult(mock_result)
 
 
+class FakeSource(object):
+    """
+        A thread-safe source that records how many queries were running at once
+    """
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.queries = list()
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def query(self, query_string):
+        with self._lock:
+            self.queries.append(query_string)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return self.result
+
+
+class FakeStreamSource(object):
+    """
+        A source that yields its rows in batches and records how many were read
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.batches_read = 0
+
+    def query(self, query_string):
+        raise AssertionError('The full result should not be fetched when streaming')
+
+    def iter_query(self, query_string, batch_size):
+        for i in range(0, len(self.rows), batch_size):
+            self.batches_read += 1
+            yield self.rows[i:i + batch_size]
+
+
 left_results = get_mock_query_result(left_query_results)
 right_results = get_mock_query_result(right_query_results)
 mismatch_right_results = get_mock_query_result(mismatch_right_query_results)
@@ -54,6 +98,7 @@ def test_source_pair():
     assert sp2._right is None
     assert sp2._rquery is None
     assert sp2.query_results == (None, )
+    assert not sp2.templated
 
     with pytest.raises(TypeError):
         SourcePair(l, r, query)
@@ -91,6 +136,48 @@ def test_source_pair_queries():
     assert formatted == "select * from somewhere where id in ('one', 'four')"
 
 
+def test_source_pair_concurrent():
+    l, r = Postgres(), Postgres()
+    sp = SourcePair(l, query, r, other_query, concurrent=True)
+    assert not sp.templated
+
+    with mock.patch.object(sp._left, 'query', return_value=left_results) as lq:
+        with mock.patch.object(sp._right, 'query', return_value=right_results) as rq:
+            sp.get_query_results()
+    lq.assert_called_once_with(query)
+    rq.assert_called_once_with(other_query)
+    assert sp.query_results == (left_results, right_results)
+
+    # Both queries must be in flight at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_other(result):
+        def query(query_string):
+            barrier.wait()
+            return result
+        return query
+
+    with mock.patch.object(sp._left, 'query', side_effect=wait_for_other(left_results)):
+        with mock.patch.object(sp._right, 'query', side_effect=wait_for_other(right_results)):
+            sp.get_query_results()
+    assert not barrier.broken
+    assert sp.query_results == (left_results, right_results)
+
+    rquery = 'select * from somewhere where id in {{ a }}'
+    sp = SourcePair(l, query, r, rquery, concurrent=True)
+    assert sp.templated
+
+    with mock.patch('comparator.compare.ThreadPoolExecutor') as mock_executor:
+        with mock.patch.object(sp._left, 'query', return_value=left_results):
+            with mock.patch.object(sp._right, 'query', return_value=right_results) as rq:
+                sp.get_query_results()
+    assert mock_executor.call_count == 0
+    rq.assert_called_once_with('select * from somewhere where id in (1, 4)')
+
+    c = Comparator(l, query, r, concurrent=True)
+    assert c._sp._concurrent is True
+
+
 def test_comparator():
     sp1 = SourcePair(Postgres(), query, Postgres())
     sp2 = SourcePair(Postgres(), query, Postgres(), other_query)
@@ -276,6 +363,32 @@ def test_non_bool_comparison():
     with pytest.raises(KeyError):
         comp['cheesecake']
 
+    with pytest.raises(AttributeError):
+        comp._result = 2
+    with pytest.raises(AttributeError):
+        del comp._name
+    assert copy.copy(comp) is comp
+    assert c.run_comparisons()[0] is comp
+
+
+def test_run_comparisons_copy():
+    def diff_comp(left, right):
+        return [row for row in right.list() if row not in left.list()]
+
+    sp = SourcePair(Postgres(), query, Postgres())
+    c = Comparator(sp=sp, comps=diff_comp)
+    with mock.patch.object(c._sp._left, 'query', return_value=left_results):
+        with mock.patch.object(c._sp._right, 'query', return_value=mismatch_right_results):
+            shared = c.run_comparisons()
+    copied = c.run_comparisons(copy_results=True)
+
+    assert shared[0] is c.results[0]
+    assert shared is not c.results
+    assert copied[0] is not c.results[0]
+    assert copied[0].result == [(7, 8, 9)]
+    copied[0].result.append(None)
+    assert c.results[0].result == [(7, 8, 9)]
+
 
 def test_comparatorset():
     l, r = Postgres(), Postgres()
@@ -375,3 +488,238 @@ def test_comparatorset_from_dict():
 
     with pytest.raises(IndexError):
         cs[2]
+
+
+def test_comparatorset_run():
+    l, r = FakeSource(left_results, delay=0.01), FakeSource(right_results, delay=0.01)
+    cs = ComparatorSet.from_dict([{'name': str(i), 'lquery': query} for i in range(6)], l, r)
+    assert len(cs) == 6
+
+    finished = list(cs.run(max_workers=4, source_limits={l: 1}))
+    assert sorted(c.name for c in finished) == [str(i) for i in range(6)]
+    assert all(c.results == [True] for c in finished)
+    assert len(l.queries) == 6
+    assert len(r.queries) == 6
+    assert l.peak == 1
+
+    cs = ComparatorSet([SourcePair(l, query)], comps=lambda x: bool(x))
+    assert [c.results for c in cs.run()] == [[True]]
+
+    # A pair that queries the same source on both sides takes a slot per query
+    l = FakeSource(left_results, delay=0.01)
+    cs = ComparatorSet.from_dict([{'lquery': query}, {'lquery': other_query}], l, l, concurrent=True)
+    assert all(c.results == [True] for c in cs.run(source_limits={l: 1}))
+    assert l.peak == 1
+    assert cs[0]._sp._limits is None
+
+    # A failing pair is yielded with its error instead of ending the run
+    class BrokenSource(FakeSource):
+        def query(self, query_string):
+            raise RuntimeError('connection refused')
+
+    l, r = FakeSource(left_results), FakeSource(right_results)
+    sps = [SourcePair(l, query, r), SourcePair(BrokenSource(None), query, r), SourcePair(l, query, r)]
+    finished = list(ComparatorSet(sps).run(max_workers=1))
+    assert len(finished) == 3
+    errors = [c.error for c in finished if c.error is not None]
+    assert len(errors) == 1
+    assert isinstance(errors[0], RuntimeError)
+    assert sum(c.results == [True] for c in finished) == 2
+
+    # Queued Comparators are not started once the caller stops iterating
+    l, r = FakeSource(left_results, delay=0.01), FakeSource(right_results)
+    cs = ComparatorSet.from_dict([{'lquery': query} for _ in range(10)], l, r)
+    for c in cs.run(max_workers=1):
+        break
+    assert len(l.queries) < 10
+
+    cs = ComparatorSet([])
+    assert list(cs.run()) == []
+
+
+def test_compare_short_circuit():
+    calls = list()
+
+    @comps.hints(cost=50, depends=[comps.LEN_COMP, 'first_eq_comp'])
+    def expensive_comp(left, right):
+        calls.append('expensive')
+        return True
+
+    sp = SourcePair(FakeSource(left_results), query, FakeSource(mismatch_right_results), query)
+    c = Comparator(sp=sp, comps=[expensive_comp, comps.BASIC_COMP, comps.FIRST_COMP, comps.LEN_COMP],
+                   short_circuit=True)
+    results = c.run_comparisons()
+    assert [(r.name, r.status) for r in results] == [
+        ('len_comp', 'failed'),
+        ('first_eq_comp', 'passed'),
+        ('basic_comp', 'skipped'),
+        ('expensive_comp', 'skipped')]
+    assert results[2].result is None
+    assert calls == []
+
+    # Without short_circuit, every comp runs in the order given
+    c = Comparator(sp=sp, comps=[expensive_comp, comps.BASIC_COMP, comps.LEN_COMP])
+    assert [r.status for r in c.run_comparisons()] == ['passed', 'failed', 'failed']
+    assert calls == ['expensive']
+    assert c.failed
+
+
+class PushdownSource(FakeSource):
+    """
+        A source that answers COUNT(*) and LIMIT 1 queries as a database would
+    """
+    def query(self, query_string):
+        result = super(PushdownSource, self).query(query_string)
+        if query_string.startswith('SELECT COUNT(*)'):
+            return get_mock_query_result([{'row_count': len(result)}])
+        if query_string.endswith('LIMIT 1'):
+            return get_mock_query_result([result.first()])
+        return result
+
+
+def test_compare_lazy():
+    assert limit_query(query + ';') == query + ' LIMIT 1'
+    assert limit_query(query + ' LIMIT 10', 2) == 'SELECT * FROM ({} LIMIT 10) AS _cmp LIMIT 2'.format(query)
+    assert count_query(query) == 'SELECT COUNT(*) AS row_count FROM ({}) AS _cmp'.format(query)
+
+    left, right = PushdownSource(left_results), PushdownSource(mismatch_right_results)
+    c = Comparator(left, query, right, comps=[comps.LEN_COMP, comps.FIRST_COMP], lazy=True)
+    assert [r.result for r in c.run_comparisons()] == [False, True]
+    assert left.queries == [count_query(query), limit_query(query)]
+    assert right.queries == [count_query(query), limit_query(query)]
+    assert c._sp.empty
+
+    # A comp that needs the full results fetches them once, and later comps use them
+    c = Comparator(left, query, right, comps=[comps.BASIC_COMP, comps.LEN_COMP], lazy=True)
+    left.queries = list()
+    assert [r.result for r in c.run_comparisons()] == [False, False]
+    assert left.queries == [query]
+
+    # Nothing past a failed count is fetched when short circuiting
+    c = Comparator(left, query, right, comps=[comps.BASIC_COMP, comps.LEN_COMP], lazy=True, short_circuit=True)
+    left.queries = list()
+    assert [r.status for r in c.run_comparisons()] == ['failed', 'skipped']
+    assert left.queries == [count_query(query)]
+
+    @comps.hints(needs=comps.NEEDS_COUNT)
+    def count_comp(left):
+        return len(left)
+
+    c = Comparator(left, query, comps=count_comp, lazy=True)
+    assert c.run_comparisons()[0].result == 2
+
+    with pytest.raises(ValueError):
+        comps.hints(needs='everything')
+    with pytest.raises(InvalidCompSetException):
+        Comparator(left, query, right, lazy=True, stream=True)
+
+
+def test_compare_projection():
+    assert project_query(query + ';', ['a', 'b']) == 'SELECT a, b FROM ({}) AS _cmp'.format(query)
+    assert project_query(query, []) == query
+    # The ORDER BY ends up in the subquery, where the database may not keep it
+    assert project_query(query + ' ORDER BY a', ['a']) == 'SELECT a FROM ({} ORDER BY a) AS _cmp'.format(query)
+
+    @comps.hints(columns='a')
+    def a_comp(left, right):
+        return True
+
+    left, right = FakeSource(left_results), FakeSource(right_results)
+    sp = SourcePair(left, query, right, 'select * from somewhere where c in {{ c }}')
+    # Projection is opt-in, since it can change the order of the rows
+    c = Comparator(sp=sp, comps=[a_comp, comps.LEN_COMP, comps.distinct_comp('b')])
+    assert sp.columns is None
+    c = Comparator(sp=sp, comps=[a_comp, comps.LEN_COMP, comps.distinct_comp('b')], project=True)
+    assert sp.columns == ['a', 'b']
+    assert c.explain().splitlines()[1:] == [
+        '  lquery : SELECT a, b, c FROM ({}) AS _cmp'.format(query),
+        '  rquery : SELECT a, b FROM (select * from somewhere where c in {{ c }}) AS _cmp']
+    assert all(c.run_comparisons())
+    assert left.queries == ['SELECT a, b, c FROM ({}) AS _cmp'.format(query)]
+    assert right.queries == ['SELECT a, b FROM (select * from somewhere where c in (3, 6)) AS _cmp']
+
+    # Any comp without columns reads every column, which resets the projection
+    c = Comparator(sp=sp, comps=[a_comp, comps.BASIC_COMP], project=True)
+    assert sp.columns is None
+    assert c.explain().splitlines()[1] == '  lquery : ' + query
+    assert 'every column' in c.explain()
+
+
+def test_comparatorset_run_max_failures():
+    l, r = FakeSource(left_results, delay=0.01), FakeSource(mismatch_right_results)
+    cs = ComparatorSet.from_dict([{'lquery': query} for _ in range(10)], l, r)
+    finished = list(cs.run(max_workers=2, max_failures=2))
+    assert len(finished) == 2
+    assert all(c.failed for c in finished)
+    assert len(l.queries) < 10
+
+    # Comparators that were running when the run stopped are abandoned before comparing
+    stop = threading.Event()
+    stop.set()
+    c = cs._run_comparator(cs[9], dict(), stop)
+    assert isinstance(c.error, ComparisonCancelled)
+    assert c.results == []
+
+    l, r = FakeSource(left_results), FakeSource(right_results)
+    cs = ComparatorSet.from_dict([{'lquery': query} for _ in range(3)], l, r)
+    assert len(list(cs.run(max_failures=1))) == 3
+
+
+def test_compare_stream():
+    rows = [(i, 'row %d' % i) for i in range(100)]
+    l, r = FakeStreamSource(rows), FakeStreamSource(list(rows))
+    c = Comparator(l, query, r, comps=[comps.BASIC_COMP, comps.LEN_COMP, comps.FIRST_COMP],
+                   name='test', stream=True, batch_size=10)
+    res = c.run_comparisons()
+    assert [(r.name, r.result) for r in res] == [
+        ('basic_comp', True), ('len_comp', True), ('first_eq_comp', True)]
+    assert l.batches_read == 10
+    assert c.query_results == (None, None)
+    assert c.run_comparisons() == res
+
+    # Stops reading as soon as the first mismatch is found
+    mismatched = list(rows)
+    mismatched[25] = (25, 'changed')
+    l, r = FakeStreamSource(rows), FakeStreamSource(mismatched)
+    c = Comparator(l, query, r, comps=comps.BASIC_COMP, stream=True, batch_size=10)
+    assert c.run_comparisons() == [False]
+    assert l.batches_read == 3
+
+    l, r = FakeStreamSource(rows), FakeStreamSource(rows[:50])
+    c = Comparator(l, query, r, comps=[comps.LEN_COMP, comps.FIRST_COMP], stream=True, batch_size=10)
+    assert c.run_comparisons() == [False, True]
+    assert l.batches_read == 6
+
+    # Sources without iter_query fall back to batching the full result
+    sp = SourcePair(Postgres(), query, Postgres())
+    c = Comparator(sp=sp, stream=True, batch_size=1)
+    with mock.patch.object(sp._left, 'query', return_value=left_results):
+        with mock.patch.object(sp._right, 'query', return_value=mismatch_right_results):
+            assert c.run_comparisons() == [False]
+
+    with pytest.raises(InvalidCompSetException):
+        Comparator(l, query, r, comps=lambda x, y: x == y, stream=True)
+
+    with pytest.raises(InvalidCompSetException):
+        Comparator(l, query, stream=True)
+
+    c = Comparator(l, query, r, 'select * from there where id in {{ a }}', stream=True)
+    with pytest.raises(QueryFormatError):
+        c.run_comparisons()
+
+    sp = SourcePair(l, query)
+    assert len(sp.iter_query_results()) == 1
+
+
+def test_comparatorset_run_stream():
+    rows = [(i, 'row %d' % i) for i in range(20)]
+    l, r = FakeStreamSource(rows), FakeStreamSource(rows)
+    sp = SourcePair(l, query, r)
+    c = Comparator(sp=sp, stream=True, batch_size=5)
+    assert c.stream
+    assert c.get_query_results() == (None, None)
+
+    cs = ComparatorSet([sp])
+    cs._comparisons = [c]
+    assert [c.results for c in cs.run(source_limits={l: 1, r: 1})] == [[True]]
+    assert l.batches_read == 4
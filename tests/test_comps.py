@@ -0,0 +1,233 @@
+import pytest
+
+from decimal import Decimal
+
+from comparator import Comparator
+from comparator.comps import keyed_comp, KeyedDiff
+from comparator.comps.keyed import KeyIndex
+from tests.test_compare import FakeSource, FakeStreamSource, get_mock_query_result, query
+
+left_rows = [{'id': i, 'name': 'row %d' % i, 'value': i * 1.5} for i in range(10)]
+
+
+def test_keyed_comp():
+    right_rows = list(reversed(left_rows))
+    comp = keyed_comp('id', batch_size=3)
+    assert comp.__name__ == 'keyed_diff_comp'
+
+    diff = comp(get_mock_query_result(left_rows), get_mock_query_result(right_rows))
+    assert isinstance(diff, KeyedDiff)
+    assert diff
+    assert diff == True  # noqa: E712
+    assert (diff.missing, diff.extra, diff.changed) == ([], [], [])
+
+    # Column order does not matter
+    reordered = [{'value': r['value'], 'name': r['name'], 'id': r['id']} for r in right_rows]
+    assert comp(left_rows, reordered)
+
+    right_rows = [dict(r) for r in left_rows[2:]] + [{'id': 42, 'name': 'new', 'value': 0.0}]
+    right_rows[0]['name'] = 'changed'
+    diff = comp(get_mock_query_result(left_rows), get_mock_query_result(right_rows))
+    assert not diff
+    assert diff.missing == [(0, ), (1, )]
+    assert diff.extra == [(42, )]
+    assert diff.changed == [(2, )]
+    assert diff != True  # noqa: E712
+    assert diff == KeyedDiff(['id'], [(0, ), (1, )], [(42, )], [(2, )])
+    assert repr(diff) == '<KeyedDiff(missing=2, extra=1, changed=1)>'
+
+    multi = keyed_comp(['id', 'name'])
+    diff = multi(left_rows, right_rows)
+    assert diff.missing == [(0, 'row 0'), (1, 'row 1'), (2, 'row 2')]
+    assert diff.extra == [(2, 'changed'), (42, 'new')]
+    assert diff.changed == []
+
+    c = Comparator(FakeSource(get_mock_query_result(left_rows)), query,
+                   FakeSource(get_mock_query_result(right_rows)), comps=comp)
+    res = c.run_comparisons()[0]
+    assert res.name == 'keyed_diff_comp'
+    assert not res
+
+    # NULLs in a batch don't change how the other values in their column hash, nor do driver types
+    left = [{'id': 1, 'v': 1}, {'id': 2, 'v': None}]
+    right = [{'id': 2, 'v': float('nan')}, {'id': 3, 'v': 5}, {'id': 1, 'v': 1}]
+    diff = keyed_comp('id', batch_size=2)(left, right)
+    assert (diff.missing, diff.extra, diff.changed) == ([], [(3, )], [])
+    assert keyed_comp('id')([{'id': 1, 'v': Decimal('1.50')}], [{'id': 1.0, 'v': 1.5}])
+    assert not keyed_comp('id')([{'id': 1, 'v': '1'}], [{'id': 1, 'v': 1}])
+
+
+def test_key_index():
+    index = KeyIndex(left_rows, ['id'], batch_size=4)
+    assert len(index) == 10
+
+    with pytest.raises(ValueError):
+        KeyIndex(left_rows + left_rows[:1], ['id'])
+
+    with pytest.raises(KeyError):
+        KeyIndex(left_rows, ['nope'])
+
+
+def test_vector_comps():
+    from comparator.comps import COMPS, VECTOR_COMP, NULL_EQ_COMP, MISMATCH_COMP, approx_comp, ColumnMismatches
+    from comparator.comps.vector import as_floats, to_frame
+    import numpy as np
+    import pandas as pd
+
+    values = as_floats(pd.Series([1, None, Decimal('2.5')], dtype=object))
+    assert values.dtype == np.float64
+    assert values[0] == 1.0 and np.isnan(values[1]) and values[2] == 2.5
+
+    rows = [{'id': 1, 'value': 1.5, 'name': 'a'}, {'id': 2, 'value': None, 'name': None}]
+    left, right = get_mock_query_result(rows), get_mock_query_result([dict(r) for r in rows])
+
+    assert to_frame(left) is to_frame(left)
+    assert not COMPS[VECTOR_COMP](left, right)
+    assert COMPS[NULL_EQ_COMP](left, right)
+    assert COMPS[VECTOR_COMP](rows[:1], rows[:1])
+
+    close = get_mock_query_result([{'id': 1, 'value': 1.5 + 1e-12, 'name': 'a'}, rows[1]])
+    assert not COMPS[NULL_EQ_COMP](left, close)
+    assert approx_comp(rtol=1e-9)(left, close)
+    assert not approx_comp(rtol=1e-15)(left, close)
+
+    changed = get_mock_query_result([{'id': 1, 'value': 2.5, 'name': 'a'}, {'id': 3, 'value': None, 'name': 'c'}])
+    mismatches = COMPS[MISMATCH_COMP](left, changed)
+    assert isinstance(mismatches, ColumnMismatches)
+    assert not mismatches
+    assert dict(mismatches.counts) == {'id': 1, 'value': 1, 'name': 1}
+
+    # Extra rows and columns count as mismatches
+    extra = [dict(rows[0], other=1), dict(rows[1], other=2), dict(rows[1], other=3)]
+    mismatches = COMPS[MISMATCH_COMP](left, extra)
+    assert dict(mismatches.counts) == {'id': 1, 'value': 1, 'name': 1, 'other': 3}
+    assert COMPS[MISMATCH_COMP](left, right) == True  # noqa: E712
+
+    c = Comparator(FakeSource(left), query, FakeSource(right), comps=[VECTOR_COMP, NULL_EQ_COMP])
+    assert c.run_comparisons() == [False, True]
+
+
+def test_sketches():
+    import numpy as np
+    import pandas as pd
+    from comparator.comps.sketch import HyperLogLog, BloomFilter, QuantileSketch, _row_hashes
+
+    hashes = _row_hashes(pd.DataFrame({'id': range(50000)}))
+    hll = HyperLogLog(precision=12)
+    hll.add(hashes)
+    hll.add(hashes[:1000])
+    assert hll.count() == pytest.approx(50000, rel=0.05)
+    assert hll.registers.nbytes == 4096
+
+    bloom = BloomFilter(capacity=50000, error_rate=0.01)
+    bloom.add(hashes[:40000])
+    assert bloom.contains(hashes[:40000]).all()
+    assert bloom.contains(hashes[40000:]).mean() < 0.02
+    other = BloomFilter(capacity=50000, error_rate=0.01)
+    other.add(hashes)
+    assert other.difference(bloom) == pytest.approx(10000, rel=0.05)
+    assert bloom.difference(other) == 0
+
+    sketch = QuantileSketch(relative_accuracy=0.01, max_buckets=64)
+    values = np.concatenate([np.arange(-100.0, 0.0), [0.0, np.nan], np.arange(1.0, 10001.0)])
+    sketch.add(values)
+    assert sketch.count == 10101
+    assert sketch.quantile(0) == pytest.approx(-100, rel=0.01)
+    assert sketch.quantile(1) == pytest.approx(10000, rel=0.01)
+    assert sketch.quantile(0.5) == pytest.approx(4950, rel=0.01)
+    assert len(sketch._positive) <= 64
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_sketch_comps():
+    from comparator.comps import (
+        COMPS, DISTINCT_COMP, MEMBERSHIP_COMP, QUANTILE_COMP, distinct_comp, membership_comp, quantile_comp)
+
+    rows = [{'id': i, 'value': float(i % 100)} for i in range(2000)]
+    shuffled = rows[1000:] + rows[:1000]
+    changed = rows[:-5] + [{'id': i, 'value': -1.0} for i in range(1995, 2000)]
+
+    distinct = COMPS[DISTINCT_COMP](rows, shuffled)
+    assert distinct and distinct.left == distinct.right
+    assert distinct.left == pytest.approx(2000, rel=0.05)
+    assert not distinct_comp('value')(rows, rows[:1000] + [{'id': 0, 'value': 0.5}])
+
+    assert COMPS[MEMBERSHIP_COMP](rows, shuffled)
+    diff = COMPS[MEMBERSHIP_COMP](rows, changed)
+    assert not diff
+    assert (diff.missing, diff.extra) == (5, 5)
+    assert membership_comp('id', capacity=5000)(rows, changed)
+
+    assert COMPS[QUANTILE_COMP](rows, shuffled)
+    quantiles = quantile_comp('value', quantiles=(0.0, 0.5))(rows, changed)
+    assert not quantiles
+    assert quantiles.mismatched() == [('value', 0.0)]
+    assert quantile_comp(['value'], quantiles=(0.5, ))(rows, changed)
+    with pytest.raises(KeyError):
+        quantile_comp('missing')(rows, rows)
+
+    # Streamed results give the same sketches as whole ones
+    comps = [DISTINCT_COMP, MEMBERSHIP_COMP, QUANTILE_COMP]
+    left, right = get_mock_query_result(rows), get_mock_query_result(changed)
+    whole = Comparator(FakeSource(left), query, FakeSource(right), comps=comps).run_comparisons()
+    ls, rs = FakeStreamSource(rows), FakeStreamSource(changed)
+    streamed = Comparator(ls, query, rs, comps=comps, stream=True, batch_size=300).run_comparisons()
+    assert [r.result for r in streamed] == [r.result for r in whole]
+    assert not streamed[1]
+    assert ls.batches_read == 7
+
+    # A NULL in one batch doesn't change how the other values in its column hash
+    lrows = [{'a': 1, 'b': 1}, {'a': 2, 'b': None}, {'a': 3, 'b': 5}]
+    rrows = [{'a': 1, 'b': 1}, {'a': 3, 'b': 5}, {'a': 2, 'b': None}]
+    streamed = Comparator(FakeStreamSource(lrows), query, FakeStreamSource(rrows),
+                          comps=[MEMBERSHIP_COMP, DISTINCT_COMP], stream=True, batch_size=2).run_comparisons()
+    assert all(streamed)
+    assert (streamed[0].result.missing, streamed[0].result.extra) == (0, 0)
+
+
+def test_comp_descriptor():
+    import functools
+    import mock
+    from comparator.comps import (
+        CompDescriptor, comp_columns, comp_name, hints, membership_comp, quantile_comp, COMPS, LEN_COMP)
+    from comparator.comps.stream import BasicStreamComp
+
+    @hints(cost=3, depends=LEN_COMP)
+    def within(left, right, limit):
+        return abs(len(left) - len(right)) <= limit
+
+    class CountComp(object):
+        cost = 7
+
+        def __call__(self, left, right):
+            return len(left) == len(right)
+
+    partial = functools.partial(within, limit=1)
+    desc = CompDescriptor(partial)
+    assert (desc.name, desc.cost, desc.depends, desc.stream) == ('within', 3, ['len_comp'], None)
+    assert desc([1, 2], [1])
+
+    desc = CompDescriptor(CountComp())
+    assert (desc.name, desc.cost, desc.depends) == ('CountComp', 7, [])
+    assert CompDescriptor(COMPS['basic']).stream is BasicStreamComp
+
+    # Partials of built-in comps stream like the comps they wrap
+    assert CompDescriptor(functools.partial(COMPS['basic'])).stream is BasicStreamComp
+    c = Comparator(FakeStreamSource(left_rows), query, FakeStreamSource(left_rows),
+                   comps=[functools.partial(COMPS['basic'])], stream=True, batch_size=4)
+    assert all(c.run_comparisons())
+
+    # Lambdas are named from their source once, and lambdas without source keep their name
+    comp = lambda l, r: True  # noqa: E731
+    with mock.patch('comparator.comps.descriptor.inspect.getsource', wraps=__import__('inspect').getsource) as gs:
+        assert comp_name(comp) == 'lambda l, r: True  # noqa: E731'
+        assert comp_name(comp) == 'lambda l, r: True  # noqa: E731'
+        c = Comparator(FakeSource(left_rows), query, FakeSource(left_rows), comps=[comp, comp])
+        assert [r.name for r in c.run_comparisons()] == ['lambda l, r: True  # noqa: E731'] * 2
+    assert gs.call_count == 1
+    assert comp_name(eval('lambda l, r: False')) == '<lambda>'
+
+    # The columns of each comp are unioned, and any comp that reads every column turns the projection off
+    descs = [CompDescriptor(c) for c in (COMPS['len'], membership_comp(['id', 'b']), quantile_comp('b'))]
+    assert comp_columns(descs) == ['id', 'b']
+    assert comp_columns(descs + [CompDescriptor(COMPS['basic'])]) is None
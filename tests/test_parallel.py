@@ -0,0 +1,68 @@
+import os
+import pytest
+import sys
+import threading
+import time
+
+from comparator import Comparator, SourcePair
+from comparator.comps import hints, LEN_COMP
+from comparator.exceptions import InvalidCompSetException
+from tests.test_compare import FakeSource, left_query_results, right_query_results, query
+
+barrier = threading.Barrier(2, timeout=5)
+
+
+def slow_comp(left, right):
+    barrier.wait()
+    time.sleep(0.05)
+    return 'slow'
+
+
+def fast_comp(left, right):
+    barrier.wait()
+    return 'fast'
+
+
+def pid_comp(left, right):
+    return os.getpid()
+
+
+def sum_comp(left, right):
+    return sum(row['a'] for row in left) == sum(row['a'] for row in right)
+
+
+def test_thread_comps():
+    barrier.reset()
+    sp = SourcePair(FakeSource(left_query_results), query, FakeSource(right_query_results))
+    # Both comps wait on the barrier, so they only finish if they run at the same time
+    c = Comparator(sp=sp, comps=[slow_comp, fast_comp, LEN_COMP], comp_workers=2)
+    assert [(r.name, r.result) for r in c.compare()] == [
+        ('slow_comp', 'slow'), ('fast_comp', 'fast'), ('len_comp', True)]
+    assert all(r.elapsed is not None for r in c.results)
+
+    calls = list()
+
+    @hints(depends=LEN_COMP)
+    def dependent_comp(left, right):
+        calls.append(1)
+        return True
+
+    sp = SourcePair(FakeSource(left_query_results), query, FakeSource(left_query_results[:1]))
+    c = Comparator(sp=sp, comps=[dependent_comp, LEN_COMP], comp_workers=2, short_circuit=True)
+    assert [r.status for r in c.run_comparisons()] == ['failed', 'skipped']
+    assert calls == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='Process pools require Python 3.7+')
+def test_process_comps():
+    sp = SourcePair(FakeSource(left_query_results), query, FakeSource(right_query_results))
+    c = Comparator(sp=sp, comps=[pid_comp, sum_comp, LEN_COMP], comp_workers=2, comp_executor='process')
+    results = c.run_comparisons()
+    assert [r.name for r in results] == ['pid_comp', 'sum_comp', 'len_comp']
+    assert results[0].result != os.getpid()
+    assert results[1:] == [True, True]
+
+    with pytest.raises(InvalidCompSetException):
+        Comparator(sp=sp, comps=[lambda l, r: True, LEN_COMP], comp_workers=2, comp_executor='process')
+    with pytest.raises(InvalidCompSetException):
+        Comparator(sp=sp, comps=LEN_COMP, comp_workers=2, comp_executor='fiber')
@@ -0,0 +1,78 @@
+import pytest
+
+from comparator import ComparatorSet, SourcePair
+from comparator.plan import QueryPlan
+from tests.test_compare import FakeSource, query, other_query, left_results, right_results
+
+
+def test_query_plan():
+    l, r = FakeSource(left_results), FakeSource(right_results)
+    rquery = 'select * from somewhere where id in {{ a }}'
+    sps = [
+        SourcePair(l, query, r),
+        SourcePair(l, query, r, other_query),
+        SourcePair(l, query, r, rquery),
+        SourcePair(l, other_query)]
+    plan = QueryPlan(sps)
+    assert plan.queries == 7
+    assert plan.unique == 5
+    assert plan.saved == 2
+    assert repr(plan) == '<QueryPlan(queries=7, unique=5)>'
+
+    lines = plan.explain().splitlines()
+    assert lines[0] == 'QueryPlan: 7 queries, 5 unique, 2 round trips saved'
+    assert lines[1] == '  [3x] {!r} : {}'.format(l, query)
+    assert lines[-1] == '  1 templated rquery(s) rendered at run time'
+
+    calls = []
+
+    def run(source, q):
+        calls.append(q)
+        if len(calls) == 1:
+            raise RuntimeError('flaky')
+        return source.result
+
+    with pytest.raises(RuntimeError):
+        plan.fetch(l, query, run)
+    assert plan.fetch(l, query, run) is left_results
+    assert plan.fetch(l, query, run) is left_results
+    assert calls == [query, query]
+    assert plan.executed == 1
+
+    plan.clear()
+    assert plan.executed == 0
+
+
+def test_comparatorset_dedupe():
+    l, r = FakeSource(left_results, delay=0.01), FakeSource(right_results, delay=0.01)
+    dicts = [{'name': str(i), 'lquery': query, 'rquery': other_query} for i in range(5)]
+
+    cs = ComparatorSet.from_dict(dicts, l, r)
+    assert cs.plan is None
+    assert cs.explain().startswith('QueryPlan: 10 queries, 2 unique, 8 round trips saved')
+
+    cs = ComparatorSet.from_dict(dicts, l, r, dedupe=True)
+    assert cs.plan.saved == 8
+    finished = list(cs.run(max_workers=5))
+    assert all(c.results == [True] for c in finished)
+    assert l.queries == [query]
+    assert r.queries == [other_query]
+    assert cs.plan.executed == 2
+    assert cs[0].lresult is cs[4].lresult
+
+    for c in cs:
+        assert c.run_comparisons() == [True]
+    assert len(l.queries) == 1
+
+    cs.clear()
+    assert cs[0].results == []
+    for c in cs:
+        c.run_comparisons()
+    assert len(l.queries) == 2
+
+    # Clearing one Comparator drops the shared results of its queries, so it sees the sources' new data
+    cs[0].clear()
+    r.result = list()
+    assert cs[0].run_comparisons() == [False]
+    assert (len(l.queries), len(r.queries)) == (3, 3)
+    assert cs[1].run_comparisons() == [True]
@@ -0,0 +1,114 @@
+import pytest
+import sys
+
+from comparator import SourcePair, Comparator, ComparatorSet
+from comparator.profile import Profiler, PrometheusExporter, SpanExporter, Stage, NO_STAGE
+from tests.test_compare import (
+    FakeSource, FakeStreamSource, get_mock_query_result, query, other_query, left_results, right_results)
+
+
+def test_no_profiler():
+    c = Comparator(FakeSource(left_results), query, FakeSource(right_results), comps=['len', 'first'])
+    res = c.run_comparisons()
+    assert c.profile == []
+    assert [r.profile for r in res] == [None, None]
+    assert c._stage('comp') is NO_STAGE
+
+
+def test_comparator_profile():
+    spans = SpanExporter()
+    profiler = Profiler(hooks=[spans])
+    l, r = FakeSource(left_results, delay=0.01), FakeSource(right_results)
+    rquery = 'select * from somewhere where id in {{ a }}'
+    c = Comparator(l, query, r, rquery, comps=['len', 'first'], name='test', profiler=profiler)
+    res = c.run_comparisons()
+
+    assert [(s.name, s.labels.get('comp')) for s in c.profile] == [
+        ('lquery', None), ('format_rquery', None), ('rquery', None), ('comp', 'len_comp'), ('comp', 'first_eq_comp')]
+    lquery = c.profile[0]
+    assert lquery.wall >= 0.01
+    assert lquery.cpu < lquery.wall
+    assert lquery.rows == len(left_results)
+    assert lquery.labels == {'comparator': 'test'}
+    assert [r.profile for r in res] == c.profile[3:]
+    assert c._sp.profile == c.profile[:3]
+
+    assert len(spans.spans) == 5
+    span = spans.spans[0]
+    assert span['name'] == 'comparator.lquery'
+    assert span['end_time_unix_nano'] - span['start_time_unix_nano'] >= 10 ** 7
+    assert span['attributes']['comparator.comparator'] == 'test'
+    assert span['attributes']['comparator.rows'] == 2
+
+    c.clear()
+    assert c.profile == []
+    c.run_comparisons()
+    assert len(c.profile) == 5
+    assert len(spans.spans) == 10
+
+
+def test_comparator_profile_modes():
+    rows = [{'id': i} for i in range(10)]
+    profiler = Profiler()
+
+    c = Comparator(FakeStreamSource(rows), query, FakeStreamSource(rows), comps=['len', 'basic'], stream=True,
+                   batch_size=3, profiler=profiler)
+    res = c.run_comparisons()
+    assert [s.name for s in c.profile] == ['stream']
+    assert c.profile[0].rows == 10
+    assert res[0].profile is res[1].profile is c.profile[0]
+
+    c = Comparator(FakeSource(left_results), query, FakeSource(right_results), comps=['len', 'first'],
+                   comp_workers=2, concurrent=True, profiler=profiler)
+    res = c.run_comparisons()
+    assert sorted(s.name for s in c.profile) == ['comp', 'comp', 'lquery', 'rquery']
+    assert res[1].profile.labels == {'comparator': None, 'comp': 'first_eq_comp'}
+    assert res[1].profile.wall == res[1].elapsed
+
+
+def test_prometheus_exporter():
+    metrics = PrometheusExporter()
+    profiler = Profiler(hooks=[metrics])
+    sps = [SourcePair(FakeSource(left_results), query, FakeSource(right_results), other_query) for _ in range(2)]
+    cs = ComparatorSet(sps, comps=['len', 'len'], names=['a', 'b"'], profiler=profiler)
+    for c in cs:
+        c.run_comparisons()
+    cs[0].clear()
+    cs[0].run_comparisons()
+
+    text = metrics.render()
+    assert '# TYPE comparator_stage_seconds summary' in text
+    assert 'comparator_stage_seconds_count{comparator="a",stage="lquery"} 2' in text
+    assert 'comparator_stage_seconds_count{comparator="b\\"",stage="lquery"} 1' in text
+    assert 'comparator_stage_rows_total{comp="len_comp",comparator="a",stage="comp"} 0' in text
+    assert 'comparator_stage_rows_total{comparator="a",stage="rquery"} 4' in text
+    assert 'comparator_stage_peak_memory_bytes{' not in text
+
+    metrics(Stage('comp', 0.0, 1.5, cpu=1.0, rows=None, peak_memory=100, labels={'comparator': 'a', 'comp': 'x'}))
+    assert 'comparator_stage_peak_memory_bytes{comp="x",comparator="a",stage="comp"} 100' in metrics.render()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason='Requires tracemalloc.reset_peak')
+def test_profile_memory():
+    import tracemalloc
+    tracing = tracemalloc.is_tracing()
+    try:
+        profiler = Profiler(memory=True)
+        rows = [{'id': i, 'name': 'row %d' % i} for i in range(20000)]
+        result = get_mock_query_result(rows)
+        c = Comparator(FakeSource(result), query, FakeSource(result), comps='vector', profiler=profiler)
+        c.run_comparisons()
+        assert c.profile[-1].peak_memory > 100000
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def test_aio_profile():
+    from tests.test_aio import run
+
+    profiler = Profiler()
+    sp = SourcePair(FakeSource(left_results), query, FakeSource(right_results), other_query, profiler=profiler)
+    run(sp.aget_query_results())
+    assert sorted(s.name for s in sp.profile) == ['lquery', 'rquery']
+    assert [s.rows for s in sp.profile] == [2, 2]
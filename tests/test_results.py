@@ -0,0 +1,82 @@
+import math
+import mock
+import pickle
+import pytest
+import sys
+
+from comparator import ComparatorSet
+from comparator.results import ComparatorResult, ResultStore
+from tests.test_compare import FakeSource, query, left_results, right_results, mismatch_right_results
+
+
+def make_store():
+    return ResultStore([
+        ComparatorResult('one', 'basic_comp', True, elapsed=0.5),
+        ComparatorResult('one', 'len_comp', False, elapsed=0.25),
+        ComparatorResult('two', 'basic_comp', False),
+        ComparatorResult('two', 'custom_comp', 3, elapsed=1.0, status='skipped')])
+
+
+def test_comparator_result_slots():
+    cr = ComparatorResult('test', 'basic_comp', False, elapsed=0.5)
+    assert not hasattr(cr, '__dict__')
+    assert cr.status == 'failed'
+    assert cr.elapsed == 0.5
+    assert ComparatorResult('test', 'basic_comp', True).status == 'passed'
+
+    loaded = pickle.loads(pickle.dumps(cr))
+    assert (loaded.comparator_name, loaded.name, loaded.result, loaded.elapsed, loaded.status) == (
+        'test', 'basic_comp', False, 0.5, 'failed')
+
+
+def test_result_store():
+    store = make_store()
+    assert len(store) == 4
+    assert repr(store) == '<ResultStore(results=4, failures=3)>'
+    assert [r.name for r in store] == ['basic_comp', 'len_comp', 'basic_comp', 'custom_comp']
+    assert store[2].elapsed is None
+    assert store[3].status == 'skipped'
+
+    failures = store.failures()
+    assert list(failures.column('name')) == ['len_comp', 'basic_comp', 'custom_comp']
+    assert list(store.filter(status='failed').column('comparator_name')) == ['one', 'two']
+    assert len(store.filter(comparator_name='two')) == 2
+    assert list(store.column('elapsed'))[:2] == [0.5, 0.25]
+    with pytest.raises(KeyError):
+        store.column('nope')
+
+    groups = store.groupby()
+    assert list(groups) == ['one', 'two']
+    assert [r.result for r in groups['one']] == [True, False]
+
+    df = store.df()
+    assert list(df.columns) == list(ResultStore.COLUMNS)
+    assert list(df['status']) == ['passed', 'failed', 'failed', 'skipped']
+    assert math.isnan(df['elapsed'][2])
+
+
+def test_result_store_arrow():
+    pytest.importorskip('pyarrow')
+    table = make_store().arrow()
+    assert table.num_rows == 4
+    assert table.column('result').to_pylist() == ['True', 'False', 'False', '3']
+    assert table.column('elapsed').to_pylist()[2] is None
+
+    with mock.patch.dict(sys.modules, {'pyarrow': None}):
+        with pytest.raises(ImportError):
+            make_store().arrow()
+
+
+def test_comparatorset_results():
+    l, r, m = FakeSource(left_results), FakeSource(right_results), FakeSource(mismatch_right_results)
+    cs = ComparatorSet.from_dict([
+        {'name': 'match', 'lquery': query, 'comps': ['basic', 'len']},
+        {'name': 'mismatch', 'lquery': query, 'comps': ['len']}], l, r)
+    cs[1]._sp._right = m
+    assert len(cs.results) == 0
+
+    list(cs.run())
+    store = cs.results
+    assert len(store) == 3
+    assert [r.comparator_name for r in store.failures()] == ['mismatch']
+    assert all(e >= 0 for e in store.column('elapsed'))
@@ -0,0 +1,102 @@
+import pytest
+
+from comparator import SourcePair, Comparator
+from comparator.exceptions import InvalidCompSetException
+from comparator.sample import SampleSpec, sample_diff, wilson_interval
+from tests.test_checksum import SqliteSource
+
+
+rows = [(i, i * 2) for i in range(1000)]
+spec = SampleSpec('id', rate=0.1, buckets=100, hash_expr='{columns} * 7')
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    lo, hi = wilson_interval(0, 100)
+    assert lo == 0.0
+    assert hi == pytest.approx(0.037, abs=0.001)
+    lo, hi = wilson_interval(10, 100)
+    assert lo < 0.1 < hi
+    assert wilson_interval(10, 100, confidence=0.99)[1] > hi
+
+
+def test_sample_spec():
+    with pytest.raises(ValueError):
+        SampleSpec('id', rate=0)
+
+    s = SampleSpec(['a', 'b'], rate=0.015, buckets=100, hash_expr='HASH({columns})')
+    assert s.keys == ['a', 'b']
+    assert s.rate == 0.01
+    assert s.where() == 'MOD(MOD(HASH(a, b), 100) + 100, 100) < 1'
+
+
+def test_sample_diff():
+    left = [{'id': 1, 'v': 1}, {'id': 2, 'v': None}, {'id': 3, 'v': 3}, {'id': 4, 'v': 4}]
+    right = [{'id': 4, 'v': 4}, {'id': 3, 'v': 30}, {'id': 2, 'v': None}, {'id': 5, 'v': 5}]
+    result = sample_diff(left, right, SampleSpec('id', max_rate=0.5))
+    assert (result.mismatches, result.rows) == (3, 5)
+    assert result.rate == 0.6
+    assert not result
+    assert result.interval[0] < 0.6 < result.interval[1]
+
+    assert sample_diff(left, left, SampleSpec('id'))
+    assert sample_diff(left, left, SampleSpec('id')).rows == 4
+    assert sample_diff(left, [], SampleSpec('id')).mismatches == 4
+
+    with pytest.raises(KeyError):
+        sample_diff(left, right, SampleSpec('key'))
+
+
+def test_sampled_comparator():
+    l, r = SqliteSource(rows), SqliteSource(rows)
+    c = Comparator(l, 'SELECT * FROM t;', r, comps='len', sample=spec)
+    res = c.run_comparisons()
+    assert len(res) == 1
+    assert res[0].name == 'sample_comp'
+    assert res[0]
+    assert res[0].result.rows == 100
+    assert l.queries == r.queries == [
+        'SELECT * FROM (SELECT * FROM t) AS _cmp WHERE MOD(MOD(id * 7, 100) + 100, 100) < 10']
+
+
+def test_sampled_comparator_escalate():
+    changed = list(rows)
+    changed[100] = (100, -1)
+    l, r = SqliteSource(rows), SqliteSource(changed)
+
+    c = Comparator(l, 'SELECT * FROM t ORDER BY id', r, comps=['len', 'mismatches'], sample=spec)
+    res = c.run_comparisons()
+    assert [cr.name for cr in res] == ['sample_comp']
+    assert res[0].result.mismatches == 1
+    assert not res[0]
+    assert c.failed
+
+    l.queries, r.queries = [], []
+    c = Comparator(l, 'SELECT * FROM t ORDER BY id', r, comps=['len', 'mismatches'], sample=spec, escalate=True)
+    res = c.run_comparisons()
+    assert [cr.name for cr in res] == ['sample_comp', 'len_comp', 'mismatch_counts_comp']
+    assert [bool(cr) for cr in res] == [False, True, False]
+    assert res[2].result.counts['value'] == 1
+    assert len(c.lresult) == 1000
+    assert l.queries[-1] == 'SELECT * FROM t ORDER BY id'
+    assert c.run_comparisons() == res
+
+    # The sample is restored for the next run
+    c.clear()
+    c.run_comparisons()
+    assert l.queries[2] == l.queries[0]
+
+
+def test_sampled_comparator_invalid():
+    l, r = SqliteSource(rows), SqliteSource(rows)
+    with pytest.raises(InvalidCompSetException):
+        Comparator(l, 'SELECT * FROM t', r, sample=spec, stream=True)
+    with pytest.raises(InvalidCompSetException):
+        Comparator(l, 'SELECT * FROM t', sample=spec)
+    assert Comparator(l, 'SELECT * FROM t', r, sample=spec, escalate=True)._deferred
+
+    sp = SourcePair(l, 'SELECT * FROM t', r)
+    sp.set_sample(spec)
+    assert sp._lquery.startswith('SELECT * FROM (SELECT * FROM t) AS _cmp WHERE MOD(')
+    sp.set_sample(None)
+    assert sp._lquery == 'SELECT * FROM t'
@@ -0,0 +1,62 @@
+import os
+import pytest
+
+from comparator import Comparator, SourcePair
+from comparator.comps import BASIC_COMP, LEN_COMP, MISMATCH_COMP
+from comparator.spill import SpillStore
+from tests.test_compare import FakeSource, FakeStreamSource, query
+
+pa = pytest.importorskip('pyarrow')
+
+rows = [{'id': i, 'value': i * 2} for i in range(100000)]
+
+
+def test_spill_store(tmpdir):
+    store = SpillStore(str(tmpdir))
+    assert store.path is None
+
+    table = store.write('left', [rows[:2], [], [{'id': 2, 'value': 4.0}]])
+    assert table.to_pylist() == [{'id': 0, 'value': 0}, {'id': 1, 'value': 2}, {'id': 2, 'value': 4}]
+    assert len(os.listdir(store.path)) == 1
+
+    empty = store.write('right', [[]])
+    assert empty.num_rows == 0
+
+    path = store.path
+    store.clear()
+    assert not os.path.exists(path)
+    assert store.path is None
+
+
+def test_disk_storage(tmpdir):
+    l, r = FakeStreamSource(rows), FakeSource(rows)
+    sp = SourcePair(l, query, r, storage='disk', spill_dir=str(tmpdir), spill_batch_size=10000)
+
+    before = pa.total_allocated_bytes()
+    sp.get_query_results()
+    # The results are mapped from their files rather than allocated
+    assert pa.total_allocated_bytes() - before < 100000
+    assert l.batches_read == 10
+    assert r.queries == [query]
+    assert isinstance(sp.lresult, pa.Table)
+    assert len(os.listdir(sp._spill.path)) == 2
+
+    c = Comparator(sp=sp, comps=[BASIC_COMP, LEN_COMP, MISMATCH_COMP])
+    assert c.run_comparisons() == [True, True, True]
+
+    c.clear()
+    assert sp.lresult is None
+    assert os.listdir(str(tmpdir)) == []
+
+    with pytest.raises(ValueError):
+        SourcePair(l, query, r, storage='cloud')
+
+
+def test_disk_storage_templated(tmpdir):
+    l, r = FakeStreamSource(rows[:3]), FakeSource(rows[:1])
+    sp = SourcePair(l, query, r, 'select * from t where id in {{ id }}', storage='disk', spill_dir=str(tmpdir),
+                    key_strategy='batch', key_batch_size=2)
+    sp.get_query_results()
+    assert r.queries == ['select * from t where id in (0, 1)', 'select * from t where id in (2)']
+    assert sp.rresult.to_pylist() == rows[:1] * 2
+    sp.clear()
@@ -0,0 +1,90 @@
+import datetime
+import os
+import pytest
+
+from comparator import Comparator, ComparatorSet, SourcePair
+from comparator.exceptions import InvalidCompSetException
+from comparator.rewrite import sql_literal, watermark_query
+from comparator.state import StateStore, FileStateStore, WatermarkState
+from tests.test_checksum import SqliteSource
+
+query = 'SELECT id, value FROM t'
+
+
+def test_watermark_query():
+    assert watermark_query(query, 'id', None) == query
+    assert watermark_query(query + ';', 'id', 10) == 'SELECT * FROM (SELECT id, value FROM t) AS _cmp WHERE id > 10'
+    assert sql_literal("it's") == "'it''s'"
+    assert sql_literal(datetime.datetime(2019, 1, 2, 3, 4, 5)) == "'2019-01-02 03:04:05'"
+    assert sql_literal(1.5) == '1.5'
+    assert sql_literal(None) == 'NULL'
+
+
+@pytest.mark.parametrize('store_class, filename', [(StateStore, 'state.db'), (FileStateStore, 'state.json')])
+def test_state_store(tmpdir, store_class, filename):
+    path = os.path.join(str(tmpdir), filename)
+    store = store_class(path)
+    assert store.get('c').dict() == WatermarkState().dict()
+
+    state = WatermarkState()
+    state.record(True, watermark=datetime.date(2019, 1, 2), rows=5)
+    store.set('c', state)
+
+    loaded = store_class(path).get('c')
+    assert loaded.watermark == '2019-01-02'
+    assert (loaded.runs, loaded.rows, loaded.status) == (1, 5, 'passed')
+
+    store.delete('c')
+    assert store.get('c').runs == 0
+
+
+def test_incremental_comparator(tmpdir):
+    store = StateStore(os.path.join(str(tmpdir), 'state.db'))
+    rows = [(i, i * 2) for i in range(10)]
+    l, r = SqliteSource(rows), SqliteSource(rows)
+
+    def make():
+        return Comparator(sp=SourcePair(l, query, r, watermark='id'), comps='len', name='t', state=store)
+
+    c = make()
+    assert c.run_comparisons() == [True]
+    assert l.queries == [query]
+    assert (c.state.watermark, c.state.rows, c.state.status) == (9, 10, 'passed')
+
+    # Only the new rows are queried, and a failure does not advance the watermark
+    l._conn.executemany('INSERT INTO t VALUES (?, ?)', [(10, 20), (11, 22)])
+    c = make()
+    assert c.run_comparisons() == [False]
+    assert l.queries[-1] == 'SELECT * FROM (SELECT id, value FROM t) AS _cmp WHERE id > 9'
+    assert (c.state.watermark, c.state.failures, c.state.status) == (9, 1, 'failed')
+
+    r._conn.executemany('INSERT INTO t VALUES (?, ?)', [(10, 20), (11, 22)])
+    c.clear()
+    assert c.run_comparisons() == [True]
+    assert l.queries[-1] == 'SELECT * FROM (SELECT id, value FROM t) AS _cmp WHERE id > 9'
+    assert (c.state.watermark, c.state.runs, c.state.rows, c.state.status) == (11, 3, 12, 'passed')
+    assert store.get('t').watermark == 11
+
+    c.clear()
+    assert c.run_comparisons() == [True]
+    assert l.queries[-1].endswith('WHERE id > 11')
+    assert c.state.rows == 12
+
+
+def test_incremental_comparator_set(tmpdir):
+    store = FileStateStore(os.path.join(str(tmpdir), 'state.json'))
+    rows = [(i, i * 2) for i in range(10)]
+    l, r = SqliteSource(rows), SqliteSource(rows)
+    cs = ComparatorSet.from_dict(
+        [{'name': 'inc', 'lquery': query, 'watermark': 'id'}, {'name': 'full', 'lquery': query}],
+        left=l, right=r, default_comp='len', state=store)
+    assert [c.run_comparisons() for c in cs] == [[True], [True]]
+    assert cs[0].state.watermark == 9
+    assert cs[1].state is None
+
+    with pytest.raises(InvalidCompSetException):
+        Comparator(l, query, r, state=store)
+    with pytest.raises(InvalidCompSetException):
+        Comparator(sp=SourcePair(l, query, r, watermark='id'), state=store)
+    with pytest.raises(InvalidCompSetException):
+        SourcePair(l, query, r).set_since(1)
@@ -0,0 +1,101 @@
+import pytest
+
+from spackl.db import Postgres
+
+from comparator import SourcePair
+from comparator.exceptions import QueryFormatError
+from comparator.template import RQueryTemplate, format_values
+from tests.test_compare import query, left_results, get_mock_query_result
+
+
+def test_rquery_template():
+    t = RQueryTemplate('select * from t where a in {{ a }} and b in {{b}} and c in {{ a}}')
+    assert t.templated
+    assert t.keys == ['a', 'b']
+    assert repr(t) == "<RQueryTemplate(keys=['a', 'b'])>"
+
+    calls = []
+
+    def fmt(key):
+        calls.append(key)
+        return '(%s)' % key.upper()
+
+    assert t.render(fmt) == 'select * from t where a in (A) and b in (B) and c in (A)'
+    assert calls == ['a', 'b']
+
+    # Values are inserted literally, never interpreted as regex replacements
+    assert t.render(lambda key: r"('\1', '\\n')") == (
+        r"select * from t where a in ('\1', '\\n') and b in ('\1', '\\n') and c in ('\1', '\\n')")
+
+    plain = RQueryTemplate('select 1')
+    assert not plain.templated
+    assert plain.render(fmt) == 'select 1'
+
+
+def test_source_pair_template_cache():
+    rquery = 'select * from somewhere where id in {{ a }} or id in {{ a }}'
+    sp = SourcePair(Postgres(), query, Postgres(), rquery)
+    template = sp._template
+    assert template.keys == ['a']
+
+    sp._lresult = left_results
+    assert sp._format_rquery() == 'select * from somewhere where id in (1, 4) or id in (1, 4)'
+    sp.clear()
+    assert sp._template is template
+
+    sp._rquery = 'select {{ b }}'
+    assert sp._template.keys == ['b']
+
+
+class KeySource(object):
+    def __init__(self, result):
+        self.result = result
+        self.queries = list()
+        self.loaded = None
+
+    def query(self, query_string, **params):
+        self.queries.append((query_string, params))
+        return self.result
+
+    def load_keys(self, table, columns):
+        self.loaded = (table, columns)
+
+
+def test_key_strategies():
+    rquery = 'select * from t where a in {{ a }}'
+    lresult = get_mock_query_result([{'a': i} for i in range(5)] + [{'a': None}])
+
+    right = KeySource(get_mock_query_result([{'a': 1}]))
+    sp = SourcePair(KeySource(lresult), query, right, rquery, key_strategy='batch', key_batch_size=2)
+    sp.get_query_results()
+    assert [q for q, _ in right.queries] == [
+        'select * from t where a in (0, 1)',
+        'select * from t where a in (2, 3)',
+        'select * from t where a in (4)']
+    assert len(sp.rresult) == 3
+    assert len(right.result) == 1
+
+    right = KeySource([{'a': 1}])
+    sp = SourcePair(KeySource(lresult), query, right, rquery, key_strategy='param')
+    sp.get_query_results()
+    assert right.queries == [('select * from t where a in %(a)s', {'a': (0, 1, 2, 3, 4)})]
+    assert sp.rresult == [{'a': 1}]
+
+    right = KeySource([{'a': 1}])
+    sp = SourcePair(KeySource(lresult), query, right, rquery, key_strategy='temp_table', key_table='tmp_keys')
+    sp.get_query_results()
+    assert right.loaded == ('tmp_keys', {'a': (0, 1, 2, 3, 4)})
+    assert right.queries == [('select * from t where a in (SELECT a FROM tmp_keys)', {})]
+
+    with pytest.raises(ValueError):
+        SourcePair(KeySource(lresult), query, right, rquery, key_strategy='nope')
+    with pytest.raises(TypeError):
+        SourcePair(KeySource(lresult), query, Postgres(), rquery, key_strategy='temp_table')
+    with pytest.raises(QueryFormatError):
+        SourcePair(KeySource(lresult), query, right, 'select {{ b }}', key_strategy='param').get_query_results()
+
+
+def test_format_values():
+    assert format_values([1, None, 2]) == '(1, 2)'
+    assert format_values(['x']) == "('x')"
+    assert format_values([None]) == "('__xxx__EMPTYRESULT__xxx__')"